@@ -0,0 +1,254 @@
+# Aggregating stdout callback for the parallel deployment phases
+from __future__ import annotations
+
+DOCUMENTATION = '''
+    name: aggregate
+    type: stdout
+    short_description: one line per task with host counts, full output only for failures
+    description:
+      - Prints a single line per task with ok/changed/failed/skipped/unreachable
+        counts across all hosts of the play, once every host has reported or
+        the play ends.
+      - Failed and unreachable results are printed in full as they happen.
+      - Every per-host result is written to a compressed JSON lines side log
+        (zstd when the zstandard module is installed, gzip otherwise).
+    options:
+      log_dir:
+        description: Directory for the compressed full-detail log
+        default: logs
+        env:
+          - name: ANSIBLE_AGGREGATE_LOG_DIR
+        ini:
+          - section: callback_aggregate
+            key: log_dir
+      compression:
+        description: Side log compression, auto picks zstd when available
+        default: auto
+        choices: ['auto', 'zstd', 'gzip']
+        env:
+          - name: ANSIBLE_AGGREGATE_COMPRESSION
+        ini:
+          - section: callback_aggregate
+            key: compression
+'''
+
+import gzip
+import io
+import json
+import os
+import time
+
+from ansible import constants as C
+from ansible import context
+from ansible.plugins.callback import CallbackBase
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+STATUSES = ['ok', 'changed', 'failed', 'skipped', 'unreachable', 'ignored']
+
+
+class TaskSummary:
+    """Per-task counts and timings across hosts"""
+
+    def __init__(self, name, order):
+        self.name = name
+        self.order = order
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.hosts = set()
+        self.durations = {}
+
+    def line(self):
+        counts = ' '.join(f"{status}={count}" for status, count in self.counts.items()
+                          if count or status in ('ok', 'changed', 'failed', 'skipped'))
+        line = f"TASK [{self.name}] {counts}"
+        if self.durations:
+            host, seconds = max(self.durations.items(), key=lambda item: item[1])
+            line += f" (slowest {seconds:.1f}s on {host})"
+        return line
+
+    def color(self):
+        if self.counts['failed'] or self.counts['unreachable']:
+            return C.COLOR_ERROR
+        if self.counts['changed']:
+            return C.COLOR_CHANGED
+        return C.COLOR_OK
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'stdout'
+    CALLBACK_NAME = 'aggregate'
+
+    def __init__(self):
+        super().__init__()
+        self.log = None
+        self.log_path = None
+        self.play_name = None
+        self.play_hosts = set()
+        self.tasks = {}
+        self.task_order = 0
+        self.started = {}
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super().set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self.log_dir = self.get_option('log_dir')
+        self.compression = self.get_option('compression')
+
+    # Side log
+
+    def _open_log(self, playbook_name):
+        os.makedirs(self.log_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        use_zstd = HAS_ZSTD and self.compression in ('auto', 'zstd')
+        if self.compression == 'zstd' and not HAS_ZSTD:
+            self._display.warning("aggregate callback: zstandard not installed, using gzip")
+
+        if use_zstd:
+            self.log_path = os.path.join(self.log_dir, f"{playbook_name}-{stamp}.jsonl.zst")
+            raw = open(self.log_path, 'wb')
+            writer = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+            self.log = io.TextIOWrapper(writer, encoding='utf-8')
+        else:
+            self.log_path = os.path.join(self.log_dir, f"{playbook_name}-{stamp}.jsonl.gz")
+            self.log = gzip.open(self.log_path, 'wt', encoding='utf-8')
+
+    def _write_log(self, record):
+        if self.log is None:
+            return
+        record['ts'] = round(time.time(), 3)
+        self.log.write(json.dumps(record, default=str, sort_keys=True) + '\n')
+
+    # Task bookkeeping
+
+    def _summary(self, task):
+        summary = self.tasks.get(task._uuid)
+        if summary is None:
+            self.task_order += 1
+            summary = self.tasks[task._uuid] = TaskSummary(task.get_name().strip(), self.task_order)
+        return summary
+
+    def _flush_ready(self):
+        """Print tasks every active host has reported on, in start order"""
+        for uuid, summary in sorted(self.tasks.items(), key=lambda item: item[1].order):
+            if self.play_hosts and self.play_hosts <= summary.hosts:
+                self._display.display(summary.line(), color=summary.color())
+                del self.tasks[uuid]
+
+    def _flush_all(self):
+        for summary in sorted(self.tasks.values(), key=lambda s: s.order):
+            self._display.display(summary.line(), color=summary.color())
+        self.tasks = {}
+
+    def _record(self, result, status):
+        host = result._host.get_name()
+        task = result._task
+        summary = self._summary(task)
+        summary.counts[status] += 1
+        summary.hosts.add(host)
+
+        started = self.started.pop((host, task._uuid), None)
+        duration = round(time.time() - started, 3) if started else None
+        if duration is not None:
+            summary.durations[host] = duration
+
+        self._write_log({
+            'play': self.play_name,
+            'task': summary.name,
+            'action': task.action,
+            'host': host,
+            'status': status,
+            'duration': duration,
+            'result': result._result,
+        })
+
+        # Hosts that failed or went unreachable run no further tasks
+        if status in ('failed', 'unreachable'):
+            self.play_hosts.discard(host)
+        self._flush_ready()
+
+    # Playbook events
+
+    def v2_playbook_on_start(self, playbook):
+        playbook_name = os.path.splitext(os.path.basename(playbook._file_name))[0]
+        self._open_log(playbook_name)
+        # Forks actually granted (iac_runtime.py may cap them), for perf_store.py
+        self._write_log({'playbook': playbook_name, 'status': 'start', 'forks': context.CLIARGS.get('forks')})
+
+    def v2_playbook_on_play_start(self, play):
+        self._flush_all()
+        self.play_name = play.get_name().strip()
+        try:
+            # Hosts the play runs on, after --limit is applied
+            inventory = play.get_variable_manager()._inventory
+            self.play_hosts = {host.get_name() for host in inventory.get_hosts(play.hosts)}
+        except Exception:
+            self.play_hosts = set()
+        self._display.banner(f"PLAY [{self.play_name}] ({len(self.play_hosts)} hosts)")
+
+    def v2_runner_on_start(self, host, task):
+        self.started[(host.get_name(), task._uuid)] = time.time()
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, 'changed' if result._result.get('changed', False) else 'ok')
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result, 'skipped')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        if ignore_errors:
+            self._record(result, 'ignored')
+            return
+        self._display.display(
+            f"FAILED: [{result._host.get_name()}] {result._task.get_name().strip()} => "
+            f"{self._dump_results(result._result, indent=4)}",
+            color=C.COLOR_ERROR, stderr=True
+        )
+        self._record(result, 'failed')
+
+    def v2_runner_on_unreachable(self, result):
+        self._display.display(
+            f"UNREACHABLE: [{result._host.get_name()}] {result._task.get_name().strip()} => "
+            f"{self._dump_results(result._result, indent=4)}",
+            color=C.COLOR_UNREACHABLE, stderr=True
+        )
+        self._record(result, 'unreachable')
+
+    def v2_runner_retry(self, result):
+        # async_status polling retries constantly; keep them out of the console
+        self._write_log({
+            'play': self.play_name,
+            'task': result._task.get_name().strip(),
+            'host': result._host.get_name(),
+            'status': 'retry',
+            'attempts': result._result.get('attempts'),
+        })
+
+    def v2_playbook_on_stats(self, stats):
+        self._flush_all()
+        self._display.banner("PLAY RECAP")
+
+        totals = dict.fromkeys(['ok', 'changed', 'failures', 'unreachable', 'skipped', 'ignored'], 0)
+        problem_hosts = []
+        for host in sorted(stats.processed.keys()):
+            summary = stats.summarize(host)
+            for key in totals:
+                totals[key] += summary.get(key, 0)
+            if summary['failures'] or summary['unreachable']:
+                problem_hosts.append(host)
+            self._write_log({'host': host, 'status': 'recap', 'result': summary})
+
+        self._display.display(
+            f"hosts={len(stats.processed)} " + ' '.join(f"{key}={value}" for key, value in totals.items()),
+            color=C.COLOR_ERROR if problem_hosts else C.COLOR_OK
+        )
+        if problem_hosts:
+            self._display.display(f"Failed hosts: {', '.join(problem_hosts)}", color=C.COLOR_ERROR)
+
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+            self._display.display(f"Full per-host results: {self.log_path}")
@@ -0,0 +1,237 @@
+# Free strategy with live straggler detection and host quarantine
+from __future__ import annotations
+
+DOCUMENTATION = '''
+    name: straggler_free
+    short_description: free strategy that flags and optionally quarantines slow hosts
+    description:
+      - Runs like the free strategy, and compares how long each host has been
+        running a task with the median duration of that task on the hosts that
+        already finished it. Hosts past STRAGGLER_MULTIPLE times the median
+        (and at least STRAGGLER_MIN_SECONDS) are flagged while the play runs.
+      - STRAGGLER_POLICY=report only flags them. quarantine (or reclone) stops
+        scheduling tasks on a flagged host that is not in
+        STRAGGLER_PROTECTED_GROUPS and leaves it out of every later play and
+        phase, so the cluster finishes without it. The play does not wait for
+        the task the host is running; its worker runs on until Ansible's own
+        end-of-play cleanup, and a late result is discarded. Masters are
+        protected by default.
+      - Flagged hosts are written to STRAGGLER_REPORT (JSON), which the
+        deployment scripts read to exclude or re-clone quarantined hosts.
+'''
+
+import json
+import os
+import statistics
+import time
+from collections import deque
+
+from ansible.plugins.strategy.free import StrategyModule as FreeStrategyModule
+from ansible.utils.display import Display
+
+display = Display()
+
+# Severity of report actions, a host keeps the most severe one
+ACTIONS = ['reported', 'blocking', 'quarantined', 'reclone']
+
+
+def load_report(path):
+    try:
+        with open(path, 'r') as f:
+            report = json.load(f)
+        if isinstance(report, dict):
+            report.setdefault('hosts', {})
+            return report
+    except (OSError, ValueError):
+        pass
+    return {'hosts': {}}
+
+
+def save_report(path, report):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def result_key(result):
+    """(host name, task uuid) of a task result, normalized or not"""
+    return getattr(result._host, 'name', result._host), getattr(result._task, '_uuid', result._task)
+
+
+class TimedResults(deque):
+    """Result queue that notes when each result arrived and drops the results
+    of tasks the strategy stopped waiting for"""
+
+    def __init__(self, is_detached, on_drop):
+        super().__init__()
+        self.is_detached = is_detached
+        self.on_drop = on_drop
+        self.arrived = {}  # (host, task uuid) -> arrival time
+
+    def append(self, result):
+        self.arrived[result_key(result)] = time.time()
+        super().append(result)
+
+    def popleft(self):
+        while True:
+            result = super().popleft()
+            if not self.is_detached(result):
+                return result
+            self.arrived.pop(result_key(result), None)
+            self.on_drop(result)
+
+
+class StrategyModule(FreeStrategyModule):
+
+    def __init__(self, tqm):
+        super().__init__(tqm)
+        self.multiple = float(os.environ.get('STRAGGLER_MULTIPLE', 3))
+        self.min_seconds = float(os.environ.get('STRAGGLER_MIN_SECONDS', 30))
+        self.min_samples = int(os.environ.get('STRAGGLER_MIN_SAMPLES', 3))
+        self.policy = os.environ.get('STRAGGLER_POLICY', 'report')
+        self.protected_groups = [g for g in os.environ.get('STRAGGLER_PROTECTED_GROUPS', 'k8s_masters').split(',') if g]
+        self.report_path = os.environ.get('STRAGGLER_REPORT', 'logs/stragglers.json')
+        self.check_interval = 1.0
+
+        self._task_started = {}    # (host, task uuid) -> (started, task name)
+        self._detached = set()     # (host, task uuid) of quarantined hosts' running tasks
+        self._task_durations = {}  # task uuid -> [seconds, ...]
+        self._flagged = set()
+        self._last_check = 0
+
+        # Hosts quarantined earlier in this run (any play or phase) stay out
+        report = load_report(self.report_path)
+        self._quarantined = {
+            host for host, entry in report['hosts'].items()
+            if entry.get('action') in ('quarantined', 'reclone')
+        }
+        # Appended and popped under the results lock, so a late result is dropped exactly once
+        self._results = TimedResults(self._is_detached, self._drop_result)
+
+    def run(self, iterator, play_context):
+        result = super().run(iterator, play_context)
+        # A quarantined host's last task may still fail or time out, that
+        # alone does not fail the play for the hosts that carried on
+        if result in (self._tqm.RUN_FAILED_HOSTS, self._tqm.RUN_UNREACHABLE_HOSTS):
+            failed = set(iterator.get_failed_hosts()) | set(self._tqm._unreachable_hosts)
+            if failed and failed <= self._quarantined:
+                display.warning(f"Only quarantined hosts failed: {', '.join(sorted(failed))}")
+                return self._tqm.RUN_OK
+        return result
+
+    def get_hosts_left(self, iterator):
+        return [host for host in super().get_hosts_left(iterator) if host.name not in self._quarantined]
+
+    def normalize_task_result(self, task_result):
+        # A quarantined host's task from an earlier play is unknown here, leave it to be dropped
+        if self._is_detached(task_result):
+            return task_result
+        return super().normalize_task_result(task_result)
+
+    def _is_detached(self, result):
+        key = result_key(result)
+        return key in self._detached or (key[0] in self._quarantined and key not in self._queued_task_cache)
+
+    def _drop_result(self, result):
+        key = result_key(result)
+        self._detached.discard(key)
+        self._queued_task_cache.pop(key, None)
+
+    def _queue_task(self, host, task, task_vars, play_context):
+        # _queue_task returns once a free worker has started the task, so
+        # time spent waiting for a fork is not counted as task time
+        super()._queue_task(host, task, task_vars, play_context)
+        if (host.name, task._uuid) in self._queued_task_cache:
+            self._task_started[(host.name, task._uuid)] = (time.time(), task.get_name().strip())
+
+    def _process_pending_results(self, iterator, one_pass=False, max_passes=None):
+        results = super()._process_pending_results(iterator, one_pass=one_pass, max_passes=max_passes)
+
+        now = time.time()
+        for result in results:
+            host_name, task_uuid = result_key(result)
+            # Results may wait in the queue while a fork is being started, count until they arrived
+            finished = self._results.arrived.pop((host_name, task_uuid), now)
+            started = self._task_started.pop((host_name, task_uuid), None)
+            if started is None:
+                continue
+            duration = finished - started[0]
+            samples = self._task_durations.setdefault(task_uuid, [])
+            # Judge a finished host against the others before adding it
+            self._check_host(iterator, host_name, task_uuid, started[1], duration, samples, running=False)
+            samples.append(duration)
+
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            for (host_name, task_uuid), (task_started, task_name) in list(self._task_started.items()):
+                if (host_name, task_uuid) in self._results.arrived:
+                    continue  # finished, judged once its result is processed
+                samples = self._task_durations.get(task_uuid, [])
+                self._check_host(iterator, host_name, task_uuid, task_name, now - task_started, samples, running=True)
+
+        return results
+
+    def _check_host(self, iterator, host_name, task_uuid, task_name, elapsed, samples, running):
+        if len(samples) < self.min_samples or (host_name, task_uuid) in self._flagged:
+            return
+        median = statistics.median(samples)
+        if elapsed < max(self.multiple * median, self.min_seconds):
+            return
+
+        self._flagged.add((host_name, task_uuid))
+        host = self._inventory.get_host(host_name)
+        protected = any(group.name in self.protected_groups for group in host.get_groups())
+
+        if not running:
+            action = 'reported'
+        elif self.policy in ('quarantine', 'reclone') and not protected:
+            action = 'reclone' if self.policy == 'reclone' else 'quarantined'
+        elif protected:
+            action = 'blocking'
+        else:
+            action = 'reported'
+
+        state = 'still running' if running else 'finished'
+        display.warning(
+            f"STRAGGLER: {host_name} {state} '{task_name}' after {elapsed:.0f}s, "
+            f"median {median:.0f}s over {len(samples)} hosts -> {action}"
+        )
+        self._record(host, iterator, task_name, elapsed, median, len(samples), running, action)
+
+        if action in ('quarantined', 'reclone'):
+            self._quarantine(iterator, host_name)
+
+    def _record(self, host, iterator, task_name, elapsed, median, samples, running, action):
+        report = load_report(self.report_path)
+        entry = report['hosts'].setdefault(host.name, {
+            'original_name': host.vars.get('original_name', host.name),
+            'action': action,
+            'events': [],
+        })
+        if ACTIONS.index(action) > ACTIONS.index(entry.get('action', 'reported')):
+            entry['action'] = action
+        entry['events'].append({
+            'play': iterator._play.get_name().strip(),
+            'task': task_name,
+            'elapsed': round(elapsed, 1),
+            'median': round(median, 1),
+            'samples': samples,
+            'running': running,
+            'ts': int(time.time()),
+        })
+        report['policy'] = self.policy
+        save_report(self.report_path, report)
+
+    def _quarantine(self, iterator, host_name):
+        """Stop scheduling tasks on the host and stop waiting for the one it is running"""
+        for key in [key for key in self._task_started if key[0] == host_name]:
+            del self._task_started[key]
+            self._detached.add(key)
+            self._pending_results -= 1
+        self._blocked_hosts.pop(host_name, None)
+        self._quarantined.add(host_name)
+        display.warning(f"QUARANTINED: {host_name} is left out of the rest of this deployment")
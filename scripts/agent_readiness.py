@@ -0,0 +1,141 @@
+"""
+QEMU guest agent readiness backend for smart_vm_ready.py.
+
+Follows every VM through the guest agent on the Proxmox API instead of
+polling SSH: agent ping (OS booted), network-get-interfaces (inventory IP
+configured) and `cloud-init status --wait` started through agent exec, whose
+exec-status stays open until cloud-init has finished. All VMs are polled
+concurrently and hosts are handed back as soon as they are ready, so SSH is
+only needed to confirm the final step.
+
+Works against a mock API with PROXMOX_API_FIXTURE (see proxmox_api.py).
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from proxmox_api import ProxmoxError
+
+CLOUD_INIT_COMMAND = ['cloud-init', 'status', '--wait']
+# How the guest agent fails an exec of a command the image does not have
+MISSING_COMMAND_ERRORS = ('No such file or directory', 'Failed to execute child process')
+
+
+class AgentHost:
+    """Progress of one VM through the agent stages"""
+
+    def __init__(self, name, info):
+        self.name = name
+        self.node = info['node']
+        self.vmid = int(info['vmid'])
+        self.address = info.get('ansible_host')
+        self.stage = 'agent'
+        self.pid = None
+        self.done = False
+        self.ready = False
+        self.error = None
+        self.reached = {}   # stage -> seconds since the wait started
+        self.timings = {}   # API call -> last round-trip seconds
+
+
+class AgentReadiness:
+    def __init__(self, api, interval=2, timeout=600, max_workers=32):
+        self.api = api
+        self.interval = interval
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.started = None
+
+    def _call(self, host, timing, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            host.timings[timing] = time.perf_counter() - start
+
+    def _reach(self, host, next_stage):
+        host.reached[host.stage] = round(time.time() - self.started, 3)
+        host.stage = next_stage
+        host.error = None
+
+    def step(self, host):
+        """Advance a host as far as the guest allows in this round"""
+        try:
+            if host.stage == 'agent':
+                self._call(host, 'agent_ping', self.api.agent_ping, host.node, host.vmid)
+                self._reach(host, 'network')
+
+            if host.stage == 'network':
+                addresses = self._call(host, 'agent_network', self.api.agent_addresses, host.node, host.vmid)
+                if host.address not in addresses:
+                    return
+                self._reach(host, 'cloud_init')
+
+            if host.stage == 'cloud_init':
+                if host.pid is None:
+                    try:
+                        host.pid = self._call(host, 'agent_exec', self.api.agent_exec,
+                                              host.node, host.vmid, CLOUD_INIT_COMMAND)
+                    except ProxmoxError as e:
+                        if not any(error in str(e) for error in MISSING_COMMAND_ERRORS):
+                            raise
+                        # No cloud-init in the image, nothing to wait for
+                        self._reach(host, 'ready')
+                        host.done = host.ready = True
+                        return
+                status = self._call(host, 'agent_exec', self.api.agent_exec_status, host.node, host.vmid, host.pid)
+                if not status.get('exited'):
+                    return
+                host.pid = None
+                self._cloud_init_finished(host, status)
+        except ProxmoxError as e:
+            # Agent not up yet, or a transient API error: try again next round
+            host.error = str(e)
+
+    def _cloud_init_finished(self, host, status):
+        lines = [line.strip() for line in status.get('out-data', '').splitlines() if line.startswith('status:')]
+        result = lines[-1].split(':', 1)[1].strip() if lines else None
+        if result == 'error':
+            host.done = True
+            host.error = 'cloud-init finished with errors'
+        elif result in ('done', 'disabled'):
+            self._reach(host, 'ready')
+            host.done = host.ready = True
+        elif result is None:
+            # No status line (e.g. a wrapper without cloud-init): let SSH decide
+            host.done = True
+            host.error = f"cloud-init status gave no result (exit code {status.get('exitcode')})"
+        # Anything else (e.g. --wait interrupted): run the check again next round
+
+    def rounds(self, hosts):
+        """Poll all hosts until each is ready, failed or timed out.
+
+        hosts is {name: inventory host vars} with vmid and node. Yields the
+        list of AgentHost objects that finished in each round; on timeout the
+        remaining hosts are yielded with done=True, ready=False.
+        """
+        self.started = time.time()
+        deadline = time.monotonic() + self.timeout
+        states = [AgentHost(name, info) for name, info in hosts.items()]
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(states)))) as executor:
+            while True:
+                round_start = time.monotonic()
+                pending = [host for host in states if not host.done]
+                if not pending:
+                    return
+                list(executor.map(self.step, pending))
+
+                finished = [host for host in pending if host.done]
+                if finished:
+                    yield finished
+
+                if time.monotonic() >= deadline:
+                    stalled = [host for host in states if not host.done]
+                    for host in stalled:
+                        host.done = True
+                        host.error = f"timed out waiting for {host.stage}" + (f" ({host.error})" if host.error else '')
+                    if stalled:
+                        yield stalled
+                    return
+
+                time.sleep(max(0, self.interval - (time.monotonic() - round_start)))
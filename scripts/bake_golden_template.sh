@@ -0,0 +1,102 @@
+#!/bin/bash
+# Bake Golden Template Script
+# Clones the base template, applies parallel phases 1-3 (system prep, container
+# runtime, Kubernetes packages), pre-pulls control plane and CNI images and
+# registers the result as a golden template keyed by those inputs
+# (see scripts/golden_template.py). Runs from the ansible dir and needs the
+# Proxmox credentials (TF_VAR_pm_api_*) and BAKE_VM_IP, a free address for the
+# temporary bake VM.
+
+set -e
+
+# Ensure we're using venv
+. ${WORKSPACE}/venv/bin/activate
+
+GOLDEN_SCRIPT="${WORKSPACE}/scripts/golden_template.py"
+JOURNAL_SCRIPT="${WORKSPACE}/scripts/deploy_journal.py"
+PARALLEL_PLAYBOOKS_DIR="playbooks/parallel"
+
+BAKE_VM_IP=${BAKE_VM_IP:?Set BAKE_VM_IP to a free IP for the bake VM}
+BAKE_VM_GATEWAY=${BAKE_VM_GATEWAY:-10.200.0.254}
+GOLDEN_KEEP=${GOLDEN_KEEP:-1}
+
+eval "$(python3 ${GOLDEN_SCRIPT} env)"
+echo "🍞 Golden template for Kubernetes ${GOLDEN_KUBERNETES_VERSION}, ${GOLDEN_CNI_TYPE} ${GOLDEN_CNI_VERSION}"
+echo "   Base: ${GOLDEN_BASE_TEMPLATE}"
+echo "   Name: ${GOLDEN_NAME}"
+
+if [ "${FORCE_BAKE:-false}" != "true" ] && python3 ${GOLDEN_SCRIPT} find > /dev/null; then
+    echo "✅ Golden template ${GOLDEN_NAME} is already baked for these inputs"
+    exit 0
+fi
+
+# Same connection settings and per-build runtime dir as the deployment
+export ANSIBLE_HOST_KEY_CHECKING=False
+export ANSIBLE_SSH_PIPELINING=True
+export ANSIBLE_CALLBACK_PLUGINS="plugins/callback"
+export ANSIBLE_STDOUT_CALLBACK="${DEPLOY_STDOUT_CALLBACK:-aggregate}"
+export ANSIBLE_AGGREGATE_LOG_DIR="logs"
+eval "$(python3 ${WORKSPACE}/scripts/iac_runtime.py env)"
+
+BAKE_INVENTORY=$(python3 ${WORKSPACE}/scripts/iac_runtime.py path bake-inventory.json)
+python3 ${GOLDEN_SCRIPT} inventory "${BAKE_VM_IP}" > "$BAKE_INVENTORY"
+export ANSIBLE_INVENTORY_FILE="$BAKE_INVENTORY"
+
+echo "🖥️  Cloning bake VM..."
+read -r BAKE_NODE BAKE_VMID < <(python3 ${GOLDEN_SCRIPT} prepare "${BAKE_VM_IP}/24" "${BAKE_VM_GATEWAY}")
+if [ -z "$BAKE_VMID" ]; then
+    echo "❌ Failed to create bake VM"
+    exit 1
+fi
+echo "   VM ${BAKE_VMID} on ${BAKE_NODE} (${BAKE_VM_IP})"
+
+# Never leave a half-baked VM behind
+BAKED=false
+discard_bake_vm() {
+    if [ "$BAKED" != "true" ]; then
+        echo "🧹 Removing bake VM ${BAKE_VMID}"
+        python3 ${GOLDEN_SCRIPT} discard "$BAKE_NODE" "$BAKE_VMID" || true
+    fi
+}
+trap discard_bake_vm EXIT
+
+python3 ${WORKSPACE}/scripts/smart_vm_ready.py "$BAKE_INVENTORY" 1 --attempts 10 --retry-delay 30
+
+# Each phase writes its fingerprint to the node; clones of the template
+# carry those files, so the deployment skips phases 1-3 on them
+for playbook in 01-system-preparation.yml 02-container-runtime.yml 03-kubernetes-packages.yml; do
+    fingerprint=$(python3 ${JOURNAL_SCRIPT} fingerprint ${PARALLEL_PLAYBOOKS_DIR}/${playbook} "$BAKE_INVENTORY")
+    echo "🔧 Baking ${playbook%.yml}"
+    ansible-playbook \
+        -i ../scripts/inventory.py \
+        ${PARALLEL_PLAYBOOKS_DIR}/${playbook} \
+        --ssh-extra-args='-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10' \
+        -e "phase_fingerprint=${fingerprint}" \
+        -e "phase_skip_matching=false"
+done
+
+echo "📦 Pre-pulling images..."
+ansible golden-bake -i ../scripts/inventory.py -m shell \
+    -a "kubeadm config images pull --kubernetes-version v${GOLDEN_KUBERNETES_VERSION}"
+if [ "$GOLDEN_CNI_TYPE" = "cilium" ]; then
+    ansible golden-bake -i ../scripts/inventory.py -m shell \
+        -a "for image in cilium operator-generic; do ctr -n k8s.io images pull quay.io/cilium/\${image}:v${GOLDEN_CNI_VERSION}; done" \
+        || echo "⚠️  CNI image pre-pull failed - nodes will pull them during phase 5"
+fi
+
+echo "🧽 Generalizing bake VM..."
+ansible golden-bake -i ../scripts/inventory.py -m shell -a "
+    cloud-init clean --logs --seed
+    truncate -s 0 /etc/machine-id
+    rm -f /var/lib/dbus/machine-id /etc/ssh/ssh_host_*
+    apt-get clean 2>/dev/null || yum clean all 2>/dev/null || true
+    rm -rf /tmp/k8s-setup
+    sync"
+
+echo "📝 Registering golden template..."
+python3 ${GOLDEN_SCRIPT} register "$BAKE_NODE" "$BAKE_VMID"
+BAKED=true
+
+python3 ${GOLDEN_SCRIPT} prune --keep ${GOLDEN_KEEP}
+
+echo "✅ Golden template ${GOLDEN_NAME} ready"
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Batch remote exec: many named commands over one SSH connection per host.
+
+Every host gets a single SSH connection and its commands run as channels
+multiplexed over it; hosts run concurrently, within the controller-wide SSH
+budget (see iac_runtime.py). Uses asyncssh when installed, otherwise an
+OpenSSH ControlMaster per host (sshpass for password logins) with every
+command sent through the master's control socket.
+
+Results are JSON, so scripts read them instead of scraping Ansible output:
+
+    {"hosts": {"<host>": {"ok": true, "error": null, "duration": 0.41,
+                          "commands": {"<name>": {"rc": 0, "stdout": "...",
+                                                  "stderr": "", "duration": 0.12}}}}}
+
+Hosts and their connection vars (ansible_host, ansible_user, ansible_port,
+ansible_ssh_pass) come from the inventory JSON, like inventory.py.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from deploy_journal import load_inventory
+from iac_runtime import SSHBudget, runtime_path
+
+# Try to import asyncssh, but fall back to OpenSSH multiplexing if not available
+try:
+    import asyncio
+    import asyncssh
+    HAS_ASYNCSSH = True
+except ImportError:
+    HAS_ASYNCSSH = False
+
+DEFAULT_PASSWORD = 'Passw0rd!'
+# OpenSSH's default MaxSessions: channels open at once on one connection
+MAX_SESSIONS = 10
+SSH_OPTIONS = ['-o', 'StrictHostKeyChecking=no', '-o', 'UserKnownHostsFile=/dev/null', '-o', 'LogLevel=ERROR']
+
+
+def inventory_targets(inventory, patterns):
+    """Resolve host and group names (or 'all') to {host: connection vars}"""
+    all_vars = inventory.get('all', {}).get('vars', {})
+    groups = {}
+    for group_name, group_data in inventory.items():
+        if isinstance(group_data, dict) and 'hosts' in group_data:
+            groups[group_name] = group_data['hosts']
+
+    hosts = {}
+    for hosts_in_group in groups.values():
+        for host_name, host_vars in hosts_in_group.items():
+            hosts.setdefault(host_name, {}).update(host_vars or {})
+
+    targets = {}
+    for pattern in patterns:
+        if pattern == 'all':
+            names = list(hosts)
+        elif pattern in groups:
+            names = list(groups[pattern])
+        elif pattern in hosts:
+            names = [pattern]
+        else:
+            raise ValueError(f"No host or group '{pattern}' in inventory")
+        for name in names:
+            info = dict(all_vars, **hosts[name])
+            targets[name] = {
+                'address': info.get('ansible_host', name),
+                'user': info.get('ansible_user', 'root'),
+                'port': int(info.get('ansible_port', 22)),
+                'password': info.get('ansible_ssh_pass', DEFAULT_PASSWORD),
+            }
+    return targets
+
+
+def command_result(rc, stdout, stderr, start):
+    return {'rc': rc, 'stdout': stdout, 'stderr': stderr, 'duration': round(time.perf_counter() - start, 3)}
+
+
+def host_result(commands, start, error=None):
+    return {'ok': error is None, 'error': error, 'duration': round(time.perf_counter() - start, 3),
+            'commands': commands}
+
+
+async def run_host_async(target, commands, timeout, sequential):
+    """All commands for one host as channels on one asyncssh connection"""
+    start = time.perf_counter()
+    try:
+        conn = await asyncssh.connect(
+            target['address'], port=target['port'], username=target['user'],
+            password=target['password'], known_hosts=None, connect_timeout=timeout
+        )
+    except Exception as e:
+        return host_result({}, start, f"connect failed: {e}")
+
+    sessions = asyncio.Semaphore(1 if sequential else MAX_SESSIONS)
+
+    async def run_one(command):
+        async with sessions:
+            command_start = time.perf_counter()
+            try:
+                result = await conn.run(command, check=False, timeout=timeout)
+                rc = result.exit_status if result.exit_status is not None else -1
+                return command_result(rc, result.stdout or '', result.stderr or '', command_start)
+            except Exception as e:
+                return command_result(-1, '', f"{type(e).__name__}: {e}", command_start)
+
+    async with conn:
+        results = await asyncio.gather(*(run_one(command) for command in commands.values()))
+    return host_result(dict(zip(commands, results)), start)
+
+
+async def run_all_async(targets, commands_for, timeout, sequential, max_hosts):
+    hosts = asyncio.Semaphore(max_hosts)
+
+    async def limited(name):
+        async with hosts:
+            return name, await run_host_async(targets[name], commands_for(name), timeout, sequential)
+
+    return dict(await asyncio.gather(*(limited(name) for name in targets)))
+
+
+class ControlMaster:
+    """One OpenSSH master connection per host; commands reuse its control socket"""
+
+    def __init__(self, index, target, timeout):
+        self.target = target
+        self.timeout = timeout
+        # Short socket name, the runtime dir already sits below /tmp (108 byte limit)
+        self.control_path = runtime_path('cp', f"bx-{os.getpid()}-{index}")
+        self.destination = f"{target['user']}@{target['address']}"
+
+    def _ssh(self, *args):
+        return ['ssh', *SSH_OPTIONS, '-p', str(self.target['port']), '-o', f"ControlPath={self.control_path}", *args]
+
+    def start(self):
+        command = self._ssh('-o', 'ControlMaster=yes', '-o', 'ControlPersist=yes',
+                            '-o', f"ConnectTimeout={self.timeout}", '-f', '-N', self.destination)
+        if self.target['password'] and shutil.which('sshpass'):
+            command = ['sshpass', '-p', self.target['password'], *command]
+        else:
+            command[1:1] = ['-o', 'BatchMode=yes']
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, timeout=self.timeout + 5)
+        if result.returncode != 0:
+            raise OSError(result.stderr.strip() or f"ssh exited with {result.returncode}")
+
+    def run(self, command):
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(self._ssh('-o', 'ControlMaster=no', self.destination, command),
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    universal_newlines=True, timeout=self.timeout)
+            return command_result(result.returncode, result.stdout, result.stderr, start)
+        except subprocess.TimeoutExpired:
+            return command_result(-1, '', f"timed out after {self.timeout}s", start)
+
+    def stop(self):
+        subprocess.run(self._ssh('-O', 'exit', self.destination),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_host_openssh(index, target, commands, timeout, sequential):
+    start = time.perf_counter()
+    master = ControlMaster(index, target, timeout)
+    try:
+        master.start()
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return host_result({}, start, f"connect failed: {e}")
+
+    try:
+        workers = 1 if sequential else max(1, min(MAX_SESSIONS, len(commands)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(master.run, commands.values()))
+    finally:
+        master.stop()
+    return host_result(dict(zip(commands, results)), start)
+
+
+def run_batch(targets, commands_for, timeout=30, sequential=False, max_hosts=50):
+    """Run every host's commands, one connection per host, hosts concurrently.
+
+    commands_for(host) returns {name: command}. Returns {host: host result}.
+    """
+    if not targets:
+        return {}
+    # One SSH connection per host counts as one slot of the shared budget
+    with SSHBudget() as budget:
+        slots = budget.acquire(min(len(targets), max_hosts), min_slots=1)
+        if HAS_ASYNCSSH:
+            return asyncio.run(run_all_async(targets, commands_for, timeout, sequential, slots))
+        with ThreadPoolExecutor(max_workers=slots) as executor:
+            futures = {
+                name: executor.submit(run_host_openssh, index, target, commands_for(name), timeout, sequential)
+                for index, (name, target) in enumerate(targets.items())
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+
+def parse_commands(specs):
+    """name=command pairs from the command line, in order"""
+    commands = {}
+    for spec in specs:
+        name, sep, command = spec.partition('=')
+        if not sep or not name:
+            raise ValueError(f"Expected name=command, got '{spec}'")
+        commands[name] = command
+    return commands
+
+
+def cmd_run(args):
+    inventory = load_inventory(args.inventory_file)
+    commands = parse_commands(args.commands)
+    per_host = {}
+    if args.spec:
+        # {"host": {"name": "command"}}: extra commands for individual hosts
+        with open(args.spec, 'r') as f:
+            per_host = json.load(f)
+
+    patterns = [pattern for pattern in args.hosts.split(',') if pattern] + list(per_host)
+    targets = inventory_targets(inventory, patterns)
+    if not commands and not per_host:
+        raise ValueError("No commands given")
+
+    results = run_batch(targets, lambda name: dict(commands, **per_host.get(name, {})),
+                        timeout=args.timeout, sequential=args.sequential, max_hosts=args.max_hosts)
+    output = json.dumps({'hosts': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    # 0: every command on every host succeeded, 1: something failed
+    failed = any(not result['ok'] or any(c['rc'] != 0 for c in result['commands'].values())
+                 for result in results.values())
+    return 1 if failed else 0
+
+
+def cmd_stdout(args):
+    """Print one command's stdout from a results file, exiting with its rc"""
+    with open(args.results_file, 'r') as f:
+        results = json.load(f)
+    command = results['hosts'].get(args.host, {}).get('commands', {}).get(args.name)
+    if command is None:
+        return 2
+    sys.stdout.write(command['stdout'])
+    return command['rc']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run named commands over one SSH connection per host")
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help="Run commands on hosts, print JSON results")
+    run_parser.add_argument('inventory_file', help="Inventory JSON file")
+    run_parser.add_argument('hosts', help="Comma-separated hosts and groups, or 'all'")
+    run_parser.add_argument('commands', nargs='*', metavar='name=command',
+                            help="Commands to run on every host")
+    run_parser.add_argument('--spec', help="JSON file {host: {name: command}} with per-host commands")
+    run_parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    run_parser.add_argument('--timeout', type=int, default=30,
+                            help="Connect and per-command timeout in seconds (default: %(default)s)")
+    run_parser.add_argument('--sequential', action='store_true',
+                            help="Run a host's commands one after another instead of concurrently")
+    run_parser.add_argument('--max-hosts', type=int, default=50,
+                            help="Hosts connected at once (default: %(default)s)")
+
+    stdout_parser = subparsers.add_parser('stdout', help="Print one command's stdout from a results file")
+    stdout_parser.add_argument('results_file')
+    stdout_parser.add_argument('host')
+    stdout_parser.add_argument('name')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'run':
+            sys.exit(cmd_run(args))
+        elif args.command == 'stdout':
+            sys.exit(cmd_stdout(args))
+        parser.print_help()
+        sys.exit(1)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
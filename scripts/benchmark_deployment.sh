@@ -26,32 +26,18 @@ if [ ! -f "deploy_kubernetes_parallel.sh" ]; then
     exit 1
 fi
 
-# Function to clean up cluster between tests
+# Function to clean up cluster between tests: full node reset on all hosts at
+# once (kubeadm, CNI, iptables, containerd, fingerprints and run journal),
+# returning as soon as every host verifies clean (see scripts/reset_cluster.py)
 cleanup_cluster() {
     echo "🧹 Cleaning up existing cluster..."
     
-    # Try to drain and delete nodes
-    FIRST_MASTER=$(${WORKSPACE}/venv/bin/python -c "
-    import json
-    try:
-        with open('inventory/k8s-inventory.json', 'r') as f:
-            inv = json.load(f)
-            masters = list(inv.get('k8s_masters', {}).get('hosts', {}).keys()))
-            if masters:
-                print(masters[0])
-    except:
-        pass
-    " 2>/dev/null || echo "")
-    
-    if [ -n "$FIRST_MASTER" ]; then
-        # Reset cluster
-        ansible all -i ../scripts/inventory.py -m shell -a "kubeadm reset --force" --timeout=60 || true
-        ansible all -i ../scripts/inventory.py -m shell -a "rm -rf /etc/kubernetes" --timeout=30 || true
-        ansible all -i ../scripts/inventory.py -m shell -a "rm -rf ~/.kube" --timeout=30 || true
+    if ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/reset_cluster.py inventory/k8s-inventory.json --full; then
+        echo "✅ Cleanup completed"
+    else
+        echo "❌ Cleanup incomplete - the next run does not start from a clean cluster"
+        echo "Cleanup: INCOMPLETE" >> $BENCHMARK_RESULTS
     fi
-    
-    echo "✅ Cleanup completed"
-    sleep 10
 }
 
 # Function to verify cluster is working
@@ -134,10 +120,6 @@ fi
 # Clean up between tests
 cleanup_cluster
 
-echo ""
-echo "⏳ Waiting 30 seconds before next test..."
-sleep 30
-
 # Test 2: Parallel Deployment
 echo ""
 echo "📊 TEST 2: PARALLEL DEPLOYMENT"
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark the inventory tooling against synthetic large inventories.
+
+Runs inventory.py, generate_inventory_with_cni.py, count_inventory_hosts.py
+and get_first_master.py on generated fixtures (10 to 50k hosts, plain and
+escaped JSON) and reports wall time, peak RSS and output size per tool.
+Results can be saved as a baseline; later runs fail when a tool regresses
+past the threshold.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [10, 1000, 10000, 50000]
+
+# Wall time differences below this are treated as noise
+MIN_WALL_DELTA = 0.05
+
+
+def tool_cases(paths):
+    """(case_name, argv, extra_env) for every tool/fixture combination"""
+    python = sys.executable
+    script = lambda name: os.path.join(SCRIPTS_DIR, name)
+    return [
+        ('inventory.py --list', [python, script('inventory.py'), '--list'],
+         {'ANSIBLE_INVENTORY_FILE': paths['json']}),
+        ('inventory.py --list (escaped)', [python, script('inventory.py'), '--list'],
+         {'ANSIBLE_INVENTORY_FILE': paths['escaped']}),
+        ('generate_inventory_with_cni.py', [python, script('generate_inventory_with_cni.py'), paths['csv']],
+         {}),
+        ('count_inventory_hosts.py', [python, script('count_inventory_hosts.py'), paths['json']],
+         {}),
+        ('count_inventory_hosts.py --details', [python, script('count_inventory_hosts.py'), paths['json'], '--details'],
+         {}),
+        ('get_first_master.py', [python, script('get_first_master.py'), paths['json']],
+         {}),
+        ('get_first_master.py (escaped)', [python, script('get_first_master.py'), paths['escaped']],
+         {}),
+    ]
+
+
+def run_once(argv, extra_env, workdir):
+    """Run a tool once, returning (wall seconds, peak RSS KiB, output bytes, rc)"""
+    env = os.environ.copy()
+    env.update(extra_env)
+    output_path = os.path.join(workdir, 'tool-output')
+
+    with open(output_path, 'wb') as output, open(os.devnull, 'wb') as devnull:
+        start = time.perf_counter()
+        proc = subprocess.Popen(argv, stdout=output, stderr=devnull, env=env, cwd=workdir)
+        # wait4 gives the rusage of this child only, unlike RUSAGE_CHILDREN
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    return wall, rusage.ru_maxrss, os.path.getsize(output_path), proc.returncode
+
+
+def generate_fixtures(size, fixtures_dir):
+    """Generate fixtures in a child process.
+
+    Linux carries a process's peak RSS across fork+exec, so building 50k-host
+    fixtures in this process would inflate every tool's measured peak RSS.
+    """
+    subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'generate_synthetic_inventory.py'),
+         fixtures_dir, str(size)],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    return {
+        'csv': os.path.join(fixtures_dir, f"vms-{size}.csv"),
+        'json': os.path.join(fixtures_dir, f"inventory-{size}.json"),
+        'escaped': os.path.join(fixtures_dir, f"inventory-{size}-escaped.json"),
+    }
+
+
+def run_benchmarks(sizes, repeat, workdir):
+    """Benchmark every tool at every size; best wall time and max RSS over repeats"""
+    results = {}
+    for size in sizes:
+        paths = generate_fixtures(size, os.path.join(workdir, 'fixtures'))
+        for case_name, argv, extra_env in tool_cases(paths):
+            runs = [run_once(argv, extra_env, workdir) for _ in range(repeat)]
+            key = f"{case_name} @ {size}"
+            results[key] = {
+                'tool': case_name,
+                'hosts': size,
+                'wall_seconds': round(min(run[0] for run in runs), 4),
+                'peak_rss_kib': max(run[1] for run in runs),
+                'output_bytes': runs[-1][2],
+                'exit_code': runs[-1][3],
+            }
+            r = results[key]
+            print(f"  {case_name:<36} {size:>6} hosts  {r['wall_seconds']:>8.3f}s  "
+                  f"{r['peak_rss_kib'] / 1024:>8.1f} MiB  {r['output_bytes']:>11} B  rc={r['exit_code']}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages against the baseline"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+
+        wall_limit = base['wall_seconds'] * (1 + threshold)
+        if current['wall_seconds'] > wall_limit and \
+                current['wall_seconds'] - base['wall_seconds'] > MIN_WALL_DELTA:
+            regressions.append(f"{key}: wall time {base['wall_seconds']:.3f}s -> {current['wall_seconds']:.3f}s")
+
+        if current['peak_rss_kib'] > base['peak_rss_kib'] * (1 + threshold):
+            regressions.append(f"{key}: peak RSS {base['peak_rss_kib']} KiB -> {current['peak_rss_kib']} KiB")
+
+        if current['exit_code'] != base['exit_code']:
+            regressions.append(f"{key}: exit code {base['exit_code']} -> {current['exit_code']}")
+
+        if current['output_bytes'] != base['output_bytes']:
+            print(f"  Note: {key} output size changed "
+                  f"{base['output_bytes']} -> {current['output_bytes']} bytes")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inventory tooling on synthetic inventories")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated host counts (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per tool and size, best wall time is kept (default: %(default)s)")
+    parser.add_argument('--baseline', help="Baseline JSON to compare against")
+    parser.add_argument('--save-baseline', help="Write results to this baseline JSON")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed relative slowdown before failing (default: %(default)s)")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    print(f"Benchmarking inventory tools at {', '.join(str(s) for s in sizes)} hosts "
+          f"({args.repeat} runs each)...")
+    with tempfile.TemporaryDirectory(prefix='inventory-bench-') as workdir:
+        results = run_benchmarks(sizes, args.repeat, workdir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nREGRESSIONS (threshold {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    main()
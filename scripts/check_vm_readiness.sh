@@ -44,27 +44,33 @@ fi
 # Use smart VM checker (which now supports both async and sync)
 echo "Using smart VM readiness checker..."
 
-# Quick initial delay
-echo "Waiting 20s for VMs to initialize..."
-sleep 20
+# Time-to-ready is measured from here, before the initial delay
+READINESS_SINCE=$(date +%s)
 
-# Run VM readiness check with retry mechanism
+# The agent backend follows boot and cloud-init through the Proxmox API
+# (TF_VAR_pm_api_* credentials); the SSH backend needs a head start instead
+READINESS_BACKEND=${READINESS_BACKEND:-agent}
+if [ "$READINESS_BACKEND" = "ssh" ]; then
+    echo "Waiting 20s for VMs to initialize..."
+    sleep 20
+fi
+
+# Run VM readiness check with retry mechanism; retries happen inside the
+# checker so per-host latency and attempt counts are collected in one place
 MAX_RETRIES=10
 RETRY_DELAY=30
+mkdir -p metrics
 
-for i in $(seq 1 $MAX_RETRIES); do
-    echo "VM readiness check attempt $i/$MAX_RETRIES..."
-    
-    if ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/smart_vm_ready.py ${INVENTORY_FILE} 20; then
-        echo "All VMs are ready!"
-        break
-    else
-        if [ $i -lt $MAX_RETRIES ]; then
-            echo "Some VMs not ready yet. Waiting ${RETRY_DELAY}s before retry..."
-            sleep $RETRY_DELAY
-        else
-            echo "ERROR: VMs still not ready after $MAX_RETRIES attempts"
-            exit 1
-        fi
-    fi
-done
\ No newline at end of file
+if ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/smart_vm_ready.py ${INVENTORY_FILE} 20 \
+    --attempts $MAX_RETRIES \
+    --retry-delay $RETRY_DELAY \
+    --since $READINESS_SINCE \
+    --backend $READINESS_BACKEND \
+    --metrics-file metrics/vm-readiness.prom \
+    --summary-file metrics/vm-readiness.json \
+    --perf-store; then
+    echo "All VMs are ready!"
+else
+    echo "ERROR: VMs still not ready after $MAX_RETRIES attempts"
+    exit 1
+fi
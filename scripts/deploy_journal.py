@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Phase fingerprints and local run journal for the parallel deployment.
+
+Every phase is keyed by a fingerprint of its inputs (Kubernetes version,
+CNI type/version, container runtime and the playbook content). Playbooks
+write the fingerprint to each node when a phase finishes there, and the
+orchestrator records finished phases in a local journal so a re-run can
+skip completed phases and resume from the one that failed.
+
+The journal also remembers the last inventory that was fully applied, which
+scale-out runs diff against to bootstrap and join only the new hosts.
+
+Host names and IPs can repeat across provisioning runs (fixed IPs in vms.csv),
+so the journal is bound to the VMs terraform created (name with its random
+suffix, vmid and node): when any of them was re-created, the journal is
+cleared and every phase runs again.
+"""
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_JOURNAL_FILE = '.deploy-state/journal.json'
+
+# Inventory vars that change what a phase installs on a node
+FINGERPRINT_VARS = [
+    'kubernetes_version',
+    'cni_type',
+    'cni_version',
+    'container_runtime',
+]
+
+
+def load_inventory(inventory_file):
+    """Load inventory JSON, handling terraform's escaped string output"""
+    with open(inventory_file, 'r') as f:
+        content = f.read().strip()
+
+    # Handle case where terraform output is JSON string (escaped)
+    if content.startswith('"') and content.endswith('"'):
+        content = json.loads(content)
+
+    return json.loads(content) if isinstance(content, str) else content
+
+
+def inventory_hosts(inventory):
+    """Return {host_name: ansible_host} for every host in the inventory"""
+    hosts = {}
+    for group_data in inventory.values():
+        if isinstance(group_data, dict) and 'hosts' in group_data:
+            for host_name, host_vars in group_data['hosts'].items():
+                hosts[host_name] = (host_vars or {}).get('ansible_host', '')
+    return hosts
+
+
+def exclude_hosts(hosts, excluded):
+    """Drop excluded hosts (e.g. quarantined stragglers) from a host map"""
+    return {name: ip for name, ip in hosts.items() if name not in excluded}
+
+
+def hosts_key(hosts):
+    """Stable key for a set of hosts, changes when hosts are added or re-IPed"""
+    payload = json.dumps(sorted(hosts.items()))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    """sha256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def playbook_digest(playbook):
+    """Hash the playbook together with the shared task files it imports"""
+    playbook = Path(playbook)
+    digest = hashlib.sha256(file_digest(playbook).encode('utf-8'))
+    tasks_dir = playbook.parent / 'tasks'
+    if tasks_dir.is_dir():
+        for task_file in sorted(tasks_dir.glob('*.yml')):
+            digest.update(task_file.name.encode('utf-8'))
+            digest.update(file_digest(task_file).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def phase_fingerprint(playbook, inventory):
+    """Fingerprint of everything a phase's result on a node depends on"""
+    all_vars = inventory.get('all', {}).get('vars', {})
+    inputs = {var: str(all_vars.get(var, '')) for var in FINGERPRINT_VARS}
+    inputs['playbook'] = playbook_digest(playbook)
+    payload = json.dumps(inputs, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_journal(journal_file):
+    """Load the run journal, returning an empty one if missing or unreadable"""
+    try:
+        with open(journal_file, 'r') as f:
+            journal = json.load(f)
+        if isinstance(journal, dict):
+            journal.setdefault('phases', {})
+            return journal
+    except (OSError, ValueError):
+        pass
+    return {'phases': {}}
+
+
+def save_journal(journal_file, journal):
+    """Write the journal atomically so an interrupted run never corrupts it"""
+    journal_dir = os.path.dirname(journal_file)
+    if journal_dir:
+        os.makedirs(journal_dir, exist_ok=True)
+    tmp_file = f"{journal_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(journal, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, journal_file)
+
+
+def is_phase_done(journal, phase, fingerprint, hosts):
+    """True when the journal has a successful run of this phase for these inputs"""
+    entry = journal['phases'].get(phase)
+    return (
+        entry is not None
+        and entry.get('status') == 'ok'
+        and entry.get('fingerprint') == fingerprint
+        and entry.get('hosts_key') == hosts_key(hosts)
+    )
+
+
+def record_phase(journal, phase, fingerprint, hosts, status, duration):
+    """Record the outcome of a phase run"""
+    journal['phases'][phase] = {
+        'fingerprint': fingerprint,
+        'hosts_key': hosts_key(hosts),
+        'host_count': len(hosts),
+        'status': status,
+        'duration': duration,
+        'finished_at': int(time.time()),
+    }
+
+
+def vm_identities(created_vms):
+    """{host: identity} from terraform's created_vms output"""
+    return {
+        name: f"{vm.get('final_name')}:{vm.get('vmid')}:{vm.get('node')}"
+        for name, vm in created_vms.items()
+    }
+
+
+def bind_vms(journal, vms):
+    """Bind the journal to the VMs terraform created, clearing it for new VMs.
+
+    Added VMs keep the journal (scale-out); a re-created or unknown VM, or a
+    journal recorded before it was bound to any VMs, clears phases and the
+    applied inventory. vms is None when terraform's VMs could not be read.
+    Returns True when the journal was cleared.
+    """
+    known = journal.get('vms')
+    if vms is None:
+        cleared = True
+    elif known is None:
+        cleared = bool(journal['phases']) or 'applied_hosts' in journal
+    else:
+        cleared = any(vms.get(name) != identity for name, identity in known.items())
+
+    if cleared:
+        journal['phases'] = {}
+        journal.pop('applied_hosts', None)
+        journal.pop('applied_at', None)
+    if vms is None:
+        journal.pop('vms', None)
+    else:
+        journal['vms'] = vms
+    return cleared
+
+
+def journal_files(journal_file):
+    """The run journal plus the per-cluster journals of fleet runs"""
+    state_dir = os.path.dirname(journal_file) or '.'
+    return [journal_file] + sorted(glob.glob(os.path.join(state_dir, '*', os.path.basename(journal_file))))
+
+
+def mark_applied(journal, hosts):
+    """Remember the host set of a fully successful deployment"""
+    journal['applied_hosts'] = hosts
+    journal['applied_at'] = int(time.time())
+
+
+def added_hosts(journal, hosts):
+    """Hosts that are new (or re-IPed) since the last applied inventory.
+
+    Returns None when no deployment has been applied yet.
+    """
+    applied = journal.get('applied_hosts')
+    if applied is None:
+        return None
+    return [name for name, ip in hosts.items() if applied.get(name) != ip]
+
+
+def removed_hosts(journal, hosts):
+    """Hosts from the last applied inventory that are no longer present"""
+    return [name for name in journal.get('applied_hosts', {}) if name not in hosts]
+
+
+def usage():
+    print("Usage: deploy_journal.py <command> [args]")
+    print("  fingerprint <playbook> <inventory_file>")
+    print("  is-done <phase> <fingerprint> <inventory_file>")
+    print("  record <phase> <fingerprint> <inventory_file> <ok|failed> <duration> [--exclude <hosts>]")
+    print("  mark-applied <inventory_file> [--exclude <hosts>]")
+    print("  added-hosts <inventory_file>")
+    print("  bind-vms <created_vms.json>   clear journals when terraform re-created VMs")
+    print("  show")
+    print("  reset [phase ...]")
+    print("")
+    print("Journal file: $DEPLOY_JOURNAL_FILE (default: %s)" % DEFAULT_JOURNAL_FILE)
+    sys.exit(1)
+
+
+def main():
+    if len(sys.argv) < 2:
+        usage()
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+    # Hosts left out of the run (quarantined stragglers) do not count as applied
+    excluded = []
+    if len(args) >= 2 and args[-2] == '--exclude':
+        excluded = [host for host in args[-1].split(',') if host]
+        args = args[:-2]
+    journal_file = os.environ.get('DEPLOY_JOURNAL_FILE', DEFAULT_JOURNAL_FILE)
+
+    try:
+        if command == 'fingerprint' and len(args) == 2:
+            print(phase_fingerprint(args[0], load_inventory(args[1])))
+
+        elif command == 'is-done' and len(args) == 3:
+            phase, fingerprint, inventory_file = args
+            hosts = inventory_hosts(load_inventory(inventory_file))
+            if not is_phase_done(load_journal(journal_file), phase, fingerprint, hosts):
+                sys.exit(1)
+
+        elif command == 'record' and len(args) == 5:
+            phase, fingerprint, inventory_file, status, duration = args
+            hosts = exclude_hosts(inventory_hosts(load_inventory(inventory_file)), excluded)
+            journal = load_journal(journal_file)
+            record_phase(journal, phase, fingerprint, hosts, status, int(duration))
+            save_journal(journal_file, journal)
+
+        elif command == 'mark-applied' and len(args) == 1:
+            journal = load_journal(journal_file)
+            mark_applied(journal, exclude_hosts(inventory_hosts(load_inventory(args[0])), excluded))
+            save_journal(journal_file, journal)
+
+        elif command == 'added-hosts' and len(args) == 1:
+            journal = load_journal(journal_file)
+            hosts = inventory_hosts(load_inventory(args[0]))
+            added = added_hosts(journal, hosts)
+            if added is None:
+                print("No applied inventory recorded - run a full deployment first",
+                      file=sys.stderr)
+                sys.exit(1)
+            removed = removed_hosts(journal, hosts)
+            if removed:
+                print(f"Warning: hosts removed from inventory are not drained: {', '.join(removed)}",
+                      file=sys.stderr)
+            print(','.join(added))
+
+        elif command == 'bind-vms' and len(args) == 1:
+            # terraform output -json created_vms; unreadable means unknown VMs
+            try:
+                with open(args[0], 'r') as f:
+                    vms = vm_identities(json.load(f))
+            except (OSError, ValueError, AttributeError):
+                vms = None
+            for path in journal_files(journal_file):
+                journal = load_journal(path)
+                if bind_vms(journal, vms):
+                    print(f"New VMs - cleared run journal {path}")
+                save_journal(path, journal)
+
+        elif command == 'show' and not args:
+            journal = load_journal(journal_file)
+            for phase, entry in sorted(journal['phases'].items()):
+                print(f"{phase}: {entry['status']} in {entry['duration']}s "
+                      f"({entry['host_count']} hosts, fingerprint {entry['fingerprint'][:12]})")
+            if 'applied_hosts' in journal:
+                print(f"last applied inventory: {len(journal['applied_hosts'])} hosts")
+
+        elif command == 'reset':
+            journal = load_journal(journal_file)
+            if args:
+                for phase in args:
+                    journal['phases'].pop(phase, None)
+            else:
+                journal['phases'] = {}
+            save_journal(journal_file, journal)
+
+        else:
+            usage()
+
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,16 @@ if [ -f "../config/environment.conf" ]; then
     source ../config/environment.conf
 fi
 
+# Per-build runtime dir, shared /tmp paths would collide with concurrent builds
+eval "$(python3 ${WORKSPACE}/scripts/iac_runtime.py env)"
+
+# Fleet mode: vms.csv has a cluster column, deploy every cluster concurrently
+# with the parallel playbooks (see scripts/fleet.py)
+if [ -f "${INVENTORY_FILE}" ] && [ -n "$(python3 ${WORKSPACE}/scripts/fleet.py clusters ${INVENTORY_FILE})" ]; then
+    echo "🚢 Fleet mode - $(python3 ${WORKSPACE}/scripts/fleet.py clusters ${INVENTORY_FILE} | wc -l) clusters in inventory"
+    exec python3 ${WORKSPACE}/scripts/fleet.py deploy ${INVENTORY_FILE}
+fi
+
 # Check if parallel deployment is enabled
 PARALLEL_DEPLOYMENT=${PARALLEL_DEPLOYMENT:-false}
 if [ "$PARALLEL_DEPLOYMENT" = "true" ]; then
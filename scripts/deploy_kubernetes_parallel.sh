@@ -12,8 +12,12 @@ echo "============================================="
 
 # Configuration
 PARALLEL_PLAYBOOKS_DIR="playbooks/parallel"
-INVENTORY_FILE="inventory/k8s-inventory.json"
+INVENTORY_FILE="${INVENTORY_FILE:-inventory/k8s-inventory.json}"
 INVENTORY_SCRIPT="../scripts/inventory.py"
+export ANSIBLE_INVENTORY_FILE="$INVENTORY_FILE"
+# Fleet mode (scripts/fleet.py) runs one deployment per cluster side by side;
+# each keeps its logs and straggler report under logs/<cluster>
+LOG_DIR="logs${FLEET_CLUSTER:+/$FLEET_CLUSTER}"
 PARALLEL_CONFIG="../ansible-parallel.cfg"
 
 # Performance settings
@@ -25,11 +29,30 @@ export ANSIBLE_STRATEGY=free
 export ANSIBLE_GATHER_TIMEOUT=30
 export ANSIBLE_TIMEOUT=60
 
+# Compact console output: one line per task with host counts, full output only
+# for failures; complete per-host results go to a compressed log in logs/
+# (set DEPLOY_STDOUT_CALLBACK=yaml for the old verbose output)
+export ANSIBLE_CALLBACK_PLUGINS="plugins/callback"
+export ANSIBLE_STDOUT_CALLBACK="${DEPLOY_STDOUT_CALLBACK:-aggregate}"
+export ANSIBLE_CALLBACKS_ENABLED=timer
+export ANSIBLE_AGGREGATE_LOG_DIR="$LOG_DIR"
+
 # Load environment configuration
 if [ -f "../config/environment.conf" ]; then
     source ../config/environment.conf
 fi
 
+# Per-build runtime dir for fact cache, SSH control sockets and logs,
+# so concurrent builds on one agent never share /tmp paths
+eval "$(python3 ${WORKSPACE}/scripts/iac_runtime.py env)"
+echo "📂 Runtime dir: ${IAC_RUNTIME_DIR}"
+
+# Scale-out mode: bootstrap and join only hosts added since the last applied inventory
+SCALE_OUT=${SCALE_OUT:-false}
+if [ "$1" = "--scale-out" ]; then
+    SCALE_OUT=true
+fi
+
 # Check if inventory exists
 if [ ! -f "$INVENTORY_FILE" ]; then
     echo "❌ Inventory file not found: $INVENTORY_FILE"
@@ -51,137 +74,252 @@ with open('${INVENTORY_FILE}', 'r') as f:
 echo "   Total hosts: $TOTAL_HOSTS"
 
 # Generate optimized inventory
-if python3 ${WORKSPACE}/scripts/generate_inventory_with_cni.py ${WORKSPACE}/terraform/vms.csv inventory/k8s-inventory.json; then
+# Fleet mode: scripts/fleet.py already wrote this cluster's inventory
+if [ -n "$FLEET_CLUSTER" ]; then
+    echo "✅ Using fleet inventory for cluster $FLEET_CLUSTER"
+elif python3 ${WORKSPACE}/scripts/generate_inventory_with_cni.py ${WORKSPACE}/terraform/vms.csv inventory/k8s-inventory.json; then
     echo "✅ Inventory generated successfully"
 else
     echo "❌ Failed to generate inventory"
     exit 1
 fi
 
+# Run journal: skip phases that already finished with identical inputs
+# and resume from the phase that failed (see scripts/deploy_journal.py)
+JOURNAL_SCRIPT="${WORKSPACE}/scripts/deploy_journal.py"
+export DEPLOY_JOURNAL_FILE="${DEPLOY_JOURNAL_FILE:-.deploy-state/journal.json}"
+RESUME_DEPLOYMENT=${RESUME_DEPLOYMENT:-true}
+
+# Fewest forks a phase starts with when other builds hold most of the SSH budget
+MIN_PHASE_FORKS=${MIN_PHASE_FORKS:-10}
+
+# Performance history: phase, task and deployment timings of every build go
+# into a local SQLite store so regressions show up (see scripts/perf_store.py)
+PERF_SCRIPT="${WORKSPACE}/scripts/perf_store.py"
+export PERF_STORE_DB="${PERF_STORE_DB:-metrics/perf-history.db}"
+export PERF_BUILD_ID="${PERF_BUILD_ID:-${BUILD_TAG:-local-$(date +%Y%m%d-%H%M%S)}}"
+
+# Straggler detection (ansible/plugins/strategy/straggler_free.py): hosts running
+# a task STRAGGLER_MULTIPLE x longer than the median are flagged live; with
+# quarantine/reclone a slow worker is left out and the cluster finishes without it
+STRAGGLER_SCRIPT="${WORKSPACE}/scripts/straggler_report.py"
+export ANSIBLE_STRATEGY_PLUGINS="plugins/strategy"
+export STRAGGLER_POLICY=${STRAGGLER_POLICY:-report}
+export STRAGGLER_MULTIPLE=${STRAGGLER_MULTIPLE:-3}
+export STRAGGLER_REPORT="$LOG_DIR/stragglers.json"
+PHASE_STRATEGY=straggler_free
+python3 ${STRAGGLER_SCRIPT} reset
+
+if [ "$RESUME_DEPLOYMENT" = "true" ]; then
+    echo "🔄 Resume enabled - finished phases and hosts are skipped"
+    python3 ${JOURNAL_SCRIPT} show || true
+else
+    echo "🔄 Resume disabled - clearing run journal"
+    python3 ${JOURNAL_SCRIPT} reset
+fi
+
+# Run one phase playbook unless the journal shows it already completed
+# Usage: run_phase <phase_number> <playbook> <timeout> [extra ansible-playbook args]
+run_phase() {
+    local phase_num=$1
+    local playbook=$2
+    local phase_timeout=$3
+    shift 3
+
+    local phase_name="${playbook%.yml}"
+    local fingerprint
+    fingerprint=$(python3 ${JOURNAL_SCRIPT} fingerprint ${PARALLEL_PLAYBOOKS_DIR}/${playbook} ${INVENTORY_FILE})
+
+    if [ "$RESUME_DEPLOYMENT" = "true" ] && \
+        python3 ${JOURNAL_SCRIPT} is-done "$phase_name" "$fingerprint" ${INVENTORY_FILE}; then
+        echo "⏭️  Phase ${phase_num} already completed with identical inputs - skipping"
+        echo ""
+        printf -v "PHASE${phase_num}_DURATION" '%s' 0
+        printf -v "PHASE${phase_num}_NOTE" '%s' " (skipped)"
+        python3 ${PERF_SCRIPT} phase "$phase_name" 0 ok --skipped --fingerprint "$fingerprint" || true
+        return 0
+    fi
+
+    local phase_start phase_end phase_duration phase_status
+    phase_start=$(date +%s)
+
+    # Forks are capped by the SSH slots this build gets from the shared budget
+    if python3 ${WORKSPACE}/scripts/iac_runtime.py run --slots ${ANSIBLE_FORKS} --min-slots ${MIN_PHASE_FORKS} -- \
+        ansible-playbook \
+        -i ${INVENTORY_SCRIPT} \
+        ${PARALLEL_PLAYBOOKS_DIR}/${playbook} \
+        --timeout=${phase_timeout} \
+        --ssh-extra-args='-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10' \
+        -e "phase_fingerprint=${fingerprint}" \
+        -e "phase_skip_matching=${RESUME_DEPLOYMENT}" \
+        -e "phase_strategy=${PHASE_STRATEGY}" \
+        "$@"; then
+        phase_status=ok
+    else
+        phase_status=failed
+    fi
+
+    phase_end=$(date +%s)
+    phase_duration=$((phase_end - phase_start))
+
+    # Quarantined hosts did not finish the phase, so it is not recorded for them
+    QUARANTINED_HOSTS=$(python3 ${STRAGGLER_SCRIPT} hosts quarantined,reclone)
+    python3 ${JOURNAL_SCRIPT} record "$phase_name" "$fingerprint" ${INVENTORY_FILE} "$phase_status" "$phase_duration" \
+        --exclude "$QUARANTINED_HOSTS"
+    python3 ${PERF_SCRIPT} phase "$phase_name" "$phase_duration" "$phase_status" --since "$phase_start" \
+        --fingerprint "$fingerprint" --forks ${ANSIBLE_FORKS} --log-dir "$LOG_DIR" || true
+
+    if [ "$phase_status" != "ok" ]; then
+        echo "❌ Phase ${phase_num} failed after ${phase_duration}s"
+        echo "   Re-run the deployment to resume from this phase"
+        record_deployment failed
+        exit 1
+    fi
+
+    printf -v "PHASE${phase_num}_DURATION" '%s' "$phase_duration"
+    printf -v "PHASE${phase_num}_NOTE" '%s' ""
+    echo "✅ Phase ${phase_num} completed in ${phase_duration}s"
+    echo ""
+}
+
+# Record the deployment (hosts, strategy, forks, wall time) in the performance store
+# Usage: record_deployment <ok|failed>
+record_deployment() {
+    local deploy_mode=full
+    if [ "$SCALE_OUT" = "true" ]; then
+        deploy_mode=scale-out
+    fi
+    python3 ${PERF_SCRIPT} deploy ${INVENTORY_FILE} "$1" $(( $(date +%s) - OVERALL_START_TIME )) \
+        --started "$OVERALL_START_TIME" --mode "$deploy_mode" --strategy "$PHASE_STRATEGY" \
+        --forks ${ANSIBLE_FORKS} || true
+}
+
 # Record overall start time
 OVERALL_START_TIME=$(date +%s)
 
-echo ""
-echo "🚀 PHASE EXECUTION PLAN"
-echo "======================="
-echo "Phase 1: System Preparation (ALL nodes in parallel)"
-echo "Phase 2: Container Runtime (ALL nodes in parallel)"
-echo "Phase 3: Kubernetes Packages (ALL nodes in parallel)"
-echo "Phase 4A: Initialize Primary Master (1 node)"
-echo "Phase 4B: Join Additional Masters (Parallel)"
-echo "Phase 4C: Join Worker Nodes (ALL workers in parallel)"
-echo "Phase 5: Install CNI (1 master node)"
-echo ""
+if [ "$SCALE_OUT" = "true" ]; then
+    # Diff the inventory against the last fully applied one
+    if ! NEW_HOSTS=$(python3 ${JOURNAL_SCRIPT} added-hosts ${INVENTORY_FILE}); then
+        echo "❌ Scale-out needs a previously applied deployment"
+        exit 1
+    fi
 
-# Phase 1: System Preparation (Maximum Parallelism)
-echo "🔧 PHASE 1: System Preparation (Parallel)"
-echo "=========================================="
-PHASE1_START=$(date +%s)
-
-ansible-playbook \
-    -i ${INVENTORY_SCRIPT} \
-    ${PARALLEL_PLAYBOOKS_DIR}/01-system-preparation.yml \
-    --timeout=300 \
-    --ssh-extra-args='-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10' \
-    -f 50 \
-    -v
-
-PHASE1_END=$(date +%s)
-PHASE1_DURATION=$((PHASE1_END - PHASE1_START))
-echo "✅ Phase 1 completed in ${PHASE1_DURATION}s"
-echo ""
+    if [ -z "$NEW_HOSTS" ]; then
+        echo "✅ No new hosts in inventory - nothing to scale out"
+        exit 0
+    fi
 
-# Phase 2: Container Runtime Installation (Maximum Parallelism)
-echo "🐳 PHASE 2: Container Runtime Installation (Parallel)"
-echo "===================================================="
-PHASE2_START=$(date +%s)
-
-ansible-playbook \
-    -i ${INVENTORY_SCRIPT} \
-    ${PARALLEL_PLAYBOOKS_DIR}/02-container-runtime.yml \
-    --timeout=600 \
-    --ssh-extra-args='-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10' \
-    -f 50 \
-    -v
-
-PHASE2_END=$(date +%s)
-PHASE2_DURATION=$((PHASE2_END - PHASE2_START))
-echo "✅ Phase 2 completed in ${PHASE2_DURATION}s"
-echo ""
+    PRIMARY_MASTER=$(python3 ${WORKSPACE}/scripts/get_first_master.py ${INVENTORY_FILE})
+    if [[ ",${NEW_HOSTS}," == *",${PRIMARY_MASTER},"* ]]; then
+        echo "❌ Primary master ${PRIMARY_MASTER} is new - run a full deployment instead"
+        exit 1
+    fi
 
-# Phase 3: Kubernetes Package Installation (Maximum Parallelism)
-echo "☸️  PHASE 3: Kubernetes Package Installation (Parallel)"
-echo "======================================================"
-PHASE3_START=$(date +%s)
-
-ansible-playbook \
-    -i ${INVENTORY_SCRIPT} \
-    ${PARALLEL_PLAYBOOKS_DIR}/03-kubernetes-packages.yml \
-    --timeout=900 \
-    --ssh-extra-args='-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10' \
-    -f 50 \
-    -v
-
-PHASE3_END=$(date +%s)
-PHASE3_DURATION=$((PHASE3_END - PHASE3_START))
-echo "✅ Phase 3 completed in ${PHASE3_DURATION}s"
-echo ""
+    echo ""
+    echo "📈 SCALE-OUT EXECUTION PLAN"
+    echo "==========================="
+    echo "New hosts: ${NEW_HOSTS//,/, }"
+    echo "Phase 1-3: Bootstrap new hosts only (parallel)"
+    echo "Phase 4: Reuse or refresh join token on ${PRIMARY_MASTER}, join new hosts (parallel)"
+    echo "Phase 5: Skipped (CNI already installed)"
+    echo ""
 
-# Phase 4: Cluster Initialization (Sequential for primary, parallel for others)
-echo "🎯 PHASE 4: Cluster Initialization"
-echo "=================================="
-PHASE4_START=$(date +%s)
-
-ansible-playbook \
-    -i ${INVENTORY_SCRIPT} \
-    ${PARALLEL_PLAYBOOKS_DIR}/04-cluster-initialization.yml \
-    --timeout=600 \
-    --ssh-extra-args='-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10' \
-    -f 50 \
-    -v
-
-PHASE4_END=$(date +%s)
-PHASE4_DURATION=$((PHASE4_END - PHASE4_START))
-echo "✅ Phase 4 completed in ${PHASE4_DURATION}s"
-echo ""
+    echo "🔧 PHASE 1: System Preparation (new hosts)"
+    echo "=========================================="
+    run_phase 1 01-system-preparation.yml 300 --limit "$NEW_HOSTS"
 
-# Phase 5: CNI Installation (Single master)
-echo "🌐 PHASE 5: CNI Installation"
-echo "============================"
-PHASE5_START=$(date +%s)
-
-ansible-playbook \
-    -i ${INVENTORY_SCRIPT} \
-    ${PARALLEL_PLAYBOOKS_DIR}/05-cni-installation.yml \
-    --timeout=600 \
-    --ssh-extra-args='-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10' \
-    -v
-
-PHASE5_END=$(date +%s)
-PHASE5_DURATION=$((PHASE5_END - PHASE5_START))
-echo "✅ Phase 5 completed in ${PHASE5_DURATION}s"
-echo ""
+    echo "🐳 PHASE 2: Container Runtime Installation (new hosts)"
+    echo "===================================================="
+    run_phase 2 02-container-runtime.yml 600 --limit "$NEW_HOSTS"
+
+    echo "☸️  PHASE 3: Kubernetes Package Installation (new hosts)"
+    echo "======================================================"
+    run_phase 3 03-kubernetes-packages.yml 900 --limit "$NEW_HOSTS"
+
+    echo "📈 PHASE 4: Join New Hosts"
+    echo "=========================="
+    run_phase 4 06-scale-out-join.yml 600 \
+        --limit "k8s_masters[0],${NEW_HOSTS}" \
+        -e "scale_out_hosts=${NEW_HOSTS}"
+    PHASE4_NOTE="${PHASE4_NOTE} (scale-out join)"
+
+    PHASE5_DURATION=0
+    PHASE5_NOTE=" (skipped: scale-out)"
+else
+    echo ""
+    echo "🚀 PHASE EXECUTION PLAN"
+    echo "======================="
+    echo "Phase 1: System Preparation (ALL nodes in parallel)"
+    echo "Phase 2: Container Runtime (ALL nodes in parallel)"
+    echo "Phase 3: Kubernetes Packages (ALL nodes in parallel)"
+    echo "Phase 4A: Initialize Primary Master (1 node)"
+    echo "Phase 4B: Join Additional Masters (Parallel)"
+    echo "Phase 4C: Join Worker Nodes (ALL workers in parallel)"
+    echo "Phase 5: Install CNI (1 master node)"
+    echo ""
+
+    # Phase 1: System Preparation (Maximum Parallelism)
+    echo "🔧 PHASE 1: System Preparation (Parallel)"
+    echo "=========================================="
+    run_phase 1 01-system-preparation.yml 300
+
+    # Phase 2: Container Runtime Installation (Maximum Parallelism)
+    echo "🐳 PHASE 2: Container Runtime Installation (Parallel)"
+    echo "===================================================="
+    run_phase 2 02-container-runtime.yml 600
+
+    # Phase 3: Kubernetes Package Installation (Maximum Parallelism)
+    echo "☸️  PHASE 3: Kubernetes Package Installation (Parallel)"
+    echo "======================================================"
+    run_phase 3 03-kubernetes-packages.yml 900
+
+    # Phase 4: Cluster Initialization (Sequential for primary, parallel for others)
+    echo "🎯 PHASE 4: Cluster Initialization"
+    echo "=================================="
+    run_phase 4 04-cluster-initialization.yml 600
+
+    # Phase 5: CNI Installation (Single master)
+    echo "🌐 PHASE 5: CNI Installation"
+    echo "============================"
+    run_phase 5 05-cni-installation.yml 600
+fi
+
+# Remember what is deployed so the next scale-out only touches new hosts;
+# quarantined hosts stay "new" so a later scale-out run joins them
+python3 ${JOURNAL_SCRIPT} mark-applied ${INVENTORY_FILE} --exclude "$(python3 ${STRAGGLER_SCRIPT} hosts quarantined,reclone)"
 
 # Record overall end time
 OVERALL_END_TIME=$(date +%s)
 TOTAL_DURATION=$((OVERALL_END_TIME - OVERALL_START_TIME))
 TOTAL_MINUTES=$((TOTAL_DURATION / 60))
 TOTAL_SECONDS=$((TOTAL_DURATION % 60))
+record_deployment ok
 
 echo "🎉 PARALLEL DEPLOYMENT COMPLETED!"
 echo "================================="
 echo ""
 echo "📊 PERFORMANCE SUMMARY:"
 echo "----------------------"
-echo "Phase 1 (System Prep):      ${PHASE1_DURATION}s"
-echo "Phase 2 (Container Runtime): ${PHASE2_DURATION}s"
-echo "Phase 3 (K8s Packages):     ${PHASE3_DURATION}s"
-echo "Phase 4 (Cluster Init):     ${PHASE4_DURATION}s"
-echo "Phase 5 (CNI Install):      ${PHASE5_DURATION}s"
+echo "Phase 1 (System Prep):      ${PHASE1_DURATION}s${PHASE1_NOTE}"
+echo "Phase 2 (Container Runtime): ${PHASE2_DURATION}s${PHASE2_NOTE}"
+echo "Phase 3 (K8s Packages):     ${PHASE3_DURATION}s${PHASE3_NOTE}"
+echo "Phase 4 (Cluster Init):     ${PHASE4_DURATION}s${PHASE4_NOTE}"
+echo "Phase 5 (CNI Install):      ${PHASE5_DURATION}s${PHASE5_NOTE}"
 echo "----------------------"
 echo "TOTAL TIME: ${TOTAL_MINUTES}m ${TOTAL_SECONDS}s"
 echo ""
 
+# Slowdowns against earlier builds with the same layout
+python3 ${PERF_SCRIPT} check --cluster "${FLEET_CLUSTER:-}" || true
+echo ""
+
+if [ -s "$STRAGGLER_REPORT" ]; then
+    echo "🐢 STRAGGLERS (policy: ${STRAGGLER_POLICY}):"
+    echo "------------------------------------------"
+    python3 ${STRAGGLER_SCRIPT} show
+    echo ""
+fi
+
 # Show cluster status
 echo "📋 CLUSTER STATUS:"
 echo "=================="
@@ -195,16 +333,24 @@ with open('${INVENTORY_FILE}', 'r') as f:
 ")
 
 if [ -n "$FIRST_MASTER" ]; then
+    # All status commands over one SSH session to the master (see scripts/batch_exec.py)
+    STATUS_RESULTS=$(python3 ${WORKSPACE}/scripts/iac_runtime.py path cluster-status${FLEET_CLUSTER:+-$FLEET_CLUSTER}.json)
+    python3 ${WORKSPACE}/scripts/batch_exec.py run ${INVENTORY_FILE} $FIRST_MASTER \
+        cluster_info='kubectl cluster-info' \
+        nodes='kubectl get nodes -o wide' \
+        cni="kubectl get pods -n kube-system | grep -E '(cilium|flannel|calico|weave)'" \
+        --timeout 30 --output "$STATUS_RESULTS" || true
+
     echo "🔍 Cluster Info:"
-    ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m shell -a "kubectl cluster-info" --timeout=30 | grep -A 10 "CHANGED" || true
+    python3 ${WORKSPACE}/scripts/batch_exec.py stdout "$STATUS_RESULTS" $FIRST_MASTER cluster_info || true
     
     echo ""
     echo "🖥️  Node Status:"
-    ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m shell -a "kubectl get nodes -o wide" --timeout=30 | grep -A 20 "CHANGED" || true
+    python3 ${WORKSPACE}/scripts/batch_exec.py stdout "$STATUS_RESULTS" $FIRST_MASTER nodes || true
     
     echo ""
     echo "🌐 CNI Status:"
-    ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m shell -a "kubectl get pods -n kube-system | grep -E '(cilium|flannel|calico|weave)'" --timeout=30 | grep -A 10 "CHANGED" || true
+    python3 ${WORKSPACE}/scripts/batch_exec.py stdout "$STATUS_RESULTS" $FIRST_MASTER cni || true
 fi
 
 echo ""
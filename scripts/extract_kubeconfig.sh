@@ -7,111 +7,95 @@ set -e
 # Ensure we're using venv
 . ${WORKSPACE}/venv/bin/activate
 
+# Per-build runtime dir, shared /tmp paths would collide with concurrent builds
+eval "$(python3 ${WORKSPACE}/scripts/iac_runtime.py env)"
+
 # Debug: Check current directory and inventory
 echo "Current directory: $(pwd)"
 echo "Inventory file: ${INVENTORY_FILE}"
 echo "Inventory content (first 10 lines):"
 head -10 ${INVENTORY_FILE} || echo "Cannot read inventory"
 
-# Test ansible connectivity first
-echo ""
-echo "Testing ansible connectivity to masters..."
-FIRST_MASTER=$(${WORKSPACE}/venv/bin/python -c "
-import json
-with open('${INVENTORY_FILE}', 'r') as f:
-    inv = json.load(f)
-    masters = list(inv.get('k8s_masters', {}).get('hosts', {}).keys())
-    if masters:
-        print(masters[0])
-")
+# Extract KUBECONFIG
+mkdir -p kubeconfig
+mkdir -p ansible/kubeconfig
 
-if [ -n "$FIRST_MASTER" ]; then
-    echo "First master: $FIRST_MASTER"
-    echo "Testing ansible ping..."
-    ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m ping --timeout=10 || echo "Ping failed"
-    
+FIRST_MASTER=$(${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/get_first_master.py ${INVENTORY_FILE})
+
+# has_kubeconfig <file>: a kubeconfig with at least one cluster server.
+# Without admin.conf, `kubectl config view --raw` still prints an empty
+# config (apiVersion: v1, clusters: null), which must not count.
+has_kubeconfig() {
+    [ -s "$1" ] && grep -q "apiVersion:" "$1" && grep -qE "^[[:space:]]*server:[[:space:]]*[^[:space:]]" "$1"
+}
+
+# Fleet mode: one kubeconfig per cluster in kubeconfig/<cluster>/admin.conf;
+# the first cluster's also goes to kubeconfig/admin.conf for the notification
+FLEET_CLUSTERS=$(${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/fleet.py clusters ${INVENTORY_FILE})
+if [ -n "$FLEET_CLUSTERS" ]; then
     echo ""
-    echo "Checking if kubeconfig exists on master..."
-    ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m shell -a "ls -la /etc/kubernetes/admin.conf" --timeout=10 || echo "Cannot check file"
+    echo "Fleet mode: fetching kubeconfigs for $(echo "$FLEET_CLUSTERS" | wc -l) clusters..."
+    ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/fleet.py kubeconfigs ${INVENTORY_FILE} || echo "WARNING: Some kubeconfigs could not be retrieved"
+    for cluster in $FLEET_CLUSTERS; do
+        if has_kubeconfig kubeconfig/$cluster/admin.conf; then
+            mkdir -p ansible/kubeconfig/$cluster
+            cp kubeconfig/$cluster/admin.conf ansible/kubeconfig/$cluster/admin.conf
+        fi
+    done
+    FIRST_CLUSTER=$(echo "$FLEET_CLUSTERS" | head -1)
+    if has_kubeconfig kubeconfig/$FIRST_CLUSTER/admin.conf; then
+        cp kubeconfig/$FIRST_CLUSTER/admin.conf kubeconfig/admin.conf
+    fi
+    FIRST_MASTER=""
 fi
 
-# Extract KUBECONFIG
-mkdir -p kubeconfig
-mkdir -p ansible/kubeconfig
+if [ -n "$FIRST_MASTER" ]; then
+    echo ""
+    echo "First master: $FIRST_MASTER"
+    echo "Reading kubeconfig over one SSH session..."
 
-# Extract kubeconfig using v2 script
-echo ""
-echo "Attempting to extract kubeconfig..."
-if ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/get_kubeconfig_v2.py ${INVENTORY_FILE} kubeconfig/admin.conf; then
-    echo "KUBECONFIG extracted successfully with v2 script"
-    
-    # Verify the kubeconfig file
-    if [ -f kubeconfig/admin.conf ]; then
-        KUBE_SIZE=$(stat -c%s kubeconfig/admin.conf)
-        echo "KUBECONFIG file size: $KUBE_SIZE bytes"
-        
-        if [ $KUBE_SIZE -lt 100 ]; then
-            echo "ERROR: KUBECONFIG file is too small, trying direct ansible approach..."
-            
-            # Fallback: try direct ansible command
-            FIRST_MASTER=$(${WORKSPACE}/venv/bin/python -c "
-import json
-with open('${INVENTORY_FILE}', 'r') as f:
-    inv = json.load(f)
-    masters = list(inv.get('k8s_masters', {}).get('hosts', {}).keys())
-    if masters:
-        print(masters[0])
-")
-            
-            if [ -n "$FIRST_MASTER" ]; then
-                echo "Trying to fetch kubeconfig directly from $FIRST_MASTER..."
-                
-                # Method 1: Try direct fetch
-                echo "Method 1: Using ansible fetch module..."
-                ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m fetch \
-                    -a "src=/etc/kubernetes/admin.conf dest=kubeconfig/admin.conf flat=yes" \
-                    --timeout=30
-                
-                # Check if fetch worked
-                if [ ! -f kubeconfig/admin.conf ] || [ ! -s kubeconfig/admin.conf ]; then
-                    echo "Method 1 failed, trying Method 2..."
-                    
-                    # Method 2: Use shell to cat the file
-                    echo "Method 2: Using ansible shell to cat file..."
-                    ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m shell \
-                        -a "cat /etc/kubernetes/admin.conf" --timeout=30 > kubeconfig/admin.conf.tmp
-                    
-                    # Clean ansible output (remove the first line with hostname and SUCCESS)
-                    if [ -f kubeconfig/admin.conf.tmp ]; then
-                        grep -A 1000 "apiVersion:" kubeconfig/admin.conf.tmp > kubeconfig/admin.conf || true
-                        rm -f kubeconfig/admin.conf.tmp
-                    fi
-                fi
-                
-                # If still no luck, try kubectl config view
-                if [ ! -f kubeconfig/admin.conf ] || [ ! -s kubeconfig/admin.conf ] || ! grep -q "apiVersion:" kubeconfig/admin.conf; then
-                    echo "Method 2 failed, trying Method 3..."
-                    echo "Method 3: Using kubectl config view..."
-                    
-                    ansible $FIRST_MASTER -i ${INVENTORY_SCRIPT} -m shell \
-                        -a "kubectl config view --raw" --timeout=30 > kubeconfig/admin.conf.tmp
-                        
-                    if [ -f kubeconfig/admin.conf.tmp ]; then
-                        grep -A 1000 "apiVersion:" kubeconfig/admin.conf.tmp > kubeconfig/admin.conf || true
-                        rm -f kubeconfig/admin.conf.tmp
-                    fi
-                fi
-            fi
+    # Connectivity, the admin kubeconfig and kubectl's view of it in one
+    # connection instead of an ansible run per check (see scripts/batch_exec.py)
+    EXEC_RESULTS=$(python3 ${WORKSPACE}/scripts/iac_runtime.py path kubeconfig-exec.json)
+    ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/batch_exec.py run ${INVENTORY_FILE} $FIRST_MASTER \
+        ping='true' \
+        admin_conf='cat /etc/kubernetes/admin.conf' \
+        config_view='kubectl config view --raw' \
+        --timeout 30 --output "$EXEC_RESULTS" || true
+
+    if ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/batch_exec.py stdout "$EXEC_RESULTS" $FIRST_MASTER ping > /dev/null; then
+        echo "SSH to $FIRST_MASTER: OK"
+    else
+        echo "SSH to $FIRST_MASTER failed"
+    fi
+
+    for source in admin_conf config_view; do
+        ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/batch_exec.py stdout "$EXEC_RESULTS" $FIRST_MASTER $source \
+            > kubeconfig/admin.conf 2> /dev/null || true
+        if has_kubeconfig kubeconfig/admin.conf; then
+            echo "KUBECONFIG extracted from $source"
+            break
         fi
+    done
+fi
+
+# Fallback: ansible slurp of the known kubeconfig locations
+if ! has_kubeconfig kubeconfig/admin.conf; then
+    echo ""
+    echo "Attempting to extract kubeconfig with v2 script..."
+    if ${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/get_kubeconfig_v2.py ${INVENTORY_FILE} kubeconfig/admin.conf; then
+        echo "KUBECONFIG extracted successfully with v2 script"
     else
-        echo "ERROR: kubeconfig/admin.conf not created!"
+        echo "ERROR: Failed to extract KUBECONFIG"
     fi
-else
-    echo "ERROR: Failed to extract KUBECONFIG"
+fi
+
+if [ -f kubeconfig/admin.conf ]; then
+    echo "KUBECONFIG file size: $(stat -c%s kubeconfig/admin.conf) bytes"
 fi
 
 # Final check and copy to ansible directory
-if [ -f kubeconfig/admin.conf ] && [ -s kubeconfig/admin.conf ]; then
+if has_kubeconfig kubeconfig/admin.conf; then
     echo "KUBECONFIG file exists and has content"
     echo "First 10 lines:"
     head -10 kubeconfig/admin.conf
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Fleet mode: several Kubernetes clusters from one vms.csv and one run.
+
+vms.csv may carry an optional `cluster` column. Terraform provisions every
+row in one apply and tags each host with its cluster; this script splits the
+inventory into one inventory per cluster (inventory/clusters/<cluster>/),
+deploys all clusters concurrently with deploy_kubernetes_parallel.sh and
+fetches one kubeconfig per cluster (kubeconfig/<cluster>/admin.conf).
+
+Everything a run sets up once is shared by the whole fleet: venv, terraform
+providers, the golden template (so packages and images are fetched once per
+version set, not per cluster), the build's fact cache and the controller-wide
+SSH budget, which every cluster's phases draw their forks from. Journal,
+logs and straggler report are kept per cluster.
+
+Without a cluster column nothing changes: `clusters` prints nothing and the
+single-cluster deployment runs as before.
+"""
+import csv
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from deploy_journal import load_inventory
+from iac_runtime import DEFAULT_SSH_BUDGET
+from perf_store import build_id
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+CLUSTERS_DIR = 'inventory/clusters'
+KUBECONFIG_DIR = 'kubeconfig'
+SUMMARY_FILE = 'metrics/fleet-summary.json'
+DEFAULT_CLUSTER = 'default'
+HOST_GROUPS = ('k8s_masters', 'k8s_workers')
+
+
+def csv_clusters(csv_file):
+    """Cluster names in vms.csv order, empty without a cluster column"""
+    with open(csv_file, 'r', newline='') as f:
+        rows = list(csv.DictReader(f))
+    names = [(row.get('cluster') or '').strip() for row in rows]
+    if not any(names):
+        return []
+    return list(dict.fromkeys(name or DEFAULT_CLUSTER for name in names))
+
+
+def host_cluster(host_vars):
+    return str((host_vars or {}).get('cluster') or '').strip()
+
+
+def inventory_clusters(inventory):
+    """Cluster names in inventory order, empty for a single-cluster inventory"""
+    names = [host_cluster(host_vars)
+             for group in HOST_GROUPS
+             for host_vars in inventory.get(group, {}).get('hosts', {}).values()]
+    if not any(names):
+        return []
+    return list(dict.fromkeys(name or DEFAULT_CLUSTER for name in names))
+
+
+def split_inventory(inventory):
+    """{cluster: inventory} with the cluster-level vars recomputed per cluster"""
+    base_vars = dict(inventory.get('all', {}).get('vars', {}))
+    # The reserved VIP belongs to the run's IP range, not to one cluster
+    base_vars.pop('haproxy_vip', None)
+
+    inventories = {}
+    for name in inventory_clusters(inventory):
+        cluster_inventory = {
+            group: {'hosts': {
+                host: host_vars
+                for host, host_vars in inventory.get(group, {}).get('hosts', {}).items()
+                if (host_cluster(host_vars) or DEFAULT_CLUSTER) == name
+            }}
+            for group in HOST_GROUPS
+        }
+        masters = list(cluster_inventory['k8s_masters']['hosts'].values())
+        if not masters:
+            raise ValueError(f"Cluster '{name}' has no master")
+
+        cluster_vars = dict(base_vars)
+        cluster_vars.update({
+            'cluster_name': name,
+            'master_count': len(masters),
+            'is_ha_cluster': len(masters) > 1,
+            'control_plane_endpoint': f"{masters[0]['ansible_host']}:6443",
+        })
+        if len(masters) == 1:
+            for key in ('haproxy_port', 'etcd_cluster'):
+                cluster_vars.pop(key, None)
+        cluster_inventory['k8s_cluster'] = {'children': {group: {} for group in HOST_GROUPS}}
+        cluster_inventory['all'] = {'vars': cluster_vars}
+        inventories[name] = cluster_inventory
+    return inventories
+
+
+def cluster_inventory_file(name):
+    return os.path.join(CLUSTERS_DIR, name, 'k8s-inventory.json')
+
+
+def write_split(inventory):
+    """Write every cluster's inventory, returns {cluster: path}"""
+    paths = {}
+    for name, cluster_inventory in split_inventory(inventory).items():
+        path = cluster_inventory_file(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(cluster_inventory, f, indent=2)
+        paths[name] = path
+    return paths
+
+
+def first_masters(inventory):
+    """First master of each cluster (of the only cluster without fleet mode)"""
+    inventories = split_inventory(inventory) if inventory_clusters(inventory) else {'': inventory}
+    masters = []
+    for cluster_inventory in inventories.values():
+        names = list(cluster_inventory.get('k8s_masters', {}).get('hosts', {}))
+        if names:
+            masters.append(names[0])
+    return masters
+
+
+class PrefixedOutput:
+    """Serializes output lines from concurrent cluster processes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def pump(self, name, stream, log_file):
+        with open(log_file, 'w') as log:
+            for line in stream:
+                log.write(line)
+                with self.lock:
+                    sys.stdout.write(f"[{name}] {line}")
+                    sys.stdout.flush()
+
+
+def run_cluster(name, command, env, output, log_file):
+    """Run one cluster's command, streaming prefixed output; returns (rc, seconds)"""
+    start = time.time()
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               universal_newlines=True, bufsize=1)
+    output.pump(name, process.stdout, log_file)
+    return process.wait(), round(time.time() - start, 1)
+
+
+def deploy_fleet(inventory, scale_out=False, max_parallel=None):
+    """Deploy every cluster concurrently, returns {cluster: {status, duration}}"""
+    paths = write_split(inventory)
+    clusters = list(paths)
+    parallel = max(1, min(max_parallel or len(clusters), len(clusters)))
+
+    # Every cluster draws its forks from the shared SSH budget; a small
+    # minimum lets all clusters start phases instead of queueing for 10 slots
+    budget = int(os.environ.get('IAC_SSH_BUDGET', DEFAULT_SSH_BUDGET))
+    min_forks = max(1, min(int(os.environ.get('MIN_PHASE_FORKS', 10)), budget // parallel))
+
+    command = [os.path.join(SCRIPTS_DIR, 'deploy_kubernetes_parallel.sh')]
+    if scale_out:
+        command.append('--scale-out')
+
+    # All clusters record into the same build of the performance store
+    perf_build_id = build_id()
+
+    output = PrefixedOutput()
+    print(f"🚢 Fleet deployment: {len(clusters)} clusters, {parallel} at a time "
+          f"({', '.join(clusters)})")
+
+    def deploy(name):
+        env = os.environ.copy()
+        env.update({
+            'FLEET_CLUSTER': name,
+            'INVENTORY_FILE': paths[name],
+            'ANSIBLE_INVENTORY_FILE': paths[name],
+            'DEPLOY_JOURNAL_FILE': os.path.join('.deploy-state', name, 'journal.json'),
+            'MIN_PHASE_FORKS': str(min_forks),
+            'PERF_BUILD_ID': perf_build_id,
+        })
+        rc, duration = run_cluster(name, command, env, output, os.path.join('logs', name, 'deploy.log'))
+        return name, {'status': 'ok' if rc == 0 else 'failed', 'rc': rc, 'duration': duration,
+                      'inventory': paths[name]}
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = dict(executor.map(deploy, clusters))
+
+    summary = {'clusters': results, 'duration': round(time.time() - start, 1), 'finished_at': int(time.time())}
+    os.makedirs(os.path.dirname(SUMMARY_FILE), exist_ok=True)
+    with open(SUMMARY_FILE, 'w') as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+    return summary
+
+
+def fetch_kubeconfigs(inventory):
+    """get_kubeconfig_v2.py for every cluster concurrently, returns {cluster: path or None}"""
+    paths = write_split(inventory)
+    output = PrefixedOutput()
+
+    def fetch(name):
+        target = os.path.join(KUBECONFIG_DIR, name, 'admin.conf')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        rc, _ = run_cluster(name, [sys.executable, os.path.join(SCRIPTS_DIR, 'get_kubeconfig_v2.py'),
+                                   paths[name], target],
+                            os.environ.copy(), output, os.path.join('logs', name, 'kubeconfig.log'))
+        return name, target if rc == 0 else None
+
+    with ThreadPoolExecutor(max_workers=max(1, len(paths))) as executor:
+        return dict(executor.map(fetch, paths))
+
+
+def usage():
+    print("Usage: fleet.py <command> [args]")
+    print("  clusters <vms.csv|inventory.json>    cluster names, nothing without a cluster column")
+    print("  split <inventory.json>               write inventory/clusters/<cluster>/k8s-inventory.json")
+    print("  first-masters <inventory.json>       first master of every cluster, comma-separated")
+    print("  deploy <inventory.json> [--scale-out] [--max-parallel N]")
+    print("                                       deploy all clusters concurrently")
+    print("  kubeconfigs <inventory.json>         fetch kubeconfig/<cluster>/admin.conf for all clusters")
+    print("")
+    print("Run from the ansible dir, like the deployment scripts.")
+    sys.exit(1)
+
+
+def main():
+    if len(sys.argv) < 3:
+        usage()
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+
+    try:
+        if command == 'clusters' and len(args) == 1:
+            if args[0].endswith('.csv'):
+                names = csv_clusters(args[0])
+            else:
+                names = inventory_clusters(load_inventory(args[0]))
+            for name in names:
+                print(name)
+
+        elif command == 'split' and len(args) == 1:
+            for name, path in write_split(load_inventory(args[0])).items():
+                print(f"{name}: {path}")
+
+        elif command == 'first-masters' and len(args) == 1:
+            print(','.join(first_masters(load_inventory(args[0]))))
+
+        elif command == 'deploy':
+            inventory_file, options = args[0], args[1:]
+            scale_out, max_parallel = False, None
+            while options:
+                flag = options.pop(0)
+                if flag == '--scale-out':
+                    scale_out = True
+                elif flag == '--max-parallel' and options:
+                    max_parallel = int(options.pop(0))
+                else:
+                    usage()
+            summary = deploy_fleet(load_inventory(inventory_file), scale_out, max_parallel)
+
+            print("")
+            print("🚢 FLEET SUMMARY")
+            print("================")
+            for name, result in summary['clusters'].items():
+                icon = '✅' if result['status'] == 'ok' else '❌'
+                print(f"{icon} {name}: {result['status']} in {result['duration']}s")
+            print(f"Total: {summary['duration']}s for {len(summary['clusters'])} clusters")
+            if any(result['status'] != 'ok' for result in summary['clusters'].values()):
+                sys.exit(1)
+
+        elif command == 'kubeconfigs' and len(args) == 1:
+            results = fetch_kubeconfigs(load_inventory(args[0]))
+            for name, path in results.items():
+                print(f"{name}: {path or 'FAILED'}")
+            if not all(results.values()):
+                sys.exit(1)
+
+        else:
+            usage()
+
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,11 @@ set -e
 
 CSV_FILE=${1:-"../terraform/vms.csv"}
 OUTPUT_FILE=${2:-"inventory/k8s-inventory.json"}
+# Optional: only the rows of one cluster (fleet mode, see scripts/fleet.py)
+CLUSTER_ARGS=""
+if [ -n "$3" ]; then
+    CLUSTER_ARGS="--cluster $3"
+fi
 
 # Create output directory if it doesn't exist
 mkdir -p "$(dirname "$OUTPUT_FILE")"
@@ -19,11 +24,11 @@ if [ -n "$TF_VAR_cni_type" ] && [ -n "$TF_VAR_cni_version" ]; then
     export CNI_VERSION="$TF_VAR_cni_version"
     
     # Use the new CNI-aware script
-    python3 "$(dirname "$0")/generate_inventory_with_cni.py" "$CSV_FILE" > "$OUTPUT_FILE"
+    python3 "$(dirname "$0")/generate_inventory_with_cni.py" "$CSV_FILE" $CLUSTER_ARGS > "$OUTPUT_FILE"
 else
     echo "No CNI parameters provided, using default configuration"
     # Fall back to the original script
-    python3 "$(dirname "$0")/generate_simple_inventory.py" "$CSV_FILE" > "$OUTPUT_FILE"
+    python3 "$(dirname "$0")/generate_simple_inventory.py" "$CSV_FILE" $CLUSTER_ARGS > "$OUTPUT_FILE"
 fi
 
 echo "Ansible inventory generated at: $OUTPUT_FILE"
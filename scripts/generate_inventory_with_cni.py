@@ -8,7 +8,7 @@ import json
 import os
 from pathlib import Path
 
-def generate_inventory_with_cni(csv_file, cni_type=None, cni_version=None):
+def generate_inventory_with_cni(csv_file, cni_type=None, cni_version=None, cluster=None):
     """Generate inventory with dynamic CNI configuration"""
     
     # Read defaults from environment config
@@ -55,6 +55,7 @@ def generate_inventory_with_cni(csv_file, cni_type=None, cni_version=None):
                 'pod_network_cidr': env_config.get('DEFAULT_POD_NETWORK_CIDR', '10.244.0.0/16'),
                 'service_cidr': env_config.get('DEFAULT_SERVICE_CIDR', '10.96.0.0/12'),
                 'kubernetes_version': env_config.get('DEFAULT_KUBERNETES_VERSION', '1.28.0'),
+                'container_runtime': env_config.get('DEFAULT_CONTAINER_RUNTIME', 'containerd'),
                 'cni_type': default_cni_type,
                 'cni_version': default_cni_version
             }
@@ -71,11 +72,18 @@ def generate_inventory_with_cni(csv_file, cni_type=None, cni_version=None):
                 if not vm_name or not ip:
                     continue
                 
+                # Fleet mode: one inventory per value of the optional cluster column
+                row_cluster = (row.get('cluster') or '').strip()
+                if cluster is not None and row_cluster != cluster:
+                    continue
+                
                 host_vars = {
                     'ansible_host': ip,
                     'ansible_user': 'root',
                     'template': row.get('template', 'debian-12')
                 }
+                if row_cluster:
+                    host_vars['cluster'] = row_cluster
                 
                 # Simple classification
                 if 'master' in vm_name.lower():
@@ -101,11 +109,17 @@ def generate_inventory_with_cni(csv_file, cni_type=None, cni_version=None):
 
 def main():
     # Parse command line arguments
-    csv_file = sys.argv[1] if len(sys.argv) > 1 else '../terraform/vms.csv'
+    args = sys.argv[1:]
+    cluster = None
+    if '--cluster' in args and args.index('--cluster') + 1 < len(args):
+        index = args.index('--cluster')
+        cluster = args[index + 1]
+        args = args[:index] + args[index + 2:]
+    csv_file = args[0] if args else '../terraform/vms.csv'
     cni_type = os.environ.get('CNI_TYPE')
     cni_version = os.environ.get('CNI_VERSION')
     
-    inventory = generate_inventory_with_cni(csv_file, cni_type, cni_version)
+    inventory = generate_inventory_with_cni(csv_file, cni_type, cni_version, cluster)
     print(json.dumps(inventory, indent=2))
 
 if __name__ == '__main__':
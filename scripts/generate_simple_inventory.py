@@ -7,7 +7,7 @@ import sys
 import json
 from pathlib import Path
 
-def generate_simple_inventory(csv_file):
+def generate_simple_inventory(csv_file, cluster=None):
     """Generate simple inventory without complex merging that causes issues"""
     
     # Read defaults from environment config
@@ -39,6 +39,7 @@ def generate_simple_inventory(csv_file):
                 'pod_network_cidr': env_config.get('DEFAULT_POD_NETWORK_CIDR', '10.244.0.0/16'),
                 'service_cidr': env_config.get('DEFAULT_SERVICE_CIDR', '10.96.0.0/12'),
                 'kubernetes_version': env_config.get('DEFAULT_KUBERNETES_VERSION', '1.28.0'),
+                'container_runtime': env_config.get('DEFAULT_CONTAINER_RUNTIME', 'containerd'),
                 'cni_type': env_config.get('DEFAULT_CNI_TYPE', 'cilium'),
                 'cni_version': env_config.get('DEFAULT_CNI_VERSION', '1.14.5')
             }
@@ -55,11 +56,18 @@ def generate_simple_inventory(csv_file):
                 if not vm_name or not ip:
                     continue
                 
+                # Fleet mode: one inventory per value of the optional cluster column
+                row_cluster = (row.get('cluster') or '').strip()
+                if cluster is not None and row_cluster != cluster:
+                    continue
+                
                 host_vars = {
                     'ansible_host': ip,
                     'ansible_user': 'root',
                     'template': row.get('template', 'debian-12')
                 }
+                if row_cluster:
+                    host_vars['cluster'] = row_cluster
                 
                 # Simple classification
                 if 'master' in vm_name.lower():
@@ -84,8 +92,14 @@ def generate_simple_inventory(csv_file):
         sys.exit(1)
 
 def main():
-    csv_file = sys.argv[1] if len(sys.argv) > 1 else '../terraform/vms.csv'
-    inventory = generate_simple_inventory(csv_file)
+    args = sys.argv[1:]
+    cluster = None
+    if '--cluster' in args and args.index('--cluster') + 1 < len(args):
+        index = args.index('--cluster')
+        cluster = args[index + 1]
+        args = args[:index] + args[index + 2:]
+    csv_file = args[0] if args else '../terraform/vms.csv'
+    inventory = generate_simple_inventory(csv_file, cluster)
     print(json.dumps(inventory, indent=2))
 
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic vms.csv and terraform-shaped inventory files for benchmarks.
+
+For each requested host count this writes:
+  vms-<n>.csv                  - vms.csv layout as produced by terraform
+  inventory-<n>.json           - ansible_inventory_json output (plain JSON)
+  inventory-<n>-escaped.json   - same inventory as an escaped JSON string,
+                                 like `terraform output` without -raw
+"""
+import csv
+import json
+import os
+import sys
+
+CSV_HEADER = ['vmid', 'vm_name', 'template', 'node', 'ip', 'cores', 'memory', 'disk_size']
+
+
+def synthetic_vms(host_count, master_count=3):
+    """Build deterministic VM rows: master_count masters, the rest workers"""
+    master_count = min(master_count, host_count)
+    vms = []
+    for i in range(host_count):
+        if i < master_count:
+            name = f"kube-master{i + 1:02d}"
+        else:
+            name = f"kube-worker{i - master_count + 1:05d}"
+        # Spread hosts over 10.0.0.0/8 so 50k hosts still get unique IPs
+        vms.append({
+            'vmid': 10000 + i,
+            'vm_name': name,
+            'template': 't-debian12-86',
+            'node': f"pve{i % 8 + 1}",
+            'ip': f"10.{i // 62500}.{i // 250 % 250}.{i % 250 + 1}",
+            'cores': 2,
+            'memory': 2048,
+            'disk_size': '32G',
+        })
+    return vms
+
+
+def terraform_inventory(vms, suffix='bench0000000'):
+    """Inventory in the shape of terraform's ansible_inventory_json output"""
+    masters = [vm for vm in vms if 'master' in vm['vm_name']]
+    first_master_ip = masters[0]['ip'] if masters else ''
+
+    def host_entry(vm):
+        return {
+            'ansible_host': vm['ip'],
+            'vmid': vm['vmid'],
+            'node': vm['node'],
+            'original_name': vm['vm_name'],
+            'template': vm['template'],
+        }
+
+    return {
+        'all': {
+            'vars': {
+                'ansible_user': 'root',
+                'ansible_ssh_common_args': '-o StrictHostKeyChecking=no',
+                'master_count': len(masters),
+                'is_ha_cluster': len(masters) > 1,
+                'pod_network_cidr': '10.244.0.0/16',
+                'service_cidr': '10.96.0.0/12',
+                'kubernetes_version': '1.32.7',
+                'container_runtime': 'containerd',
+                'cni_type': 'cilium',
+                'cni_version': '1.14.5',
+                'control_plane_endpoint': f"{first_master_ip}:6443",
+            }
+        },
+        'k8s_masters': {
+            'hosts': {f"{vm['vm_name']}-{suffix}": host_entry(vm)
+                      for vm in vms if 'master' in vm['vm_name']}
+        },
+        'k8s_workers': {
+            'hosts': {f"{vm['vm_name']}-{suffix}": host_entry(vm)
+                      for vm in vms if 'worker' in vm['vm_name']}
+        },
+        'k8s_cluster': {
+            'children': {
+                'k8s_masters': {},
+                'k8s_workers': {}
+            }
+        },
+    }
+
+
+def write_fixtures(host_count, output_dir, master_count=3):
+    """Write the CSV, plain and escaped inventory for host_count hosts"""
+    os.makedirs(output_dir, exist_ok=True)
+    vms = synthetic_vms(host_count, master_count)
+
+    paths = {
+        'csv': os.path.join(output_dir, f"vms-{host_count}.csv"),
+        'json': os.path.join(output_dir, f"inventory-{host_count}.json"),
+        'escaped': os.path.join(output_dir, f"inventory-{host_count}-escaped.json"),
+    }
+
+    with open(paths['csv'], 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_HEADER)
+        writer.writeheader()
+        writer.writerows(vms)
+
+    inventory_json = json.dumps(terraform_inventory(vms))
+    with open(paths['json'], 'w') as f:
+        f.write(inventory_json)
+    with open(paths['escaped'], 'w') as f:
+        f.write(json.dumps(inventory_json))
+
+    return paths
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: generate_synthetic_inventory.py <output_dir> <host_count> [host_count ...]")
+        print("Example: generate_synthetic_inventory.py /tmp/bench 10 1000 10000 50000")
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    for host_count in sys.argv[2:]:
+        paths = write_fixtures(int(host_count), output_dir)
+        print(f"{host_count} hosts: {paths['csv']}, {paths['json']}, {paths['escaped']}")
+
+
+if __name__ == '__main__':
+    main()
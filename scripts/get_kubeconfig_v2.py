@@ -8,6 +8,8 @@ import subprocess
 import base64
 import os
 
+from iac_runtime import SSHBudget, runtime_path
+
 def get_kubeconfig(inventory_file, output_file=None):
     workspace = os.environ.get('WORKSPACE', os.getcwd())
     inventory_script = os.path.join(workspace, 'scripts', 'inventory.py')
@@ -89,7 +91,8 @@ def get_kubeconfig(inventory_file, output_file=None):
                 
                 # Last resort: try with fetch module
                 print("Trying ansible fetch module as last resort...")
-                temp_file = '/tmp/kubeconfig_temp'
+                # Per master: fleet mode fetches several clusters' configs at once
+                temp_file = runtime_path(f'kubeconfig_temp-{first_master}')
                 
                 cmd = [
                     'ansible', first_master,
@@ -146,5 +149,8 @@ if __name__ == '__main__':
     inventory_file = sys.argv[1]
     output_file = sys.argv[2] if len(sys.argv) > 2 else None
     
-    success = get_kubeconfig(inventory_file, output_file)
+    # Each ansible call opens one SSH session to the master
+    with SSHBudget() as budget:
+        budget.acquire(1)
+        success = get_kubeconfig(inventory_file, output_file)
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Golden VM templates with parallel phases 1-3 already applied.
+
+A golden template is the base template (DEFAULT_VM_TEMPLATE) plus system
+preparation, container runtime and Kubernetes packages for one set of
+inputs. Its key is derived from the base template name and the phase
+fingerprints of playbooks 01-03 (Kubernetes version, container runtime, CNI
+type/version and playbook content, see deploy_journal.py), so any change to
+those inputs selects a different template and a stale one is never used.
+
+Baked templates are named <base>-k8s-<key prefix>, tagged k8s-golden and
+carry the full key and versions as JSON in their description. Nodes cloned
+from one still hold the phase fingerprint files written during the bake, so
+phases 1-3 end early on them.
+
+Set PROXMOX_API_FIXTURE=<file> to run against a JSON fixture instead of the
+Proxmox API (see proxmox_api.py).
+"""
+import csv
+import hashlib
+import json
+import os
+import shlex
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+
+from deploy_journal import phase_fingerprint
+from proxmox_api import ProxmoxAPI, ProxmoxError
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+PLAYBOOKS_DIR = REPO_DIR / 'ansible' / 'playbooks' / 'parallel'
+CONFIG_FILE = REPO_DIR / 'config' / 'environment.conf'
+
+# Phases that only install packages and configure the node itself
+GOLDEN_PHASES = [
+    '01-system-preparation.yml',
+    '02-container-runtime.yml',
+    '03-kubernetes-packages.yml',
+]
+GOLDEN_TAG = 'k8s-golden'
+
+
+def load_config():
+    """Read KEY=value pairs from config/environment.conf"""
+    config = {}
+    if CONFIG_FILE.exists():
+        with open(CONFIG_FILE, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    config[key.strip()] = value.strip()
+    return config
+
+
+def base_template(config):
+    return os.environ.get('GOLDEN_BASE_TEMPLATE') or config.get('DEFAULT_VM_TEMPLATE', 't-debian12-86')
+
+
+def key_vars(config):
+    """The fingerprint vars the terraform inventory will carry for this build"""
+    def pick(name, default):
+        return (os.environ.get(name.upper()) or os.environ.get(f"TF_VAR_{name}")
+                or config.get(f"DEFAULT_{name.upper()}", default))
+
+    return {
+        'kubernetes_version': pick('kubernetes_version', '1.28.0'),
+        'container_runtime': config.get('DEFAULT_CONTAINER_RUNTIME', 'containerd'),
+        'cni_type': pick('cni_type', 'cilium'),
+        'cni_version': pick('cni_version', '1.14.5'),
+    }
+
+
+def golden_fingerprints(variables):
+    """Phase fingerprints, exactly as the deployment computes them"""
+    inventory = {'all': {'vars': variables}}
+    return {
+        playbook[:-len('.yml')]: phase_fingerprint(PLAYBOOKS_DIR / playbook, inventory)
+        for playbook in GOLDEN_PHASES
+    }
+
+
+def golden_key(base, variables):
+    payload = json.dumps({'base': base, 'phases': golden_fingerprints(variables)}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def golden_name(base, key):
+    return f"{base}-k8s-{key[:10]}"
+
+
+def template_info(api, vm):
+    """Decoded description of a golden template, None for anything else"""
+    if GOLDEN_TAG not in str(vm.get('tags', '')).replace(',', ';').split(';'):
+        return None
+    try:
+        info = json.loads(api.config(vm['node'], vm['vmid']).get('description', ''))
+    except ValueError:
+        return None
+    return info if isinstance(info, dict) and 'key' in info else None
+
+
+def golden_templates(api, base):
+    """[(vm, info)] for every golden template baked from this base, newest first"""
+    found = []
+    for vm in api.templates():
+        info = template_info(api, vm)
+        if info and info.get('base') == base:
+            found.append((vm, info))
+    return sorted(found, key=lambda item: item[1].get('baked_at', 0), reverse=True)
+
+
+def find_golden(api, base, key):
+    """The golden template for this key, or None"""
+    name = golden_name(base, key)
+    for vm in api.templates():
+        if vm.get('name') == name:
+            info = template_info(api, vm)
+            if info and info['key'] == key:
+                return vm
+    return None
+
+
+def select_template(api, base, key):
+    """Golden template name when one is baked for this key, else the base"""
+    vm = find_golden(api, base, key)
+    return vm['name'] if vm else base
+
+
+def apply_csv(csv_file, base, template):
+    """Point vms.csv rows cloned from the base template at the selected one"""
+    with open(csv_file, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    changed = 0
+    for row in rows:
+        if row.get('template', '').strip() == base and template != base:
+            row['template'] = template
+            changed += 1
+
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    return changed
+
+
+def bake_inventory(base, variables, ip):
+    """Inventory for the bake VM, same vars as the deployment inventory"""
+    return {
+        'k8s_workers': {'hosts': {'golden-bake': {'ansible_host': ip, 'ansible_user': 'root', 'template': base}}},
+        'k8s_masters': {'hosts': {}},
+        'k8s_cluster': {'children': {'k8s_masters': {}, 'k8s_workers': {}}},
+        'all': {'vars': dict(variables, ansible_user='root')},
+    }
+
+
+def prepare_bake_vm(api, base, key, ip_cidr, gateway, ssh_keys=None):
+    """Full-clone the base template and boot it with a static IP"""
+    source = api.find(base)
+    if source is None or not int(source.get('template', 0)):
+        raise ProxmoxError(f"Base template {base} not found")
+
+    node = source['node']
+    vmid = api.next_vmid()
+    api.clone(node, source['vmid'], vmid, f"bake-{golden_name(base, key)}", full=True)
+
+    config = {'ipconfig0': f"ip={ip_cidr},gw={gateway}", 'ciuser': 'root', 'agent': 1}
+    if ssh_keys:
+        # The API expects the key list URL-encoded inside the form value
+        config['sshkeys'] = urllib.parse.quote(ssh_keys.strip(), safe='')
+    api.set_config(node, vmid, **config)
+    api.start(node, vmid)
+    return node, vmid
+
+
+def register_template(api, node, vmid, base, key, variables):
+    """Shut the bake VM down and turn it into the golden template"""
+    api.shutdown(node, vmid)
+    description = {
+        'key': key,
+        'base': base,
+        'baked_at': int(time.time()),
+        'fingerprints': golden_fingerprints(variables),
+    }
+    description.update(variables)
+    api.set_config(node, vmid, name=golden_name(base, key), tags=GOLDEN_TAG,
+                   description=json.dumps(description, sort_keys=True), delete='ipconfig0')
+    api.convert_to_template(node, vmid)
+    return golden_name(base, key)
+
+
+def prune_templates(api, base, key, keep):
+    """Delete golden templates for other keys, keeping the newest `keep` of them"""
+    stale = [vm for vm, info in golden_templates(api, base) if info['key'] != key]
+    removed = []
+    for vm in stale[keep:]:
+        api.delete(vm['node'], vm['vmid'])
+        removed.append(vm['name'])
+    return removed
+
+
+def usage():
+    print("Usage: golden_template.py <command> [args]")
+    print("  env                          print shell exports: key, name and versions")
+    print("  select                       golden template for this build, or the base template")
+    print("  find                         golden template name; exit 1 when none is baked")
+    print("  apply-csv <vms.csv>          use the golden template for rows cloned from the base")
+    print("  list                         golden templates baked from the base template")
+    print("  inventory <ip>               bake VM inventory JSON")
+    print("  prepare <ip/cidr> <gateway>  clone and start a bake VM, prints '<node> <vmid>'")
+    print("  register <node> <vmid>       shut down the bake VM and convert it to the golden template")
+    print("  discard <node> <vmid>        delete a failed bake VM")
+    print("  prune [--keep N]             delete golden templates for stale keys (default: keep 1)")
+    print("")
+    print("Inputs: KUBERNETES_VERSION, CNI_TYPE, CNI_VERSION (or TF_VAR_*), GOLDEN_BASE_TEMPLATE,")
+    print("        falling back to config/environment.conf defaults")
+    sys.exit(1)
+
+
+def main():
+    if len(sys.argv) < 2:
+        usage()
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+
+    config = load_config()
+    base = base_template(config)
+    variables = key_vars(config)
+    key = golden_key(base, variables)
+
+    try:
+        if command == 'env' and not args:
+            exports = {
+                'GOLDEN_BASE_TEMPLATE': base,
+                'GOLDEN_KEY': key,
+                'GOLDEN_NAME': golden_name(base, key),
+                'GOLDEN_KUBERNETES_VERSION': variables['kubernetes_version'],
+                'GOLDEN_CNI_TYPE': variables['cni_type'],
+                'GOLDEN_CNI_VERSION': variables['cni_version'],
+            }
+            for name, value in exports.items():
+                print(f"export {name}={shlex.quote(value)}")
+
+        elif command == 'select' and not args:
+            print(select_template(ProxmoxAPI.from_env(), base, key))
+
+        elif command == 'find' and not args:
+            vm = find_golden(ProxmoxAPI.from_env(), base, key)
+            if vm is None:
+                sys.exit(1)
+            print(vm['name'])
+
+        elif command == 'apply-csv' and len(args) == 1:
+            template = select_template(ProxmoxAPI.from_env(), base, key)
+            changed = apply_csv(args[0], base, template)
+            if template == base:
+                print(f"No golden template for key {key[:10]} - cloning {base}")
+            else:
+                print(f"Using golden template {template} for {changed} VMs")
+
+        elif command == 'list' and not args:
+            for vm, info in golden_templates(ProxmoxAPI.from_env(), base):
+                current = ' (current)' if info['key'] == key else ''
+                print(f"{vm['name']} vmid={vm['vmid']} node={vm['node']} k8s={info.get('kubernetes_version')} "
+                      f"runtime={info.get('container_runtime')} cni={info.get('cni_type')}/{info.get('cni_version')}"
+                      f"{current}")
+
+        elif command == 'inventory' and len(args) == 1:
+            print(json.dumps(bake_inventory(base, variables, args[0]), indent=2))
+
+        elif command == 'prepare' and len(args) == 2:
+            ssh_keys = None
+            keys_file = os.environ.get('BAKE_SSH_KEYS_FILE')
+            if keys_file:
+                with open(keys_file, 'r') as f:
+                    ssh_keys = f.read()
+            node, vmid = prepare_bake_vm(ProxmoxAPI.from_env(), base, key, args[0], args[1], ssh_keys)
+            print(f"{node} {vmid}")
+
+        elif command == 'register' and len(args) == 2:
+            print(register_template(ProxmoxAPI.from_env(), args[0], int(args[1]), base, key, variables))
+
+        elif command == 'discard' and len(args) == 2:
+            api = ProxmoxAPI.from_env()
+            api.stop(args[0], int(args[1]))
+            api.delete(args[0], int(args[1]))
+
+        elif command == 'prune' and (not args or (len(args) == 2 and args[0] == '--keep')):
+            keep = int(args[1]) if args else 1
+            for name in prune_templates(ProxmoxAPI.from_env(), base, key, keep):
+                print(f"Removed stale golden template {name}")
+
+        else:
+            usage()
+
+    except (ProxmoxError, OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
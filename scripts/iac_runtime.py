@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Per-build runtime directories and a controller-wide SSH concurrency budget.
+
+Every build gets its own runtime directory (fact cache, SSH control sockets,
+Ansible log and temp files) so several builds can run on one Jenkins agent
+without colliding on shared /tmp paths. The directory is derived from
+$BUILD_TAG, or taken from $IAC_RUNTIME_DIR when set.
+
+Concurrent SSH sessions are limited across all builds on the controller by a
+pool of slot files in $IAC_SSH_SLOT_DIR: holding an flock on a slot file
+holds one SSH slot. Locks are released by the kernel when the holder exits,
+so a killed build never leaks slots.
+"""
+import fcntl
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SSH_BUDGET = 100
+POLL_INTERVAL = 0.5
+
+
+def runtime_dir():
+    """Runtime directory for this build, created on first use"""
+    path = os.environ.get('IAC_RUNTIME_DIR')
+    if not path:
+        build_tag = os.environ.get('BUILD_TAG') or f"local-{os.getuid()}"
+        # Keep it short: SSH control sockets live below it (108 byte limit)
+        build_tag = re.sub(r'[^A-Za-z0-9_.-]', '-', build_tag)[-48:]
+        path = os.path.join(tempfile.gettempdir(), f"iac-{build_tag}")
+    for subdir in ('facts', 'cp', 'tmp'):
+        os.makedirs(os.path.join(path, subdir), exist_ok=True)
+    return path
+
+
+def runtime_path(*parts):
+    """Path inside the build's runtime directory"""
+    return os.path.join(runtime_dir(), *parts)
+
+
+def ansible_env(path):
+    """Ansible settings that point every shared path into the runtime dir"""
+    return {
+        'IAC_RUNTIME_DIR': path,
+        'ANSIBLE_CACHE_PLUGIN_CONNECTION': os.path.join(path, 'facts'),
+        'ANSIBLE_SSH_CONTROL_PATH_DIR': os.path.join(path, 'cp'),
+        # %C is a hash of host, port and user, keeps socket paths short
+        'ANSIBLE_SSH_CONTROL_PATH': '%(directory)s/%%C',
+        'ANSIBLE_LOCAL_TEMP': os.path.join(path, 'tmp'),
+        'ANSIBLE_LOG_PATH': os.path.join(path, 'ansible.log'),
+    }
+
+
+class SSHBudget:
+    """Cross-process counting semaphore for SSH sessions, built on flock"""
+
+    def __init__(self, size=None, slot_dir=None):
+        self.size = size or int(os.environ.get('IAC_SSH_BUDGET', DEFAULT_SSH_BUDGET))
+        self.slot_dir = slot_dir or os.environ.get(
+            'IAC_SSH_SLOT_DIR', os.path.join(tempfile.gettempdir(), 'iac-ssh-slots')
+        )
+        self.held = []
+        os.makedirs(self.slot_dir, exist_ok=True)
+
+    def _try_slot(self, index):
+        fd = os.open(os.path.join(self.slot_dir, f"slot-{index:04d}"), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.held.append(fd)
+        return True
+
+    def acquire(self, wanted, min_slots=1, timeout=None):
+        """Grab up to `wanted` free slots, waiting until at least `min_slots` are held.
+
+        Returns the number of slots held. Raises TimeoutError if min_slots
+        could not be reached within timeout seconds.
+        """
+        wanted = max(1, min(wanted, self.size))
+        min_slots = max(1, min(min_slots, wanted))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        announced = False
+
+        while True:
+            # Start at a per-process offset so builds don't all probe slot 0 first
+            offset = os.getpid() % self.size
+            for i in range(self.size):
+                if len(self.held) >= wanted:
+                    break
+                self._try_slot((offset + i) % self.size)
+
+            if len(self.held) >= min_slots:
+                return len(self.held)
+
+            if deadline is not None and time.monotonic() >= deadline:
+                self.release()
+                raise TimeoutError(f"SSH budget: {min_slots} of {self.size} slots not free in {timeout}s")
+            if not announced:
+                print(f"Waiting for SSH budget: {len(self.held)}/{min_slots} slots free "
+                      f"(budget {self.size}, {self.slot_dir})", file=sys.stderr)
+                announced = True
+            time.sleep(POLL_INTERVAL)
+
+    def release(self):
+        for fd in self.held:
+            os.close(fd)
+        self.held = []
+
+    def in_use(self):
+        """Slots currently held by any process"""
+        busy = 0
+        for i in range(self.size):
+            if self._try_slot(i):
+                os.close(self.held.pop())
+            else:
+                busy += 1
+        return busy
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def usage():
+    print("Usage: iac_runtime.py <command> [args]")
+    print("  env                        print shell exports for this build's runtime dir")
+    print("  path <name>                print a path inside the runtime dir")
+    print("  run --slots N [--min-slots M] -- <command...>")
+    print("                             run a command holding N SSH slots (ANSIBLE_FORKS=N)")
+    print("  status                     show SSH budget usage")
+    print("  cleanup                    remove this build's runtime dir")
+    print("")
+    print("Budget: $IAC_SSH_BUDGET slots (default: %d) in $IAC_SSH_SLOT_DIR" % DEFAULT_SSH_BUDGET)
+    sys.exit(1)
+
+
+def run_with_slots(args):
+    """run --slots N [--min-slots M] -- command..."""
+    if '--' not in args:
+        usage()
+    split = args.index('--')
+    options, command = args[:split], args[split + 1:]
+    if not command:
+        usage()
+
+    wanted, min_slots = None, None
+    while options:
+        flag = options.pop(0)
+        if flag == '--slots' and options:
+            wanted = int(options.pop(0))
+        elif flag == '--min-slots' and options:
+            min_slots = int(options.pop(0))
+        else:
+            usage()
+    if wanted is None:
+        usage()
+
+    with SSHBudget() as budget:
+        granted = budget.acquire(wanted, min_slots if min_slots is not None else wanted)
+        if granted < wanted:
+            print(f"SSH budget: running with {granted} of {wanted} requested slots", file=sys.stderr)
+        env = os.environ.copy()
+        env['ANSIBLE_FORKS'] = str(granted)
+        env['IAC_SSH_SLOTS'] = str(granted)
+        return subprocess.call(command, env=env)
+
+
+def main():
+    if len(sys.argv) < 2:
+        usage()
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+
+    if command == 'env' and not args:
+        for name, value in ansible_env(runtime_dir()).items():
+            print(f"export {name}={shlex.quote(value)}")
+
+    elif command == 'path' and len(args) == 1:
+        print(runtime_path(args[0]))
+
+    elif command == 'run':
+        sys.exit(run_with_slots(args))
+
+    elif command == 'status' and not args:
+        budget = SSHBudget()
+        print(f"SSH budget: {budget.in_use()}/{budget.size} slots in use ({budget.slot_dir})")
+
+    elif command == 'cleanup' and not args:
+        shutil.rmtree(runtime_dir(), ignore_errors=True)
+
+    else:
+        usage()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/bin/bash
+# Node Reset Script
+# Runs ON each cluster node (pushed by scripts/reset_cluster.py in a single
+# remote execution per host) and returns it to the state right after phase 3:
+# packages installed, no cluster state. Removes kubeadm state, CNI config and
+# interfaces, Kubernetes iptables/IPVS rules and every container in the
+# k8s.io containerd namespace, then verifies the result.
+#
+# Usage: node_reset.sh [--full]
+#   --full   also remove the phase 1-3 fingerprints, so every phase re-runs
+#
+# Prints one "RESET_STATE clean" or "RESET_STATE dirty: <leftovers>" line
+# and exits 0 when clean, 3 when something is left behind.
+
+FULL=false
+if [ "$1" = "--full" ]; then
+    FULL=true
+fi
+
+FINGERPRINT_DIR=/etc/k8s-deploy
+# Interfaces created by the supported CNIs (cilium, flannel, calico, weave) and kube-proxy
+CNI_LINKS='^(cni0|flannel\.|cilium_|lxc|vxlan\.calico|cali|weave|vethwe|datapath|kube-ipvs0|kube-bridge)'
+# iptables chains created by kube-proxy, the CNIs and the bridge/portmap plugins; other host rules are kept
+CLUSTER_CHAINS='^(KUBE-|CNI-|CILIUM|cali-|FLANNEL|WEAVE)'
+CLUSTER_PROCESSES='kube-apiserver|kube-controller|kube-scheduler|kube-proxy|etcd|cilium-agent|flanneld|calico-node|weaver'
+
+export PATH=$PATH:/usr/local/bin:/usr/sbin:/sbin
+
+reset_node() {
+    kubeadm reset --force > /dev/null 2>&1
+    systemctl stop kubelet 2> /dev/null
+
+    # Pods and containers, before their mounts and network namespaces go away
+    if command -v crictl > /dev/null; then
+        crictl rmp --all --force > /dev/null 2>&1
+    fi
+    if command -v ctr > /dev/null; then
+        ctr -n k8s.io tasks ls -q 2> /dev/null | xargs -r -n1 ctr -n k8s.io tasks kill -s SIGKILL > /dev/null 2>&1
+        ctr -n k8s.io containers ls -q 2> /dev/null | xargs -r ctr -n k8s.io containers rm > /dev/null 2>&1
+    fi
+
+    # Leftover kubelet volume mounts would make the rm below fail
+    awk '$2 ~ "^/var/lib/kubelet/" {print $2}' /proc/mounts | sort -r | xargs -r umount -l 2> /dev/null
+
+    rm -rf /etc/kubernetes /var/lib/etcd /var/lib/kubelet/* /var/lib/cni /var/run/cilium \
+        /etc/cni/net.d/* /root/.kube /home/*/.kube
+    for link in $(ip -o link show | awk -F': ' '{print $2}' | cut -d@ -f1 | grep -E "$CNI_LINKS"); do
+        ip link delete "$link" 2> /dev/null
+    done
+
+    # Drop only the cluster chains and the rules jumping to them, like kube-proxy --cleanup
+    for cmd in iptables ip6tables; do
+        command -v $cmd-save > /dev/null && command -v $cmd-restore > /dev/null || continue
+        rules=$($cmd-save 2> /dev/null) || continue
+        printf '%s\n' "$rules" | awk -v chains="$CLUSTER_CHAINS" '
+            /^:/ && substr($1, 2) ~ chains { next }
+            /^-A / {
+                if ($2 ~ chains) next
+                for (i = 3; i < NF; i++)
+                    if (($i == "-j" || $i == "-g") && $(i + 1) ~ chains) next
+            }
+            { print }
+        ' | $cmd-restore 2> /dev/null
+    done
+    if command -v ipvsadm > /dev/null; then
+        ipvsadm --clear 2> /dev/null
+    fi
+
+    # Phases 4+ must run again; phases 1-3 only with --full
+    if [ "$FULL" = "true" ]; then
+        rm -rf "$FINGERPRINT_DIR"
+    else
+        rm -f "$FINGERPRINT_DIR"/0[4-9]-*.fingerprint
+    fi
+
+    # Fresh containerd without stale shims; images stay cached
+    if systemctl is-active --quiet containerd; then
+        systemctl restart containerd
+    fi
+}
+
+verify_node() {
+    local dirty=()
+
+    for path in /etc/kubernetes /var/lib/etcd /root/.kube; do
+        [ -e "$path" ] && dirty+=("$path")
+    done
+    [ -n "$(ls -A /etc/cni/net.d 2> /dev/null)" ] && dirty+=("/etc/cni/net.d")
+    systemctl is-active --quiet kubelet && dirty+=("kubelet")
+    pgrep -x "$CLUSTER_PROCESSES" > /dev/null 2>&1 && dirty+=("processes")
+    if command -v ctr > /dev/null && [ -n "$(ctr -n k8s.io containers ls -q 2> /dev/null)" ]; then
+        dirty+=("containers")
+    fi
+    ip -o link show | awk -F': ' '{print $2}' | cut -d@ -f1 | grep -qE "$CNI_LINKS" && dirty+=("interfaces")
+    if command -v iptables-save > /dev/null && iptables-save 2> /dev/null | grep -qE "^:${CLUSTER_CHAINS#^}"; then
+        dirty+=("iptables")
+    fi
+    ls "$FINGERPRINT_DIR"/0[4-9]-*.fingerprint > /dev/null 2>&1 && dirty+=("fingerprints")
+
+    if [ ${#dirty[@]} -eq 0 ]; then
+        echo "RESET_STATE clean"
+        return 0
+    fi
+    echo "RESET_STATE dirty: ${dirty[*]}"
+    return 3
+}
+
+reset_node
+verify_node
@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+"""
+Historical performance store with regression checks across builds.
+
+Every build records its timings into one local SQLite database
+($PERF_STORE_DB, default metrics/perf-history.db):
+
+  - deployments: per cluster, total time, host counts, mode, strategy, forks
+  - phases: per phase duration, status, forks granted and input fingerprint
+  - tasks: per task p50/p95/max over hosts, from the aggregate callback log
+  - readiness: per stage latency and time-to-ready from smart_vm_ready.py
+  - stages: Jenkins stage durations
+
+Collectors are called by deploy_kubernetes_parallel.sh (phase, deploy),
+smart_vm_ready.py --perf-store and the Jenkinsfile (stage). `trend` and
+`tasks` show how the numbers move across builds; `check` compares a build
+with a rolling baseline of earlier comparable builds and flags slowdowns
+that are statistically significant and large enough to matter.
+
+Builds are identified by $PERF_BUILD_ID, else $BUILD_TAG.
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from deploy_journal import load_inventory
+from predict_deployment import open_log
+
+DEFAULT_DB = 'metrics/perf-history.db'
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    build_id TEXT PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    git_commit TEXT,
+    hosts INTEGER
+);
+CREATE TABLE IF NOT EXISTS deployments (
+    build_id TEXT NOT NULL,
+    cluster TEXT NOT NULL,
+    started_at REAL,
+    duration REAL,
+    status TEXT,
+    mode TEXT,
+    hosts INTEGER,
+    masters INTEGER,
+    workers INTEGER,
+    strategy TEXT,
+    forks INTEGER,
+    straggler_policy TEXT,
+    PRIMARY KEY (build_id, cluster)
+);
+CREATE TABLE IF NOT EXISTS phases (
+    build_id TEXT NOT NULL,
+    cluster TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    started_at REAL,
+    duration REAL,
+    status TEXT,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    hosts INTEGER,
+    forks INTEGER,
+    fingerprint TEXT,
+    PRIMARY KEY (build_id, cluster, phase)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    build_id TEXT NOT NULL,
+    cluster TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    play TEXT NOT NULL,
+    task TEXT NOT NULL,
+    action TEXT,
+    hosts INTEGER,
+    p50 REAL,
+    p95 REAL,
+    max REAL,
+    PRIMARY KEY (build_id, cluster, phase, play, task)
+);
+CREATE TABLE IF NOT EXISTS readiness (
+    build_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    backend TEXT,
+    count INTEGER,
+    p50 REAL,
+    p95 REAL,
+    max REAL,
+    complete INTEGER,
+    PRIMARY KEY (build_id, stage)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    build_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    duration REAL,
+    status TEXT,
+    PRIMARY KEY (build_id, stage)
+);
+"""
+
+# Regression check defaults: baseline size, family-wise error rate and the
+# smallest slowdown worth reporting, relative and absolute
+DEFAULT_WINDOW = 10
+DEFAULT_MIN_BUILDS = 5
+DEFAULT_ALPHA = 0.05
+DEFAULT_MIN_SLOWDOWN = 0.2
+DEFAULT_MIN_SECONDS = 5
+# Spread assumed for a baseline with (nearly) identical values, in log space
+MIN_LOG_SPREAD = 0.02
+# Metrics of one cluster's deployment; readiness and Jenkins stages are build-wide
+CLUSTER_KINDS = ('deploy', 'phase', 'task')
+
+
+def store_path():
+    return os.environ.get('PERF_STORE_DB', DEFAULT_DB)
+
+
+def build_id():
+    return os.environ.get('PERF_BUILD_ID') or os.environ.get('BUILD_TAG') or \
+        f"local-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def git_commit():
+    commit = os.environ.get('GIT_COMMIT')
+    if commit:
+        return commit
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() or None
+
+
+class PerfStore:
+    def __init__(self, path=None):
+        self.path = path or store_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Fleet clusters record side by side; WAL lets readers run during writes
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            with self.conn:
+                self.conn.executescript(SCHEMA)
+                self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ensure_build(self, build):
+        self.conn.execute('INSERT OR IGNORE INTO builds (build_id, recorded_at, git_commit) VALUES (?, ?, ?)',
+                          (build, time.time(), git_commit()))
+
+    # Collectors
+
+    def record_phase(self, build, cluster, phase, duration, status, skipped=False, started_at=None,
+                     fingerprint=None, forks=None, task_log=None):
+        """One phase of one cluster, with per-task timings from its aggregate log"""
+        tasks, hosts = {}, set()
+        if task_log:
+            tasks, hosts, log_forks = read_task_log(task_log)
+            forks = log_forks or forks
+        with self.conn:
+            self._ensure_build(build)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO phases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (build, cluster, phase, started_at, duration, status, int(skipped),
+                 len(hosts) or None, forks, fingerprint)
+            )
+            self.conn.execute('DELETE FROM tasks WHERE build_id = ? AND cluster = ? AND phase = ?',
+                              (build, cluster, phase))
+            self.conn.executemany(
+                'INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(build, cluster, phase, play, task, entry['action'], len(entry['hosts']),
+                  round(percentile(entry['samples'], 0.5), 3), round(percentile(entry['samples'], 0.95), 3),
+                  round(max(entry['samples']), 3))
+                 for (play, task), entry in tasks.items()]
+            )
+
+    def record_deployment(self, build, cluster, inventory, status, duration, started_at=None, mode='full',
+                          strategy=None, forks=None, straggler_policy=None):
+        masters = len(inventory.get('k8s_masters', {}).get('hosts', {}))
+        workers = len(inventory.get('k8s_workers', {}).get('hosts', {}))
+        with self.conn:
+            self._ensure_build(build)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO deployments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (build, cluster, started_at, duration, status, mode, masters + workers, masters, workers,
+                 strategy, forks, straggler_policy)
+            )
+
+    def record_readiness(self, build, summary, backend=None):
+        """Stage latencies and time-to-ready from a readiness_metrics summary"""
+        rows = [(stage, stats['count'], stats['p50'], stats['p95'], stats['max'])
+                for stage, stats in summary.get('stages', {}).items()]
+        ready = [h['time_to_ready'] for h in summary.get('hosts', {}).values() if h.get('time_to_ready') is not None]
+        if ready:
+            rows.append(('time_to_ready', len(ready), round(percentile(ready, 0.5), 3),
+                         round(percentile(ready, 0.95), 3), round(max(ready), 3)))
+        complete = int(summary.get('hosts_ready', 0) == summary.get('hosts_total', 0))
+        with self.conn:
+            self._ensure_build(build)
+            self.conn.execute('UPDATE builds SET hosts = ? WHERE build_id = ?', (summary.get('hosts_total'), build))
+            self.conn.execute('DELETE FROM readiness WHERE build_id = ?', (build,))
+            self.conn.executemany('INSERT INTO readiness VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                  [(build, stage, backend, count, p50, p95, peak, complete)
+                                   for stage, count, p50, p95, peak in rows])
+
+    def record_stage(self, build, stage, duration, status='ok'):
+        with self.conn:
+            self._ensure_build(build)
+            self.conn.execute('INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?)', (build, stage, duration, status))
+
+    # Queries
+
+    def latest_build(self):
+        row = self.conn.execute('SELECT build_id FROM builds ORDER BY recorded_at DESC LIMIT 1').fetchone()
+        return row['build_id'] if row else None
+
+    def build_info(self, build):
+        """(hosts, recorded_at) of a build; hosts from readiness, else summed over clusters"""
+        row = self.conn.execute(
+            'SELECT COALESCE(b.hosts, (SELECT SUM(d.hosts) FROM deployments d WHERE d.build_id = b.build_id)) '
+            'AS hosts, recorded_at FROM builds b WHERE b.build_id = ?', (build,)
+        ).fetchone()
+        return row
+
+    def metrics(self, build):
+        """[(metric, value, detail)] for a build; metric is a (kind, cluster, name) key"""
+        values = []
+        for row in self.conn.execute('SELECT * FROM deployments WHERE build_id = ?', (build,)):
+            values.append((('deploy', row['cluster'], 'total'), row['duration'], None))
+        for row in self.conn.execute('SELECT * FROM phases WHERE build_id = ? AND skipped = 0', (build,)):
+            values.append((('phase', row['cluster'], row['phase']), row['duration'], row['fingerprint']))
+        for row in self.conn.execute('SELECT * FROM tasks WHERE build_id = ?', (build,)):
+            values.append((('task', row['cluster'], f"{row['phase']} [{row['play']}] {row['task']}"),
+                           row['p50'], None))
+        for row in self.conn.execute('SELECT * FROM readiness WHERE build_id = ?', (build,)):
+            values.append((('readiness', '', row['stage']), row['p95'], None))
+        for row in self.conn.execute('SELECT * FROM stages WHERE build_id = ?', (build,)):
+            values.append((('stage', '', row['stage']), row['duration'], None))
+        return [(metric, value, detail) for metric, value, detail in values if value is not None]
+
+    def baseline_builds(self, build, cluster, window):
+        """Earlier builds comparable to this one, newest first.
+
+        A cluster's deployment compares with successful deployments of the same
+        cluster, host count, mode and strategy; build-wide numbers (readiness,
+        Jenkins stages) with builds of the same host count.
+        """
+        current = self.build_info(build)
+        if current is None:
+            return []
+        if cluster is None:
+            rows = self.conn.execute(
+                'SELECT build_id FROM builds b WHERE recorded_at < ? AND '
+                'COALESCE(b.hosts, (SELECT SUM(d.hosts) FROM deployments d WHERE d.build_id = b.build_id)) IS ? '
+                'ORDER BY recorded_at DESC LIMIT ?', (current['recorded_at'], current['hosts'], window)
+            )
+            return [row['build_id'] for row in rows]
+
+        deployment = self.conn.execute('SELECT * FROM deployments WHERE build_id = ? AND cluster = ?',
+                                       (build, cluster)).fetchone()
+        if deployment is None:
+            return []
+        rows = self.conn.execute(
+            "SELECT d.build_id FROM deployments d JOIN builds b USING (build_id) "
+            "WHERE d.cluster = ? AND d.hosts = ? AND d.mode IS ? AND d.strategy IS ? AND d.status = 'ok' "
+            "AND b.recorded_at < ? ORDER BY b.recorded_at DESC LIMIT ?",
+            (cluster, deployment['hosts'], deployment['mode'], deployment['strategy'],
+             current['recorded_at'], window)
+        )
+        return [row['build_id'] for row in rows]
+
+    def baseline_values(self, builds):
+        """{metric: [values]} for the given builds, successful phases and stages only"""
+        values = {}
+        if not builds:
+            return values
+        marks = ','.join('?' * len(builds))
+        queries = [
+            ("SELECT 'deploy' AS kind, cluster, 'total' AS name, duration AS value "
+             f"FROM deployments WHERE build_id IN ({marks})"),
+            ("SELECT 'phase', cluster, phase, duration FROM phases "
+             f"WHERE build_id IN ({marks}) AND skipped = 0 AND status = 'ok'"),
+            ("SELECT 'task', cluster, phase || ' [' || play || '] ' || task, p50 FROM tasks "
+             f"WHERE build_id IN ({marks})"),
+            ("SELECT 'readiness', '', stage, p95 FROM readiness "
+             f"WHERE build_id IN ({marks}) AND complete = 1"),
+            (f"SELECT 'stage', '', stage, duration FROM stages WHERE build_id IN ({marks}) AND status = 'ok'"),
+        ]
+        for query in queries:
+            for kind, cluster, name, value in self.conn.execute(query, builds):
+                if value is not None:
+                    values.setdefault((kind, cluster, name), []).append(value)
+        return values
+
+    def previous_fingerprint(self, build, cluster, phase):
+        row = self.conn.execute(
+            'SELECT p.fingerprint FROM phases p JOIN builds b USING (build_id) '
+            'WHERE p.cluster = ? AND p.phase = ? AND b.recorded_at < '
+            '(SELECT recorded_at FROM builds WHERE build_id = ?) AND p.skipped = 0 '
+            'ORDER BY b.recorded_at DESC LIMIT 1', (cluster, phase, build)
+        ).fetchone()
+        return row['fingerprint'] if row else None
+
+
+def find_task_log(log_dir, phase, since=None):
+    """Newest aggregate callback log of a phase, written at or after since"""
+    paths = [path for path in glob.glob(os.path.join(log_dir, f"{phase}-*.jsonl.*"))
+             if since is None or os.path.getmtime(path) >= since]
+    return max(paths, key=os.path.basename) if paths else None
+
+
+def read_task_log(path):
+    """({(play, task): {'action', 'hosts', 'samples'}}, hosts, forks) from an aggregate log"""
+    tasks, hosts, forks = {}, set(), None
+    stream = open_log(path)
+    if stream is None:
+        return tasks, hosts, forks
+    try:
+        with stream:
+            for line in stream:
+                record = json.loads(line)
+                if record.get('status') == 'start':
+                    forks = record.get('forks')
+                    continue
+                if record.get('status') in ('recap', 'retry') or record.get('duration') is None:
+                    continue
+                entry = tasks.setdefault((record.get('play') or '', record['task']),
+                                         {'action': record.get('action'), 'hosts': set(), 'samples': []})
+                entry['hosts'].add(record['host'])
+                entry['samples'].append(record['duration'])
+                hosts.add(record['host'])
+    except (OSError, ValueError, EOFError):
+        # A phase that failed or was killed leaves a truncated log; keep what was read
+        pass
+    return tasks, hosts, forks
+
+
+# Statistics
+
+def _betacf(a, b, x):
+    """Continued fraction for the incomplete beta function (modified Lentz)"""
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 201):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return result
+
+
+def _betainc(a, b, x):
+    """Regularized incomplete beta function I_x(a, b)"""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1 - x) / b
+
+
+def t_sf(t, df):
+    """P(T > t) for Student's t distribution with df degrees of freedom"""
+    tail = 0.5 * _betainc(df / 2, 0.5, df / (df + t * t))
+    return tail if t > 0 else 1.0 - tail
+
+
+def slowdown_p_value(value, baseline):
+    """One-sided p-value that value comes from the baseline's distribution.
+
+    Durations are compared in log space (slowdowns are multiplicative and the
+    distributions right-skewed), using the t prediction interval for one new
+    observation from a sample of len(baseline).
+    """
+    logs = [math.log(max(v, 0.1)) for v in baseline]
+    n = len(logs)
+    mean = sum(logs) / n
+    spread = math.sqrt(sum((v - mean) ** 2 for v in logs) / (n - 1))
+    spread = max(spread, MIN_LOG_SPREAD)
+    t = (math.log(max(value, 0.1)) - mean) / (spread * math.sqrt(1 + 1 / n))
+    return t_sf(t, n - 1)
+
+
+def check_build(store, build, window=DEFAULT_WINDOW, min_builds=DEFAULT_MIN_BUILDS, alpha=DEFAULT_ALPHA,
+                min_slowdown=DEFAULT_MIN_SLOWDOWN, min_seconds=DEFAULT_MIN_SECONDS, cluster=None):
+    """Compare every metric of a build (of one cluster's deployment) with its rolling baseline.
+
+    Returns (regressions, tested): regressions are the slowdowns significant
+    after Holm's correction over all tested metrics that are also at least
+    min_slowdown and min_seconds above the baseline median.
+    """
+    current = store.metrics(build)
+    if cluster is not None:
+        current = [entry for entry in current if entry[0][0] in CLUSTER_KINDS and entry[0][1] == cluster]
+    baselines = {}
+    for name in {metric[1] for metric, _, _ in current if metric[0] in CLUSTER_KINDS}:
+        baselines[name] = store.baseline_values(store.baseline_builds(build, name, window))
+    build_wide = store.baseline_values(store.baseline_builds(build, None, window))
+
+    tested = []
+    for metric, value, fingerprint in current:
+        kind, metric_cluster, name = metric
+        history = (baselines.get(metric_cluster, {}) if kind in CLUSTER_KINDS else build_wide).get(metric, [])
+        if len(history) < min_builds:
+            continue
+        inputs_changed = kind == 'phase' and fingerprint is not None and \
+            fingerprint != store.previous_fingerprint(build, metric_cluster, name)
+        tested.append({
+            'kind': kind, 'cluster': metric_cluster, 'name': name, 'value': value,
+            'baseline': round(median(history), 3), 'builds': len(history),
+            'p_value': slowdown_p_value(value, history), 'inputs_changed': inputs_changed,
+        })
+
+    # Holm-Bonferroni: stop at the first p-value above its threshold
+    significant = []
+    for rank, entry in enumerate(sorted(tested, key=lambda e: e['p_value'])):
+        if entry['p_value'] > alpha / (len(tested) - rank):
+            break
+        significant.append(entry)
+
+    regressions = [
+        entry for entry in significant
+        if entry['value'] >= entry['baseline'] * (1 + min_slowdown) and
+        entry['value'] - entry['baseline'] >= min_seconds
+    ]
+    for entry in regressions:
+        entry['slowdown'] = round(entry['value'] / entry['baseline'] - 1, 3) if entry['baseline'] else None
+        entry['p_value'] = float(f"{entry['p_value']:.3g}")
+    return regressions, len(tested)
+
+
+# Command line
+
+def metric_label(entry):
+    prefix = f"[{entry['cluster']}] " if entry['cluster'] else ''
+    return f"{prefix}{entry['kind']} {entry['name']}"
+
+
+def format_seconds(value):
+    if value is None:
+        return '-'
+    return f"{value:.0f}s" if value >= 10 else f"{value:.1f}s"
+
+
+def cmd_phase(args, store):
+    task_log = find_task_log(args.log_dir, args.phase, args.since) if args.log_dir else None
+    store.record_phase(build_id(), os.environ.get('FLEET_CLUSTER', ''), args.phase, args.duration, args.status,
+                       skipped=args.skipped, started_at=args.since, fingerprint=args.fingerprint,
+                       forks=args.forks, task_log=task_log)
+    return 0
+
+
+def cmd_deploy(args, store):
+    store.record_deployment(build_id(), os.environ.get('FLEET_CLUSTER', ''), load_inventory(args.inventory_file),
+                            args.status, args.duration, started_at=args.started, mode=args.mode,
+                            strategy=args.strategy, forks=args.forks,
+                            straggler_policy=os.environ.get('STRAGGLER_POLICY'))
+    return 0
+
+
+def cmd_stage(args, store):
+    store.record_stage(build_id(), args.stage, args.duration, args.status)
+    return 0
+
+
+def cmd_trend(args, store):
+    query = 'SELECT d.*, b.git_commit, b.recorded_at FROM deployments d JOIN builds b USING (build_id)'
+    params = []
+    if args.cluster is not None:
+        query += ' WHERE d.cluster = ?'
+        params.append(args.cluster)
+    query += ' ORDER BY b.recorded_at DESC LIMIT ?'
+    params.append(args.last)
+    deployments = list(reversed(store.conn.execute(query, params).fetchall()))
+    if not deployments:
+        print(f"No deployments recorded in {store.path}")
+        return 0
+
+    print(f"{'build':<28} {'when':<16} {'cluster':<10} {'status':<7} {'hosts':>5} {'forks':>5} "
+          f"{'commit':<8} {'total':>6}  phases 1-5")
+    for row in deployments:
+        phases = {p['phase'][:2]: p for p in store.conn.execute(
+            'SELECT * FROM phases WHERE build_id = ? AND cluster = ?', (row['build_id'], row['cluster']))}
+        # Scale-out runs its join playbook (06) as phase 4
+        phases.setdefault('04', phases.get('06'))
+        cells = []
+        for number in ('01', '02', '03', '04', '05'):
+            phase = phases.get(number)
+            cells.append('skip' if phase and phase['skipped'] else format_seconds(phase and phase['duration']))
+        print(f"{row['build_id'][:28]:<28} {time.strftime('%Y-%m-%d %H:%M', time.localtime(row['recorded_at'])):<16} "
+              f"{(row['cluster'] or '-')[:10]:<10} {row['status'] or '-':<7} {row['hosts']:>5} "
+              f"{row['forks'] or '-':>5} {(row['git_commit'] or '-')[:8]:<8} {format_seconds(row['duration']):>6}  "
+              + ' '.join(f"{cell:>5}" for cell in cells))
+
+    if args.stages:
+        builds = list(dict.fromkeys(row['build_id'] for row in deployments))
+        print("")
+        print(f"{'build':<28} {'readiness p95':>13}  Jenkins stages")
+        for build in builds:
+            ready = store.conn.execute("SELECT p95 FROM readiness WHERE build_id = ? AND stage = 'time_to_ready'",
+                                       (build,)).fetchone()
+            stages = store.conn.execute('SELECT stage, duration FROM stages WHERE build_id = ?', (build,)).fetchall()
+            print(f"{build[:28]:<28} {format_seconds(ready and ready['p95']):>13}  "
+                  + ', '.join(f"{s['stage']} {format_seconds(s['duration'])}" for s in stages))
+    return 0
+
+
+def cmd_tasks(args, store):
+    build = args.build or store.latest_build()
+    if build is None:
+        print(f"No builds recorded in {store.path}")
+        return 0
+    cluster = args.cluster if args.cluster is not None else os.environ.get('FLEET_CLUSTER', '')
+    query = 'SELECT * FROM tasks WHERE build_id = ? AND cluster = ?'
+    params = [build, cluster]
+    if args.phase:
+        query += ' AND phase = ?'
+        params.append(args.phase)
+    rows = store.conn.execute(query + ' ORDER BY p50 DESC LIMIT ?', params + [args.top]).fetchall()
+    if not rows:
+        print(f"No task timings for build {build}")
+        return 0
+
+    baseline = store.baseline_values(store.baseline_builds(build, cluster, args.window))
+    print(f"Slowest tasks of {build} (median over hosts, baseline: median of up to {args.window} earlier builds)")
+    print(f"{'p50':>7} {'max':>7} {'baseline':>8} {'change':>7}  task")
+    for row in rows:
+        history = baseline.get(('task', cluster, f"{row['phase']} [{row['play']}] {row['task']}"), [])
+        base = median(history) if history else None
+        change = f"{(row['p50'] / base - 1) * 100:+.0f}%" if base else '-'
+        print(f"{format_seconds(row['p50']):>7} {format_seconds(row['max']):>7} {format_seconds(base):>8} "
+              f"{change:>7}  {row['phase']} [{row['play']}] {row['task']}")
+    return 0
+
+
+def cmd_check(args, store):
+    build = args.build or os.environ.get('PERF_BUILD_ID') or os.environ.get('BUILD_TAG') or store.latest_build()
+    if build is None or store.build_info(build) is None:
+        print(f"No performance data recorded for build {build or '-'}")
+        return 0
+
+    regressions, tested = check_build(store, build, args.window, args.min_builds, args.alpha,
+                                      args.min_slowdown, args.min_seconds, args.cluster)
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump({'build': build, 'tested': tested, 'regressions': regressions}, f, indent=2)
+
+    if not tested:
+        print(f"📈 Not enough comparable history for {build} yet "
+              f"(needs {args.min_builds} earlier builds with the same layout)")
+        return 0
+    if not regressions:
+        print(f"📈 No significant slowdowns in {build} ({tested} timings checked against their baseline)")
+        return 0
+
+    print(f"🐌 {len(regressions)} significant slowdowns in {build} ({tested} timings checked):")
+    for entry in sorted(regressions, key=lambda e: e['value'] - e['baseline'], reverse=True):
+        note = ' (phase inputs changed)' if entry['inputs_changed'] else ''
+        print(f"   {metric_label(entry)}: {format_seconds(entry['value'])} vs {format_seconds(entry['baseline'])} "
+              f"baseline ({entry['slowdown'] * 100:+.0f}%, p={entry['p_value']}, {entry['builds']} builds){note}")
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record deployment timings per build and flag regressions")
+    parser.add_argument('--db', help=f"SQLite database (default: $PERF_STORE_DB or {DEFAULT_DB})")
+    subparsers = parser.add_subparsers(dest='command')
+
+    phase_parser = subparsers.add_parser('phase', help="Record one phase and its per-task timings")
+    phase_parser.add_argument('phase', help="Phase name, e.g. 04-cluster-initialization")
+    phase_parser.add_argument('duration', type=float, help="Phase wall time in seconds")
+    phase_parser.add_argument('status', help="ok or failed")
+    phase_parser.add_argument('--skipped', action='store_true', help="Phase was skipped by the run journal")
+    phase_parser.add_argument('--since', type=float, help="Epoch seconds the phase started at")
+    phase_parser.add_argument('--fingerprint', help="Phase input fingerprint from deploy_journal.py")
+    phase_parser.add_argument('--forks', type=int, help="Forks requested, if the log does not say")
+    phase_parser.add_argument('--log-dir', help="Aggregate callback log dir to read task timings from")
+
+    deploy_parser = subparsers.add_parser('deploy', help="Record one cluster deployment")
+    deploy_parser.add_argument('inventory_file', help="Inventory JSON file")
+    deploy_parser.add_argument('status', help="ok or failed")
+    deploy_parser.add_argument('duration', type=float, help="Deployment wall time in seconds")
+    deploy_parser.add_argument('--started', type=float, help="Epoch seconds the deployment started at")
+    deploy_parser.add_argument('--mode', default='full', choices=['full', 'scale-out'])
+    deploy_parser.add_argument('--strategy', help="Ansible strategy the phases ran with")
+    deploy_parser.add_argument('--forks', type=int, help="Forks requested per phase")
+
+    stage_parser = subparsers.add_parser('stage', help="Record a pipeline stage duration")
+    stage_parser.add_argument('stage', help="Stage name")
+    stage_parser.add_argument('duration', type=float, help="Stage wall time in seconds")
+    stage_parser.add_argument('--status', default='ok')
+
+    trend_parser = subparsers.add_parser('trend', help="Show recent deployments with their phase times")
+    trend_parser.add_argument('--last', type=int, default=20, help="Deployments shown (default: %(default)s)")
+    trend_parser.add_argument('--cluster', help="Only this cluster ('' for single-cluster runs)")
+    trend_parser.add_argument('--stages', action='store_true', help="Also show readiness and Jenkins stage times")
+
+    tasks_parser = subparsers.add_parser('tasks', help="Show a build's slowest tasks against their baseline")
+    tasks_parser.add_argument('--build', help="Build id (default: latest)")
+    tasks_parser.add_argument('--cluster', help="Cluster (default: $FLEET_CLUSTER or the single cluster)")
+    tasks_parser.add_argument('--phase', help="Only this phase")
+    tasks_parser.add_argument('--top', type=int, default=15, help="Tasks shown (default: %(default)s)")
+    tasks_parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                              help="Baseline builds (default: %(default)s)")
+
+    check_parser = subparsers.add_parser('check', help="Flag significant slowdowns against the rolling baseline")
+    check_parser.add_argument('--build', help="Build id (default: $PERF_BUILD_ID, $BUILD_TAG or latest)")
+    check_parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                              help="Earlier comparable builds in the baseline (default: %(default)s)")
+    check_parser.add_argument('--min-builds', type=int, default=DEFAULT_MIN_BUILDS,
+                              help="Skip timings with fewer baseline builds (default: %(default)s)")
+    check_parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                              help="Family-wise false alarm rate per build (default: %(default)s)")
+    check_parser.add_argument('--min-slowdown', type=float, default=DEFAULT_MIN_SLOWDOWN,
+                              help="Smallest slowdown reported, relative to the baseline median "
+                                   "(default: %(default)s)")
+    check_parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS,
+                              help="Smallest slowdown reported, in seconds (default: %(default)s)")
+    check_parser.add_argument('--cluster', help="Only this cluster's deployment ('' for single-cluster runs)")
+    check_parser.add_argument('--json', help="Write the regressions to this JSON file")
+
+    args = parser.parse_args()
+    commands = {'phase': cmd_phase, 'deploy': cmd_deploy, 'stage': cmd_stage,
+                'trend': cmd_trend, 'tasks': cmd_tasks, 'check': cmd_check}
+    if args.command not in commands:
+        parser.print_help()
+        sys.exit(1)
+    try:
+        with PerfStore(args.db) as store:
+            sys.exit(commands[args.command](args, store))
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
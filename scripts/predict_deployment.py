@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Predict deployment wall time for a vms.csv layout from recorded runs.
+
+Builds a Monte Carlo model of the whole pipeline from history:
+  - provisioning: terraform clones limited by pm_parallel / -parallelism,
+    per-clone time from metrics/provision-history.jsonl
+  - VM readiness: per-host time-to-ready from metrics/vm-readiness.json
+  - phases 1-5: every play of every phase playbook, with per-task, per-host
+    durations from the aggregate callback logs (logs/*.jsonl.gz|zst),
+    hosts scheduled on a fork-limited pool the way the free strategy does,
+    and async_status polling re-quantized to the chosen poll interval
+  - per-phase startup overhead from the run journal
+
+Each iteration samples every task on every host from its recorded
+distribution; the spread over iterations gives the confidence intervals.
+Candidate forks, pm_parallel and poll intervals are simulated too, and the
+cheapest setting within a few percent of the best is recommended.
+"""
+import argparse
+import csv
+import glob
+import gzip
+import heapq
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+from collections import deque
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANSIBLE_DIR = os.path.join(REPO_DIR, 'ansible')
+PLAYBOOKS_DIR = os.path.join(ANSIBLE_DIR, 'playbooks', 'parallel')
+
+PHASES = [
+    ('01-system-preparation', 'Phase 1 (System Prep)'),
+    ('02-container-runtime', 'Phase 2 (Container Runtime)'),
+    ('03-kubernetes-packages', 'Phase 3 (K8s Packages)'),
+    ('04-cluster-initialization', 'Phase 4 (Cluster Init)'),
+    ('05-cni-installation', 'Phase 5 (CNI Install)'),
+]
+GOLDEN_PHASES = ['01-system-preparation', '02-container-runtime', '03-kubernetes-packages']
+
+# Used only when no history exists for a stage
+DEFAULT_CLONE_SECONDS = 60
+DEFAULT_READY_SECONDS = 60
+DEFAULT_PHASE_OVERHEAD = 5
+
+# A candidate setting is "as good" when its median is within this of the best
+RECOMMEND_TOLERANCE = 0.03
+
+FORK_CANDIDATES = [5, 10, 20, 30, 50, 75, 100, 150, 200]
+PM_PARALLEL_CANDIDATES = [2, 4, 6, 8, 10, 15, 20]
+POLL_CANDIDATES = [1, 2, 5]
+
+
+# History
+
+def open_log(path):
+    """Text stream for a compressed aggregate log, None if it can't be read"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zst'):
+        if not HAS_ZSTD:
+            return None
+        raw = open(path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding='utf-8')
+    return None
+
+
+def log_phase(path):
+    """Phase (playbook) name from <playbook>-<YYYYmmdd>-<HHMMSS>.jsonl.*"""
+    match = re.match(r'(.+)-\d{8}-\d{6}\.jsonl\.', os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def load_task_history(log_dirs, max_runs):
+    """{phase: {'runs': n, 'walls': [(last_ts, wall)], 'plays': {play: [task, ...]}}}
+
+    Each task is {'name', 'action', 'samples': [seconds, ...]} in run order.
+    """
+    files = []
+    for log_dir in log_dirs:
+        files.extend(glob.glob(os.path.join(log_dir, '*.jsonl.*')))
+
+    by_phase = {}
+    for path in files:
+        phase = log_phase(path)
+        if phase:
+            by_phase.setdefault(phase, []).append(path)
+
+    history = {}
+    skipped_zstd = 0
+    for phase, paths in by_phase.items():
+        entry = history.setdefault(phase, {'runs': 0, 'walls': [], 'plays': {}})
+        # File names sort by timestamp; keep the most recent runs
+        for path in sorted(paths, key=os.path.basename)[-max_runs:]:
+            stream = open_log(path)
+            if stream is None:
+                skipped_zstd += 1
+                continue
+            first_start, last_ts = None, None
+            try:
+                with stream:
+                    for line in stream:
+                        record = json.loads(line)
+                        duration = record.get('duration')
+                        if record.get('status') in ('recap', 'retry') or duration is None:
+                            continue
+                        tasks = entry['plays'].setdefault(record.get('play') or '', [])
+                        task = next((t for t in tasks if t['name'] == record['task']), None)
+                        if task is None:
+                            task = {'name': record['task'], 'action': record.get('action'), 'samples': []}
+                            tasks.append(task)
+                        task['samples'].append(float(duration))
+                        start = record['ts'] - duration
+                        first_start = start if first_start is None else min(first_start, start)
+                        last_ts = record['ts'] if last_ts is None else max(last_ts, record['ts'])
+            except (OSError, ValueError, KeyError, EOFError) as e:
+                print(f"Warning: skipping {path}: {e}", file=sys.stderr)
+                continue
+            entry['runs'] += 1
+            if first_start is not None:
+                entry['walls'].append((last_ts, last_ts - first_start))
+
+    if skipped_zstd:
+        print(f"Warning: {skipped_zstd} .zst logs skipped, install zstandard to read them", file=sys.stderr)
+    return history
+
+
+def load_json(path, default):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def load_readiness(paths):
+    """Per-host seconds from the start of the wait until ready"""
+    samples = []
+    for path in paths:
+        summary = load_json(path, {})
+        for host in summary.get('hosts', {}).values():
+            if host.get('time_to_ready') is not None:
+                samples.append(float(host['time_to_ready']))
+    return samples
+
+
+def load_provisioning(path):
+    """Per-clone seconds, derived from each apply's duration and concurrency"""
+    samples = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    run = json.loads(line)
+                    waves = math.ceil(run['vms'] / max(1, run['parallelism']))
+                    samples.append(run['duration'] / max(1, waves))
+                except (ValueError, KeyError, TypeError, ZeroDivisionError):
+                    continue
+    except OSError:
+        pass
+    return samples
+
+
+def phase_overheads(journal, history):
+    """Playbook startup/teardown per phase: journal duration minus logged wall time"""
+    overheads = {}
+    for phase, entry in journal.get('phases', {}).items():
+        walls = history.get(phase, {}).get('walls', [])
+        # Only compare with the log written by the same run
+        matching = [wall for last_ts, wall in walls if abs(last_ts - entry.get('finished_at', 0)) < 300]
+        if matching and entry.get('status') == 'ok':
+            overheads[phase] = max(0.0, entry['duration'] - matching[-1])
+    return overheads
+
+
+# Layout and playbooks
+
+def load_layout(csv_file):
+    """(masters, workers) from vms.csv, classified like the inventory generator"""
+    masters = workers = 0
+    with open(csv_file, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            name = row.get('vm_name', '').strip().lower()
+            if 'master' in name:
+                masters += 1
+            elif 'worker' in name:
+                workers += 1
+    return masters, workers
+
+
+def parse_playbook(path):
+    """Plays ([(name, hosts pattern)]) and async_status poll delays per task"""
+    plays, delays = [], {}
+    play_name, task_name = None, None
+    with open(path, 'r') as f:
+        for line in f:
+            match = re.match(r'^- name:\s*(.+?)\s*$', line)
+            if match:
+                play_name = match.group(1).strip('"\'')
+                continue
+            match = re.match(r'^  hosts:\s*(.+?)\s*$', line)
+            if match and play_name is not None:
+                plays.append((play_name, match.group(1).strip('"\'')))
+                continue
+            match = re.match(r'^\s+- name:\s*(.+?)\s*$', line)
+            if match:
+                task_name = match.group(1).strip('"\'')
+                continue
+            match = re.match(r'^\s+delay:\s*(\d+)', line)
+            if match and task_name:
+                delays[task_name] = int(match.group(1))
+    return plays, delays
+
+
+def host_count(pattern, masters, workers):
+    """Hosts matched by a play's hosts pattern, e.g. k8s_masters[1:]"""
+    groups = {'k8s_masters': masters, 'k8s_workers': workers}
+    match = re.fullmatch(r'(\w+)(?:\[(\d*)(:?)(\d*)\])?', pattern)
+    if not match:
+        return masters + workers
+    group, start, colon, end = match.groups()
+    total = groups.get(group, masters + workers)
+    if start and not colon:
+        return 1 if int(start) < total else 0
+    if colon:
+        return len(range(total)[slice(int(start) if start else None, int(end) if end else None)])
+    return total
+
+
+# Simulation
+
+class TaskModel:
+    def __init__(self, name, samples, poll_delay=None):
+        self.name = name
+        self.samples = samples
+        self.poll_delay = poll_delay
+        self.base = min(samples) if samples else 0.0
+
+    def sample(self, rng, poll_interval=None):
+        duration = rng.choice(self.samples) if self.samples else 0.0
+        if poll_interval and self.poll_delay:
+            # Take out the recorded polling quantization and re-apply it
+            # at the new interval; the first check happens immediately
+            job = max(0.0, duration - self.base - rng.uniform(0, self.poll_delay))
+            duration = self.base + math.ceil(job / poll_interval) * poll_interval
+        return duration
+
+
+def simulate_play(tasks, hosts, forks, rng, poll_interval=None):
+    """Wall time of one play: each host runs its task list, at most `forks` at a time"""
+    if hosts <= 0 or not tasks:
+        return 0.0
+    next_task = [0] * hosts
+    waiting = deque(range(hosts))
+    running = []
+    now = 0.0
+    while waiting or running:
+        while waiting and len(running) < forks:
+            host = waiting.popleft()
+            duration = tasks[next_task[host]].sample(rng, poll_interval)
+            heapq.heappush(running, (now + duration, host))
+        now, host = heapq.heappop(running)
+        next_task[host] += 1
+        if next_task[host] < len(tasks):
+            waiting.append(host)
+    return now
+
+
+def simulate_pool(jobs, slots, draw):
+    """Finish time of `jobs` independent jobs on `slots` parallel slots"""
+    if jobs <= 0:
+        return 0.0
+    finish = [0.0] * min(slots, jobs)
+    heapq.heapify(finish)
+    for _ in range(jobs):
+        start = heapq.heappop(finish)
+        heapq.heappush(finish, start + draw())
+    return max(finish)
+
+
+class Model:
+    def __init__(self, masters, workers, history, readiness, clones, overheads):
+        self.masters = masters
+        self.workers = workers
+        self.readiness = readiness
+        self.clones = clones
+        self.phases = []   # (phase, label, [(tasks, hosts)], overhead)
+        self.notes = []
+
+        for phase, label in PHASES:
+            playbook = os.path.join(PLAYBOOKS_DIR, f"{phase}.yml")
+            plays, delays = parse_playbook(playbook) if os.path.exists(playbook) else ([], {})
+            recorded = history.get(phase, {}).get('plays', {})
+            modeled = []
+            for play_name, pattern in plays:
+                tasks = [TaskModel(t['name'], t['samples'], delays.get(t['name'])
+                                   if t['action'] in ('async_status', 'ansible.builtin.async_status') else None)
+                         for t in recorded.get(play_name, [])]
+                modeled.append((tasks, host_count(pattern, masters, workers)))
+            if not recorded:
+                self.notes.append(f"{label}: no recorded runs, only playbook overhead counted")
+            self.phases.append((phase, label, modeled, overheads.get(phase, DEFAULT_PHASE_OVERHEAD)))
+
+        if not clones:
+            self.notes.append(f"Provisioning: no recorded applies, assuming {DEFAULT_CLONE_SECONDS}s per clone")
+        if not readiness:
+            self.notes.append(f"VM readiness: no readiness summary, assuming {DEFAULT_READY_SECONDS}s")
+
+    def run(self, rng, forks, pm_parallel, poll_interval=None, golden=False):
+        """One sampled deployment: {stage label: seconds}"""
+        hosts = self.masters + self.workers
+        result = {}
+
+        clone_draw = (lambda: rng.choice(self.clones)) if self.clones else (lambda: DEFAULT_CLONE_SECONDS)
+        result['Provisioning'] = simulate_pool(hosts, pm_parallel, clone_draw)
+
+        if self.readiness:
+            result['VM Readiness'] = max(rng.choice(self.readiness) for _ in range(hosts))
+        else:
+            result['VM Readiness'] = DEFAULT_READY_SECONDS
+
+        for phase, label, plays, overhead in self.phases:
+            if golden and phase in GOLDEN_PHASES:
+                # Golden nodes end the phase at the fingerprint check
+                plays = [([task for task in tasks if 'fingerprint' in task.name.lower()], count)
+                         for tasks, count in plays]
+            result[label] = overhead + sum(
+                simulate_play(tasks, count, forks, rng, poll_interval) for tasks, count in plays
+            )
+
+        result['Total'] = sum(result.values())
+        return result
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def predict(model, iterations, seed, **settings):
+    """{stage: {'p5', 'p50', 'p95', 'mean'}} over Monte Carlo iterations"""
+    rng = random.Random(seed)
+    runs = [model.run(rng, **settings) for _ in range(iterations)]
+    return {
+        stage: {
+            'p5': round(percentile([run[stage] for run in runs], 0.05), 1),
+            'p50': round(percentile([run[stage] for run in runs], 0.5), 1),
+            'p95': round(percentile([run[stage] for run in runs], 0.95), 1),
+            'mean': round(sum(run[stage] for run in runs) / len(runs), 1),
+        }
+        for stage in runs[0]
+    }
+
+
+def cheapest_within_tolerance(results, stage):
+    """Smallest candidate whose median is within RECOMMEND_TOLERANCE of the best"""
+    best = min(result[stage]['p50'] for result in results.values())
+    for candidate in sorted(results):
+        if results[candidate][stage]['p50'] <= best * (1 + RECOMMEND_TOLERANCE) + 1:
+            return candidate
+    return min(results)
+
+
+def recommend(model, args, iterations):
+    hosts = model.masters + model.workers
+    settings = {'forks': args.forks, 'pm_parallel': args.pm_parallel,
+                'poll_interval': args.poll_interval, 'golden': args.golden}
+    recommendations = {}
+
+    # More forks than hosts never helps; the SSH budget caps what a build gets
+    fork_candidates = sorted({f for f in FORK_CANDIDATES if f < hosts} | {hosts})
+    fork_candidates = [f for f in fork_candidates if f <= args.ssh_budget] or [args.ssh_budget]
+    results = {f: predict(model, iterations, args.seed, **dict(settings, forks=f)) for f in fork_candidates}
+    forks = cheapest_within_tolerance(results, 'Total')
+    recommendations['forks'] = {'value': forks, 'p50': results[forks]['Total']['p50']}
+
+    results = {p: predict(model, iterations, args.seed, **dict(settings, pm_parallel=p))
+               for p in PM_PARALLEL_CANDIDATES}
+    pm_parallel = cheapest_within_tolerance(results, 'Provisioning')
+    recommendations['pm_parallel'] = {'value': pm_parallel, 'p50': results[pm_parallel]['Provisioning']['p50']}
+
+    # Shorter polls cost an SSH round-trip each; prefer the longest that keeps the time
+    results = {p: predict(model, iterations, args.seed, **dict(settings, poll_interval=p)) for p in POLL_CANDIDATES}
+    best = min(result['Total']['p50'] for result in results.values())
+    poll = max(p for p in POLL_CANDIDATES if results[p]['Total']['p50'] <= best * (1 + RECOMMEND_TOLERANCE) + 1)
+    recommendations['poll_interval'] = {'value': poll, 'p50': results[poll]['Total']['p50']}
+    return recommendations
+
+
+def configured_pm_parallel():
+    """Effective clone concurrency: pm_parallel in main.tf capped by terraform -parallelism"""
+    limits = []
+    for path, pattern in ((os.path.join(REPO_DIR, 'terraform', 'main.tf'), r'pm_parallel\s*=\s*(\d+)'),
+                          (os.path.join(REPO_DIR, 'scripts', 'terraform_apply.sh'), r'-parallelism=(\d+)')):
+        try:
+            with open(path, 'r') as f:
+                match = re.search(pattern, f.read())
+            if match:
+                limits.append(int(match.group(1)))
+        except OSError:
+            pass
+    return min(limits) if limits else 10
+
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict deployment time for a vms.csv layout from recorded runs")
+    parser.add_argument('vms_csv', help="VM layout (vms.csv)")
+    parser.add_argument('--logs', action='append',
+                        help="Aggregate callback log dir (repeatable, default: ansible/logs)")
+    parser.add_argument('--journal', default=os.path.join(ANSIBLE_DIR, '.deploy-state', 'journal.json'),
+                        help="Run journal for per-phase overhead")
+    parser.add_argument('--readiness', action='append',
+                        help="Readiness summary JSON (repeatable, default: ansible/metrics/vm-readiness.json)")
+    parser.add_argument('--provision-history', default=os.path.join(ANSIBLE_DIR, 'metrics', 'provision-history.jsonl'),
+                        help="Terraform apply history written by terraform_apply.sh")
+    parser.add_argument('--history-runs', type=int, default=10, help="Most recent logs per phase to use")
+    parser.add_argument('--forks', type=int, default=int(os.environ.get('ANSIBLE_FORKS', 50)))
+    parser.add_argument('--pm-parallel', type=int, default=None,
+                        help="Concurrent clones (default: min of pm_parallel in main.tf and terraform -parallelism)")
+    parser.add_argument('--poll-interval', type=int, default=None,
+                        help="Simulate async_status polling at this interval instead of the playbook delays")
+    parser.add_argument('--ssh-budget', type=int, default=int(os.environ.get('IAC_SSH_BUDGET', 100)),
+                        help="Upper bound for recommended forks")
+    parser.add_argument('--golden', action='store_true', help="Nodes cloned from a golden template (phases 1-3 skipped)")
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-recommend', action='store_true', help="Only predict the given settings")
+    parser.add_argument('--json', help="Also write the prediction as JSON to this file")
+    args = parser.parse_args()
+
+    if args.pm_parallel is None:
+        args.pm_parallel = configured_pm_parallel()
+
+    try:
+        masters, workers = load_layout(args.vms_csv)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if masters + workers == 0:
+        print("Error: no master or worker VMs in layout", file=sys.stderr)
+        sys.exit(2)
+
+    history = load_task_history(args.logs or [os.path.join(ANSIBLE_DIR, 'logs')], args.history_runs)
+    readiness = load_readiness(args.readiness or [os.path.join(ANSIBLE_DIR, 'metrics', 'vm-readiness.json')])
+    clones = load_provisioning(args.provision_history)
+    overheads = phase_overheads(load_json(args.journal, {}), history)
+    model = Model(masters, workers, history, readiness, clones, overheads)
+
+    settings = {'forks': args.forks, 'pm_parallel': args.pm_parallel,
+                'poll_interval': args.poll_interval, 'golden': args.golden}
+    prediction = predict(model, args.iterations, args.seed, **settings)
+
+    print(f"Layout: {masters} masters, {workers} workers ({masters + workers} VMs) from {args.vms_csv}")
+    print(f"Settings: forks={args.forks} pm_parallel={args.pm_parallel} "
+          f"poll={args.poll_interval or 'playbook delays'}{' golden template' if args.golden else ''}")
+    print(f"History: {sum(h['runs'] for h in history.values())} phase logs, "
+          f"{len(readiness)} readiness samples, {len(clones)} terraform applies")
+    print("")
+    print(f"{'Stage':<30} {'p5':>8} {'median':>8} {'p95':>8}")
+    print("-" * 57)
+    for stage, stats in prediction.items():
+        if stage == 'Total':
+            print("-" * 57)
+        print(f"{stage:<30} {format_seconds(stats['p5']):>8} {format_seconds(stats['p50']):>8} "
+              f"{format_seconds(stats['p95']):>8}")
+    print("")
+    for note in model.notes:
+        print(f"Note: {note}")
+
+    recommendations = {}
+    if not args.no_recommend and model.notes:
+        # Defaults stand in for the missing history, tuning against them means nothing
+        print("")
+        print("Recommended settings: skipped, the model is not calibrated (see notes above)")
+    elif not args.no_recommend:
+        recommendations = recommend(model, args, max(50, args.iterations // 3))
+        print("")
+        print("Recommended settings:")
+        print(f"  forks={recommendations['forks']['value']} "
+              f"(median total {format_seconds(recommendations['forks']['p50'])})")
+        print(f"  pm_parallel={recommendations['pm_parallel']['value']} "
+              f"(median provisioning {format_seconds(recommendations['pm_parallel']['p50'])}, "
+              f"assumes clone time does not grow with concurrency)")
+        print(f"  async poll delay={recommendations['poll_interval']['value']}s "
+              f"(median total {format_seconds(recommendations['poll_interval']['p50'])})")
+
+    if args.json:
+        if os.path.dirname(args.json):
+            os.makedirs(os.path.dirname(args.json), exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump({
+                'layout': {'masters': masters, 'workers': workers},
+                'settings': settings,
+                'prediction': prediction,
+                'recommendations': recommendations,
+                'notes': model.notes,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
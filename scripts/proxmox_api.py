@@ -0,0 +1,357 @@
+"""
+Minimal Proxmox VE API client for the helper scripts.
+
+Uses the same API token as terraform (TF_VAR_pm_api_url,
+TF_VAR_pm_api_token_id, TF_VAR_pm_api_token_secret) and only the standard
+library. Set PM_TLS_INSECURE=true for self-signed certificates, as with the
+terraform provider.
+
+Requests go through a transport, so the scripts can run against a JSON
+fixture instead of a real cluster: set PROXMOX_API_FIXTURE=<file> and every
+call is served (and every change saved) by FixtureTransport. This is how the
+golden template selection and invalidation logic and the guest agent
+readiness backend are exercised locally.
+"""
+import json
+import os
+import re
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+TASK_POLL_INTERVAL = 2
+
+
+class ProxmoxError(Exception):
+    pass
+
+
+class HTTPTransport:
+    """Talk to a real Proxmox API over HTTPS"""
+
+    def __init__(self, base_url, token_id, token_secret, insecure=False, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f"PVEAPIToken={token_id}={token_secret}"}
+        self.timeout = timeout
+        self.context = ssl._create_unverified_context() if insecure else None
+
+    def __call__(self, method, path, params=None):
+        url = f"{self.base_url}/{path}"
+        data = None
+        if params and method in ('GET', 'DELETE'):
+            url += '?' + urllib.parse.urlencode(params, doseq=True)
+        elif params:
+            # doseq sends list values (e.g. agent exec command) as repeated fields
+            data = urllib.parse.urlencode(params, doseq=True).encode('utf-8')
+
+        request = urllib.request.Request(url, data=data, method=method, headers=self.headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout, context=self.context) as response:
+                return json.loads(response.read().decode('utf-8')).get('data')
+        except urllib.error.HTTPError as e:
+            raise ProxmoxError(f"{method} {path}: HTTP {e.code} {e.reason}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ProxmoxError(f"{method} {path}: {e}")
+
+
+class FixtureTransport:
+    """Serve API calls from a JSON fixture file, saving every change back.
+
+    Fixture format:
+        {"nextid": 9000,
+         "vms": [{"vmid": 100, "name": "t-debian12-86", "node": "pve",
+                  "template": 1, "status": "stopped", "config": {...}}]}
+
+    A running VM may carry a "guest" entry describing its guest agent, with
+    times in seconds after the transport was created:
+        {"agent_after": 5, "ip": "10.200.0.31", "ip_after": 8,
+         "cloud_init_after": 20, "cloud_init": "done"}
+    "cloud_init": "missing" makes the image lack cloud-init, so exec fails.
+    """
+
+    ROUTES = [
+        ('GET', r'cluster/resources', '_resources'),
+        ('GET', r'cluster/nextid', '_nextid'),
+        ('GET', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/config', '_get_config'),
+        ('PUT', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/config', '_set_config'),
+        ('POST', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/config', '_set_config'),
+        ('POST', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/clone', '_clone'),
+        ('POST', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/status/(?P<action>start|shutdown|stop)', '_status'),
+        ('POST', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/template', '_template'),
+        ('DELETE', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)', '_delete'),
+        ('GET', r'nodes/(?P<node>[^/]+)/tasks/(?P<upid>[^/]+)/status', '_task_status'),
+        ('POST', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/agent/ping', '_agent_ping'),
+        ('GET', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/agent/network-get-interfaces', '_agent_interfaces'),
+        ('POST', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/agent/exec', '_agent_exec'),
+        ('GET', r'nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/agent/exec-status', '_agent_exec_status'),
+    ]
+
+    # Guest agent calls change nothing in the fixture
+    READ_ONLY = {'_agent_ping', '_agent_exec'}
+
+    def __init__(self, fixture_file):
+        self.fixture_file = fixture_file
+        with open(fixture_file, 'r') as f:
+            self.state = json.load(f)
+        self.state.setdefault('vms', [])
+        self.created = time.time()
+        self.lock = threading.Lock()
+
+    def __call__(self, method, path, params=None):
+        params = params or {}
+        for route_method, pattern, handler in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                with self.lock:
+                    result = getattr(self, handler)(params, **match.groupdict())
+                    if method != 'GET' and handler not in self.READ_ONLY:
+                        self._save()
+                return result
+        raise ProxmoxError(f"{method} {path}: not handled by fixture {self.fixture_file}")
+
+    def _save(self):
+        tmp_file = f"{self.fixture_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.fixture_file)
+
+    def _vm(self, vmid):
+        for vm in self.state['vms']:
+            if int(vm['vmid']) == int(vmid):
+                return vm
+        raise ProxmoxError(f"VM {vmid} does not exist")
+
+    def _upid(self, node, kind, vmid):
+        return f"UPID:{node}:fixture:{kind}:{vmid}:"
+
+    def _resources(self, params):
+        return [
+            {
+                'type': 'qemu', 'id': f"qemu/{vm['vmid']}", 'vmid': int(vm['vmid']),
+                'name': vm.get('name', ''), 'node': vm.get('node', ''),
+                'status': vm.get('status', 'stopped'), 'template': int(vm.get('template', 0)),
+                'tags': vm.get('config', {}).get('tags', ''),
+            }
+            for vm in self.state['vms']
+        ]
+
+    def _nextid(self, params):
+        used = {int(vm['vmid']) for vm in self.state['vms']}
+        vmid = int(self.state.get('nextid', 100))
+        while vmid in used:
+            vmid += 1
+        return str(vmid)
+
+    def _get_config(self, params, node, vmid):
+        vm = self._vm(vmid)
+        return dict(vm.get('config', {}), name=vm.get('name', ''))
+
+    def _set_config(self, params, node, vmid):
+        vm = self._vm(vmid)
+        config = vm.setdefault('config', {})
+        for key, value in params.items():
+            if key == 'name':
+                vm['name'] = value
+            elif key == 'delete':
+                for name in value.split(','):
+                    config.pop(name, None)
+            else:
+                config[key] = value
+        return None
+
+    def _clone(self, params, node, vmid):
+        source = self._vm(vmid)
+        newid = int(params['newid'])
+        if any(int(vm['vmid']) == newid for vm in self.state['vms']):
+            raise ProxmoxError(f"VM {newid} already exists")
+        config = {key: value for key, value in source.get('config', {}).items()
+                  if key not in ('tags', 'description')}
+        self.state['vms'].append({
+            'vmid': newid,
+            'name': params.get('name', f"Copy-of-VM-{source.get('name', vmid)}"),
+            'node': params.get('target', node),
+            'template': 0,
+            'status': 'stopped',
+            'config': config,
+        })
+        return self._upid(node, 'qmclone', vmid)
+
+    def _status(self, params, node, vmid, action):
+        self._vm(vmid)['status'] = 'running' if action == 'start' else 'stopped'
+        return self._upid(node, f"qm{action}", vmid)
+
+    def _template(self, params, node, vmid):
+        vm = self._vm(vmid)
+        if vm.get('status') == 'running':
+            raise ProxmoxError(f"VM {vmid} is running")
+        vm['template'] = 1
+        return self._upid(node, 'qmtemplate', vmid)
+
+    def _delete(self, params, node, vmid):
+        vm = self._vm(vmid)
+        self.state['vms'].remove(vm)
+        return self._upid(node, 'qmdestroy', vmid)
+
+    def _task_status(self, params, node, upid):
+        return {'status': 'stopped', 'exitstatus': 'OK', 'upid': upid}
+
+    def _guest(self, vmid, stage):
+        """Guest agent state of a running VM, raising like Proxmox when it is down"""
+        vm = self._vm(vmid)
+        guest = vm.get('guest')
+        uptime = time.time() - self.created
+        if vm.get('status') != 'running' or guest is None or uptime < guest.get('agent_after', 0):
+            raise ProxmoxError(f"VM {vmid}: QEMU guest agent is not running")
+        return guest, uptime >= guest.get(stage, 0)
+
+    def _agent_ping(self, params, node, vmid):
+        self._guest(vmid, 'agent_after')
+        return {}
+
+    def _agent_interfaces(self, params, node, vmid):
+        guest, has_ip = self._guest(vmid, 'ip_after')
+        interfaces = [{'name': 'lo', 'ip-addresses': [{'ip-address': '127.0.0.1', 'ip-address-type': 'ipv4'}]}]
+        eth0 = {'name': 'eth0', 'ip-addresses': []}
+        if has_ip and guest.get('ip'):
+            eth0['ip-addresses'].append({'ip-address': guest['ip'], 'ip-address-type': 'ipv4', 'prefix': 24})
+        return {'result': interfaces + [eth0]}
+
+    def _agent_exec(self, params, node, vmid):
+        guest, _ = self._guest(vmid, 'agent_after')
+        command = params.get('command')
+        command = command if isinstance(command, list) else [command]
+        if command[0] == 'cloud-init' and guest.get('cloud_init') == 'missing':
+            # Proxmox passes the guest agent error on in the HTTP 500 reason
+            raise ProxmoxError(
+                f"POST nodes/{node}/qemu/{vmid}/agent/exec: HTTP 500 Agent error: Guest agent command failed, "
+                f"error was 'Failed to execute child process \"cloud-init\" (No such file or directory)'"
+            )
+        return {'pid': 1000 + int(vmid) if command[:2] == ['cloud-init', 'status'] else 1}
+
+    def _agent_exec_status(self, params, node, vmid):
+        guest, finished = self._guest(vmid, 'cloud_init_after')
+        if int(params.get('pid', 0)) != 1000 + int(vmid):
+            return {'exited': 1, 'exitcode': 127, 'err-data': 'command not found\n'}
+        if not finished:
+            # cloud-init status --wait blocks until cloud-init is done
+            return {'exited': 0}
+        status = guest.get('cloud_init', 'done')
+        return {'exited': 1, 'exitcode': 0 if status == 'done' else 1, 'out-data': f"status: {status}\n"}
+
+
+class ProxmoxAPI:
+    """The handful of Proxmox calls the helper scripts need"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    @classmethod
+    def from_env(cls):
+        """Client from PROXMOX_API_FIXTURE, or the terraform API token variables"""
+        fixture = os.environ.get('PROXMOX_API_FIXTURE')
+        if fixture:
+            return cls(FixtureTransport(fixture))
+
+        missing = [name for name in ('TF_VAR_pm_api_url', 'TF_VAR_pm_api_token_id', 'TF_VAR_pm_api_token_secret')
+                   if not os.environ.get(name)]
+        if missing:
+            raise ProxmoxError(f"Proxmox credentials not set: {', '.join(missing)}")
+        return cls(HTTPTransport(
+            os.environ['TF_VAR_pm_api_url'],
+            os.environ['TF_VAR_pm_api_token_id'],
+            os.environ['TF_VAR_pm_api_token_secret'],
+            insecure=os.environ.get('PM_TLS_INSECURE', 'false').lower() == 'true',
+        ))
+
+    # Queries
+
+    def vms(self):
+        """Every QEMU VM and template in the cluster"""
+        return [vm for vm in self.transport('GET', 'cluster/resources', {'type': 'vm'}) or []
+                if vm.get('type', 'qemu') == 'qemu']
+
+    def templates(self):
+        return [vm for vm in self.vms() if int(vm.get('template', 0))]
+
+    def find(self, name):
+        """First VM or template with this name, or None"""
+        for vm in self.vms():
+            if vm.get('name') == name:
+                return vm
+        return None
+
+    def next_vmid(self):
+        return int(self.transport('GET', 'cluster/nextid'))
+
+    def config(self, node, vmid):
+        return self.transport('GET', f"nodes/{node}/qemu/{vmid}/config") or {}
+
+    # Changes
+
+    def set_config(self, node, vmid, **config):
+        return self.transport('PUT', f"nodes/{node}/qemu/{vmid}/config", config)
+
+    def clone(self, node, vmid, newid, name, full=True, target=None):
+        params = {'newid': newid, 'name': name, 'full': 1 if full else 0}
+        if target:
+            params['target'] = target
+        return self.wait_task(node, self.transport('POST', f"nodes/{node}/qemu/{vmid}/clone", params))
+
+    def start(self, node, vmid):
+        return self.wait_task(node, self.transport('POST', f"nodes/{node}/qemu/{vmid}/status/start"))
+
+    def shutdown(self, node, vmid, timeout=180):
+        upid = self.transport('POST', f"nodes/{node}/qemu/{vmid}/status/shutdown",
+                              {'timeout': timeout, 'forceStop': 1})
+        return self.wait_task(node, upid, timeout=timeout + 60)
+
+    def stop(self, node, vmid):
+        return self.wait_task(node, self.transport('POST', f"nodes/{node}/qemu/{vmid}/status/stop"))
+
+    def convert_to_template(self, node, vmid):
+        return self.wait_task(node, self.transport('POST', f"nodes/{node}/qemu/{vmid}/template"))
+
+    def delete(self, node, vmid):
+        return self.wait_task(node, self.transport('DELETE', f"nodes/{node}/qemu/{vmid}", {'purge': 1}))
+
+    # Guest agent
+
+    def agent_ping(self, node, vmid):
+        """Raises ProxmoxError while the guest agent is not running"""
+        return self.transport('POST', f"nodes/{node}/qemu/{vmid}/agent/ping")
+
+    def agent_addresses(self, node, vmid):
+        """IPv4 addresses the guest reports, loopback excluded"""
+        data = self.transport('GET', f"nodes/{node}/qemu/{vmid}/agent/network-get-interfaces") or {}
+        return [
+            address['ip-address']
+            for interface in data.get('result', [])
+            for address in interface.get('ip-addresses', [])
+            if address.get('ip-address-type') == 'ipv4' and not address['ip-address'].startswith('127.')
+        ]
+
+    def agent_exec(self, node, vmid, command):
+        """Start a command in the guest, returns its pid"""
+        return self.transport('POST', f"nodes/{node}/qemu/{vmid}/agent/exec", {'command': command})['pid']
+
+    def agent_exec_status(self, node, vmid, pid):
+        """{'exited': 0|1, 'exitcode', 'out-data', 'err-data'} of a guest command"""
+        return self.transport('GET', f"nodes/{node}/qemu/{vmid}/agent/exec-status", {'pid': pid})
+
+    def wait_task(self, node, upid, timeout=600):
+        """Block until a task finishes; raise if it failed or timed out"""
+        if not upid:
+            return None
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.transport('GET', f"nodes/{node}/tasks/{urllib.parse.quote(upid, safe='')}/status")
+            if status.get('status') == 'stopped':
+                if status.get('exitstatus') != 'OK':
+                    raise ProxmoxError(f"Task {upid} failed: {status.get('exitstatus')}")
+                return status
+            if time.monotonic() >= deadline:
+                raise ProxmoxError(f"Task {upid} did not finish in {timeout}s")
+            time.sleep(TASK_POLL_INTERVAL)
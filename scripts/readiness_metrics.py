@@ -0,0 +1,164 @@
+"""
+Per-host connection latency metrics for the VM readiness checker.
+
+Collects per-attempt stage timings (TCP connect, SSH key exchange, auth,
+command round-trip), attempt counts and time-to-ready, and writes them as an
+OpenMetrics/Prometheus textfile plus a JSON summary for Jenkins.
+"""
+import json
+import os
+import time
+
+METRIC_PREFIX = 'vm_readiness'
+
+# Histogram buckets in seconds, from LAN round-trips up to slow SSH logins
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+STAGE_HELP = {
+    'tcp_connect': 'TCP connect to port 22',
+    'ssh_handshake': 'SSH banner exchange and key exchange',
+    'ssh_auth': 'SSH user authentication',
+    'command_rtt': 'Round-trip of the readiness command',
+    'ssh_total': 'Complete SSH check (handshake, auth and command)',
+    'agent_ping': 'Guest agent ping through the Proxmox API',
+    'agent_network': 'Guest agent network-get-interfaces through the Proxmox API',
+    'agent_exec': 'Guest agent exec / exec-status through the Proxmox API',
+}
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ReadinessMetrics:
+    def __init__(self, since=None):
+        self.since = since if since is not None else time.time()
+        self.started = time.time()
+        self.stages = {}        # (host, stage) -> [seconds, ...]
+        self.attempts = {}      # host -> {'ready': n, 'not_ready': n}
+        self.ready_at = {}      # host -> seconds since self.since
+        self.host_addresses = {}
+
+    def record_attempt(self, host, address, timings, ready):
+        """Record one readiness attempt for a host"""
+        self.host_addresses[host] = address
+        for stage, seconds in timings.items():
+            if seconds is not None:
+                self.stages.setdefault((host, stage), []).append(seconds)
+
+        counts = self.attempts.setdefault(host, {'ready': 0, 'not_ready': 0})
+        counts['ready' if ready else 'not_ready'] += 1
+
+        if ready and host not in self.ready_at:
+            self.ready_at[host] = time.time() - self.since
+
+    def to_openmetrics(self):
+        """Render all metrics in OpenMetrics text format"""
+        lines = []
+
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines.append(f"# TYPE {name} histogram")
+        lines.append(f"# UNIT {name} seconds")
+        lines.append(f"# HELP {name} Per-attempt connection stage latency per host.")
+        for (host, stage), samples in sorted(self.stages.items()):
+            labels = f'host="{_escape_label(host)}",stage="{_escape_label(stage)}"'
+            for bucket in LATENCY_BUCKETS:
+                count = sum(1 for s in samples if s <= bucket)
+                lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {len(samples)}')
+            lines.append(f'{name}_count{{{labels}}} {len(samples)}')
+            lines.append(f'{name}_sum{{{labels}}} {sum(samples):.6f}')
+
+        name = f"{METRIC_PREFIX}_attempts"
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"# HELP {name} Readiness attempts per host by outcome.")
+        for host, counts in sorted(self.attempts.items()):
+            for result, count in sorted(counts.items()):
+                lines.append(f'{name}_total{{host="{_escape_label(host)}",result="{result}"}} {count}')
+
+        name = f"{METRIC_PREFIX}_time_to_ready_seconds"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"# UNIT {name} seconds")
+        lines.append(f"# HELP {name} Seconds from the start of the wait until the host was ready.")
+        for host, seconds in sorted(self.ready_at.items()):
+            lines.append(f'{name}{{host="{_escape_label(host)}"}} {seconds:.3f}')
+
+        name = f"{METRIC_PREFIX}_ready"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"# HELP {name} 1 if the host passed the readiness check.")
+        for host in sorted(self.attempts):
+            lines.append(f'{name}{{host="{_escape_label(host)}"}} {1 if host in self.ready_at else 0}')
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """JSON-serialisable summary: per host and per stage across hosts"""
+        hosts = {}
+        for host, counts in sorted(self.attempts.items()):
+            host_stages = {
+                stage: {
+                    'count': len(samples),
+                    'mean': round(sum(samples) / len(samples), 4),
+                    'max': round(max(samples), 4),
+                }
+                for (h, stage), samples in self.stages.items() if h == host
+            }
+            hosts[host] = {
+                'address': self.host_addresses.get(host),
+                'ready': host in self.ready_at,
+                'attempts': counts['ready'] + counts['not_ready'],
+                'time_to_ready': round(self.ready_at[host], 3) if host in self.ready_at else None,
+                'stages': host_stages,
+            }
+
+        stages = {}
+        for stage in STAGE_HELP:
+            samples = [s for (h, st), values in self.stages.items() if st == stage for s in values]
+            if samples:
+                stages[stage] = {
+                    'count': len(samples),
+                    'p50': round(_percentile(samples, 0.5), 4),
+                    'p95': round(_percentile(samples, 0.95), 4),
+                    'max': round(max(samples), 4),
+                }
+
+        # Hosts whose stage latency stands out point at a slow node or storage
+        slowest = sorted(
+            ((h['stages'].get('ssh_total', {}).get('max', 0), name) for name, h in hosts.items()),
+            reverse=True
+        )[:5]
+
+        return {
+            'elapsed': round(time.time() - self.started, 3),
+            'hosts_total': len(hosts),
+            'hosts_ready': len(self.ready_at),
+            'stages': stages,
+            'slowest_hosts': [name for seconds, name in slowest if seconds > 0],
+            'hosts': hosts,
+        }
+
+    def write_openmetrics(self, path):
+        """Write the textfile atomically so collectors never read a partial file"""
+        _atomic_write(path, self.to_openmetrics())
+
+    def write_summary(self, path):
+        _atomic_write(path, json.dumps(self.summary(), indent=2) + '\n')
+
+
+def _atomic_write(path, content):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
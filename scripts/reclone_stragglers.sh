@@ -0,0 +1,40 @@
+#!/bin/bash
+# Reclone Stragglers Script
+# Re-creates worker VMs quarantined as stragglers (STRAGGLER_POLICY=reclone)
+# and joins the fresh VMs with a scale-out run. Runs from the terraform dir.
+
+set -e
+
+# Ensure we're using venv
+. ${WORKSPACE}/venv/bin/activate
+
+export STRAGGLER_REPORT="${WORKSPACE}/ansible/logs/stragglers.json"
+STRAGGLER_SCRIPT="${WORKSPACE}/scripts/straggler_report.py"
+
+RECLONE_HOSTS=$(python3 ${STRAGGLER_SCRIPT} hosts reclone)
+if [ -z "$RECLONE_HOSTS" ]; then
+    echo "No stragglers marked for re-clone"
+    exit 0
+fi
+
+echo "Re-cloning straggler VMs: ${RECLONE_HOSTS//,/, }"
+python3 ${STRAGGLER_SCRIPT} show
+
+# One -replace argument per VM; read into an array so the brackets are never globbed
+mapfile -t REPLACE_ARGS < <(python3 ${STRAGGLER_SCRIPT} replace-args)
+terraform apply -auto-approve -parallelism=10 "${REPLACE_ARGS[@]}"
+
+cd ../ansible
+
+echo "Waiting for re-cloned VMs..."
+${WORKSPACE}/venv/bin/python ${WORKSPACE}/scripts/smart_vm_ready.py ${INVENTORY_FILE} 20 \
+    --attempts 10 \
+    --retry-delay 30
+
+# The scale-out run starts a fresh report; keep the one that led to the re-clone
+cp "$STRAGGLER_REPORT" "${STRAGGLER_REPORT%.json}-recloned.json"
+
+# Quarantined hosts were left out of the applied inventory, so the
+# scale-out run bootstraps and joins exactly the re-cloned VMs.
+# A straggler in this run is quarantined again rather than re-cloned.
+SCALE_OUT=true STRAGGLER_POLICY=quarantine ${WORKSPACE}/scripts/deploy_kubernetes_parallel.sh
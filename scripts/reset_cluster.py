@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Parallel cluster reset for benchmark iterations and redeploys.
+
+Pushes scripts/node_reset.sh to every host in one ad-hoc Ansible run, so each
+node is reset (kubeadm state, CNI config and interfaces, iptables/IPVS rules,
+k8s.io containers, phase fingerprints) in a single remote execution and all
+nodes reset at once. Each node verifies its own state afterwards; hosts that
+are not clean yet (or were unreachable) are reset again until every host is
+clean, so the caller continues the moment the cluster is in its starting
+state instead of after a fixed sleep.
+
+Runs from the ansible dir, like the deployment scripts. The local run journal
+is reset to match: phases 4+ (and with --full every phase) run again.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from deploy_journal import (DEFAULT_JOURNAL_FILE, inventory_hosts, load_inventory,
+                            load_journal, save_journal)
+from iac_runtime import SSHBudget
+
+NODE_RESET_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'node_reset.sh')
+# Phases that only install packages; a default reset keeps their results
+NODE_PHASES = ('01-', '02-', '03-')
+
+
+def run_reset(hosts, inventory_file, full=False, timeout=300, forks=50):
+    """Reset hosts in one ad-hoc run, returns {host: (clean, detail)}"""
+    script_args = f"{NODE_RESET_SCRIPT} --full" if full else NODE_RESET_SCRIPT
+    env = os.environ.copy()
+    env.update({
+        'ANSIBLE_INVENTORY_FILE': inventory_file,
+        'ANSIBLE_HOST_KEY_CHECKING': 'False',
+        'ANSIBLE_LOAD_CALLBACK_PLUGINS': 'True',
+        'ANSIBLE_STDOUT_CALLBACK': 'json',
+        'ANSIBLE_CALLBACKS_ENABLED': '',
+    })
+
+    # One SSH session per host, within the controller-wide budget
+    with SSHBudget() as budget:
+        env['ANSIBLE_FORKS'] = str(budget.acquire(min(len(hosts), forks), min_slots=1))
+        process = subprocess.run(
+            ['ansible', ':'.join(hosts), '-i', '../scripts/inventory.py',
+             '-m', 'script', '-a', script_args, f"--task-timeout={timeout}", '--timeout=10',
+             '--ssh-extra-args=-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10'],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+
+    try:
+        output = json.loads(process.stdout[process.stdout.index('{'):])
+        task_results = output['plays'][0]['tasks'][0]['hosts']
+    except (ValueError, KeyError, IndexError):
+        error = (process.stderr or process.stdout).strip().splitlines()
+        return {host: (False, error[-1] if error else 'ansible failed') for host in hosts}
+
+    results = {}
+    for host in hosts:
+        result = task_results.get(host)
+        if result is None:
+            results[host] = (False, 'no result')
+        elif result.get('unreachable'):
+            results[host] = (False, 'unreachable')
+        else:
+            state = [line for line in result.get('stdout', '').splitlines() if line.startswith('RESET_STATE')]
+            detail = state[-1].split(' ', 1)[1] if state else result.get('msg', 'no state reported')
+            results[host] = (detail == 'clean', detail)
+    return results
+
+
+def reset_journal(journal_file, full=False):
+    """Forget cluster phases (all phases with full) and the applied inventory"""
+    journal = load_journal(journal_file)
+    if full:
+        journal['phases'] = {}
+    else:
+        journal['phases'] = {phase: entry for phase, entry in journal['phases'].items()
+                             if phase.startswith(NODE_PHASES)}
+    journal.pop('applied_hosts', None)
+    journal.pop('applied_at', None)
+    save_journal(journal_file, journal)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reset every cluster node to its pre-cluster state in parallel")
+    parser.add_argument('inventory_file', nargs='?', default='inventory/k8s-inventory.json',
+                        help="Inventory JSON file (default: %(default)s)")
+    parser.add_argument('--full', action='store_true',
+                        help="Also clear phase 1-3 fingerprints and journal entries, so every phase re-runs")
+    parser.add_argument('--attempts', type=int, default=5,
+                        help="Reset rounds for hosts that are not clean yet (default: %(default)s)")
+    parser.add_argument('--retry-delay', type=float, default=2,
+                        help="Seconds between reset rounds (default: %(default)s)")
+    parser.add_argument('--timeout', type=int, default=300,
+                        help="Seconds the reset may run on a host before it is stopped (default: %(default)s)")
+    parser.add_argument('--forks', type=int, default=int(os.environ.get('ANSIBLE_FORKS', 50)),
+                        help="Hosts reset concurrently (default: $ANSIBLE_FORKS or %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        hosts = sorted(inventory_hosts(load_inventory(args.inventory_file)))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if not hosts:
+        print("No hosts in inventory, nothing to reset")
+        sys.exit(0)
+
+    start = time.time()
+    mode = "full reset" if args.full else "reset"
+    print(f"🧹 Cluster {mode} of {len(hosts)} hosts...")
+
+    pending = hosts
+    results = {}
+    for attempt in range(1, max(1, args.attempts) + 1):
+        results.update(run_reset(pending, args.inventory_file, args.full, args.timeout, args.forks))
+        pending = [host for host in pending if not results[host][0]]
+        print(f"   Round {attempt}: {len(hosts) - len(pending)}/{len(hosts)} hosts clean "
+              f"({time.time() - start:.1f}s)")
+        if not pending or attempt == args.attempts:
+            break
+        time.sleep(args.retry_delay)
+
+    reset_journal(os.environ.get('DEPLOY_JOURNAL_FILE', DEFAULT_JOURNAL_FILE), args.full)
+
+    if pending:
+        print(f"❌ {len(pending)} hosts not clean after {args.attempts} rounds:")
+        for host in pending:
+            print(f"   {host}: {results[host][1]}")
+        sys.exit(1)
+    print(f"✅ All {len(hosts)} hosts clean in {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
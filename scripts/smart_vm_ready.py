@@ -1,15 +1,40 @@
 #!/usr/bin/env python3
 """
 Ultra-fast VM readiness checker with parallel execution and optimized checks
+
+Optionally records per-host, per-attempt connection latency (TCP connect,
+SSH key exchange, auth, command round-trip) as an OpenMetrics textfile and a
+JSON summary, see readiness_metrics.py; --perf-store also keeps the summary
+in the build history (perf_store.py).
+
+With --backend agent, boot, IP configuration and cloud-init are followed
+through the QEMU guest agent on the Proxmox API (agent_readiness.py) and SSH
+only confirms hosts the agent reports ready.
 """
 
+import argparse
+import errno
 import json
+import selectors
 import sys
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import socket
+import sqlite3
 import subprocess
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from agent_readiness import AgentReadiness
+from iac_runtime import SSHBudget
+from perf_store import PerfStore, build_id
+from proxmox_api import ProxmoxAPI, ProxmoxError
+from readiness_metrics import ReadinessMetrics
+
 # Try to import asyncssh, but fall back to sync SSH if not available
 try:
     import asyncio
@@ -18,30 +43,182 @@ try:
 except ImportError:
     HAS_ASYNCSSH = False
 
+if HAS_ASYNCSSH:
+    class TimingSSHClient(asyncssh.SSHClient):
+        """Marks when each stage of an SSH connection completes"""
+
+        def __init__(self):
+            self.marks = {}
+
+        def connection_made(self, conn):
+            self.marks['connected'] = time.perf_counter()
+
+        def begin_auth(self, username):
+            # Called once key exchange has finished
+            self.marks['kex_done'] = time.perf_counter()
+            return True
+
+        def auth_completed(self):
+            self.marks['auth_done'] = time.perf_counter()
+
+
+# File descriptors kept free for SSH sessions, logs and the interpreter itself
+RESERVED_FDS = 64
+
+
+def fd_budget(requested):
+    """Cap in-flight connects below the process's open file limit"""
+    if resource is None:
+        return requested
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft_limit - RESERVED_FDS))
+
+
+def scan_ports(targets, port=22, timeout=2, max_in_flight=256):
+    """Non-blocking TCP connect scan multiplexed with selectors (epoll on Linux).
+
+    targets is {name: address}. Yields (name, is_open, connect_seconds) as
+    each connect completes, fails or passes its per-host deadline, so callers
+    can start the next stage while the rest of the scan is still running.
+    At most max_in_flight sockets are open at any time.
+    """
+    pending = list(targets.items())
+    pending.reverse()
+    in_flight = {}  # fd -> (name, sock, started, deadline)
+    selector = selectors.DefaultSelector()
+
+    try:
+        while pending or in_flight:
+            # Start new connects while there is fd budget left
+            while pending and len(in_flight) < max_in_flight:
+                name, address = pending.pop()
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                started = time.perf_counter()
+                try:
+                    result = sock.connect_ex((address, port))
+                except OSError:
+                    sock.close()
+                    yield name, False, None
+                    continue
+
+                if result == 0:
+                    sock.close()
+                    yield name, True, time.perf_counter() - started
+                elif result in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                    selector.register(sock, selectors.EVENT_WRITE)
+                    in_flight[sock.fileno()] = (name, sock, started, started + timeout)
+                else:
+                    sock.close()
+                    yield name, False, time.perf_counter() - started
+
+            if not in_flight:
+                continue
+
+            now = time.perf_counter()
+            next_deadline = min(entry[3] for entry in in_flight.values())
+            events = selector.select(timeout=max(0, next_deadline - now))
+
+            finished = time.perf_counter()
+            for key, _ in events:
+                name, sock, started, _ = in_flight.pop(key.fd)
+                selector.unregister(sock)
+                is_open = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                sock.close()
+                yield name, is_open, finished - started
+
+            # Expire hosts that passed their deadline without answering
+            for fd, (name, sock, started, deadline) in list(in_flight.items()):
+                if deadline <= finished:
+                    del in_flight[fd]
+                    selector.unregister(sock)
+                    sock.close()
+                    yield name, False, None
+    finally:
+        # Generator closed early or an error was raised: release every socket
+        for name, sock, _, _ in in_flight.values():
+            selector.unregister(sock)
+            sock.close()
+        selector.close()
+
+
+class SSHStage:
+    """Runs SSH checks as port-scan results arrive, at most max_workers at once.
+
+    With asyncssh, checks run as coroutines on an event loop in a background
+    thread; otherwise sshpass checks run in a single thread pool.
+    """
+
+    def __init__(self, checker, max_workers):
+        self.checker = checker
+        if HAS_ASYNCSSH:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.thread.start()
+            self.semaphore = asyncio.run_coroutine_threadsafe(
+                self._make_semaphore(max_workers), self.loop
+            ).result()
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def _make_semaphore(self, max_workers):
+        # Created on the loop's thread so it binds to that loop
+        return asyncio.Semaphore(max_workers)
+
+    async def _limited_check(self, info):
+        async with self.semaphore:
+            return await self.checker.async_ssh_check(
+                info['ansible_host'],
+                info.get('ansible_user', 'root'),
+                info.get('ansible_ssh_pass', 'Passw0rd!')
+            )
+
+    def submit(self, info):
+        """Start an SSH check, returns a concurrent.futures.Future of (ok, timings)"""
+        if HAS_ASYNCSSH:
+            return asyncio.run_coroutine_threadsafe(self._limited_check(info), self.loop)
+        return self.executor.submit(
+            self.checker.sync_ssh_check,
+            info['ansible_host'],
+            info.get('ansible_user', 'root'),
+            info.get('ansible_ssh_pass', 'Passw0rd!')
+        )
+
+    def close(self):
+        if HAS_ASYNCSSH:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+        else:
+            self.executor.shutdown(wait=True)
+
+
 class UltraFastVMChecker:
-    def __init__(self, inventory_file, max_workers=20):
+    def __init__(self, inventory_file, max_workers=20, metrics=None):
         self.inventory_file = inventory_file
         self.max_workers = max_workers
+        self.metrics = metrics
+        self.attempts = 1
+        self.retry_delay = 30
+        self.port_timeout = 2
+        self.max_in_flight = 256
+        self.agent = None
         self.results = {}
+        self.failed = {}
         
     def load_inventory(self):
         """Load inventory file"""
         with open(self.inventory_file, 'r') as f:
             return json.load(f)
     
-    def quick_port_check(self, host, port=22, timeout=2):
-        """Ultra-fast TCP port check"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        try:
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
-        except:
-            return False
-    
     def sync_ssh_check(self, host, user="root", password="Passw0rd!", timeout=5):
-        """Synchronous SSH connectivity check using sshpass"""
+        """Synchronous SSH connectivity check using sshpass, returns (ok, timings)
+
+        ssh does not expose its stages, so only the total is recorded here.
+        """
+        start = time.perf_counter()
         try:
             # Use sshpass with ssh to check connectivity
             cmd = [
@@ -61,94 +238,47 @@ class UltraFastVMChecker:
                 timeout=timeout + 1
             )
             
-            return result.returncode == 0 and result.stdout.strip() == "OK"
+            ok = result.returncode == 0 and result.stdout.strip() == "OK"
         except:
-            return False
+            ok = False
+        return ok, {'ssh_total': time.perf_counter() - start}
     
     async def async_ssh_check(self, host, user="root", password="Passw0rd!", timeout=5):
-        """Async SSH connectivity check"""
+        """Async SSH connectivity check, returns (ok, timings) with per-stage latency"""
+        clients = []
+        timings = {}
+
+        def client_factory():
+            client = TimingSSHClient()
+            clients.append(client)
+            return client
+
+        start = time.perf_counter()
         try:
-            async with asyncssh.connect(
+            conn, _ = await asyncssh.create_connection(
+                client_factory,
                 host, 
                 username=user, 
                 password=password,
                 known_hosts=None,
                 connect_timeout=timeout
-            ) as conn:
+            )
+            async with conn:
                 # Quick command to verify SSH works
+                command_start = time.perf_counter()
                 result = await conn.run('echo "OK"', check=True, timeout=2)
-                return result.stdout.strip() == "OK"
+                timings['command_rtt'] = time.perf_counter() - command_start
+                ok = result.stdout.strip() == "OK"
         except:
-            return False
-    
-    def check_vm_batch(self, vm_batch):
-        """Check a batch of VMs in parallel"""
-        batch_results = {}
-        
-        # First, quick port scan for all VMs
-        with ThreadPoolExecutor(max_workers=len(vm_batch)) as executor:
-            port_futures = {
-                executor.submit(self.quick_port_check, vm_info['ansible_host']): vm_name
-                for vm_name, vm_info in vm_batch.items()
-            }
-            
-            for future in as_completed(port_futures, timeout=3):
-                vm_name = port_futures[future]
-                try:
-                    is_open = future.result()
-                    batch_results[vm_name] = {'port_22': is_open, 'ssh': False}
-                except:
-                    batch_results[vm_name] = {'port_22': False, 'ssh': False}
-        
-        # Then, SSH check only for VMs with open ports
-        vms_to_ssh_check = {
-            vm: info for vm, info in vm_batch.items() 
-            if vm in batch_results and batch_results[vm]['port_22']
-        }
-        
-        if vms_to_ssh_check:
-            if HAS_ASYNCSSH:
-                # Run async SSH checks
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                ssh_tasks = [
-                    self.async_ssh_check(
-                        info['ansible_host'],
-                        info.get('ansible_user', 'root'),
-                        info.get('ansible_ssh_pass', 'Passw0rd!')
-                    ) for info in vms_to_ssh_check.values()
-                ]
-                
-                ssh_results = loop.run_until_complete(
-                    asyncio.gather(*ssh_tasks, return_exceptions=True)
-                )
-                loop.close()
-                
-                for vm_name, ssh_ok in zip(vms_to_ssh_check.keys(), ssh_results):
-                    batch_results[vm_name]['ssh'] = ssh_ok is True
-            else:
-                # Fall back to synchronous SSH checks
-                with ThreadPoolExecutor(max_workers=min(len(vms_to_ssh_check), 10)) as executor:
-                    ssh_futures = {
-                        executor.submit(
-                            self.sync_ssh_check,
-                            info['ansible_host'],
-                            info.get('ansible_user', 'root'),
-                            info.get('ansible_ssh_pass', 'Passw0rd!')
-                        ): vm_name
-                        for vm_name, info in vms_to_ssh_check.items()
-                    }
-                    
-                    for future in as_completed(ssh_futures, timeout=10):
-                        vm_name = ssh_futures[future]
-                        try:
-                            ssh_ok = future.result()
-                            batch_results[vm_name]['ssh'] = ssh_ok
-                        except:
-                            batch_results[vm_name]['ssh'] = False
-        
-        return batch_results
+            ok = False
+
+        timings['ssh_total'] = time.perf_counter() - start
+        marks = clients[0].marks if clients else {}
+        if 'connected' in marks and 'kex_done' in marks:
+            timings['ssh_handshake'] = marks['kex_done'] - marks['connected']
+        if 'kex_done' in marks and 'auth_done' in marks:
+            timings['ssh_auth'] = marks['auth_done'] - marks['kex_done']
+        return ok, timings
     
     def run_parallel_checks(self):
         """Run checks in parallel batches"""
@@ -179,36 +309,23 @@ class UltraFastVMChecker:
             return False
         
         method = "async SSH (asyncssh)" if HAS_ASYNCSSH else "sync SSH (sshpass)"
-        print(f"Ultra-fast checking {len(all_hosts)} VMs with {self.max_workers} workers using {method}...")
+        print(f"Ultra-fast checking {len(all_hosts)} VMs with {self.max_workers} SSH workers using {method}...")
         start_time = time.time()
         
-        # Split hosts into batches
-        batch_size = min(10, len(all_hosts))  # Process 10 VMs at a time
-        vm_items = list(all_hosts.items())
-        batches = [
-            dict(vm_items[i:i + batch_size]) 
-            for i in range(0, len(vm_items), batch_size)
-        ]
-        
-        # Process batches in parallel
-        with ThreadPoolExecutor(max_workers=max(1, self.max_workers // 10)) as executor:
-            batch_futures = {
-                executor.submit(self.check_vm_batch, batch): idx
-                for idx, batch in enumerate(batches)
-            }
-            
-            for future in as_completed(batch_futures, timeout=30):
-                batch_idx = batch_futures[future]
-                try:
-                    batch_results = future.result()
-                    self.results.update(batch_results)
-                    
-                    # Show progress
-                    ready_count = sum(1 for r in self.results.values() if r['ssh'])
-                    print(f"  [OK] Batch {batch_idx + 1}/{len(batches)} complete. "
-                          f"Ready: {ready_count}/{len(all_hosts)}")
-                except Exception as e:
-                    print(f"  [FAIL] Batch {batch_idx + 1} failed: {e}")
+        if self.agent is not None:
+            self.wait_for_agents(all_hosts)
+        
+        for attempt in range(1, self.attempts + 1):
+            # Only re-check hosts that are not ready yet
+            pending = {vm: info for vm, info in all_hosts.items()
+                       if not self.results.get(vm, {}).get('ssh') and vm not in self.failed}
+            if not pending:
+                break
+            if attempt > 1:
+                print(f"\nAttempt {attempt}/{self.attempts}: re-checking {len(pending)} VMs "
+                      f"in {self.retry_delay}s...")
+                time.sleep(self.retry_delay)
+            self.check_hosts(pending, len(all_hosts))
         
         # Final report
         elapsed = time.time() - start_time
@@ -220,32 +337,175 @@ class UltraFastVMChecker:
         
         if not_ready:
             print(f"Not ready ({len(not_ready)}): {', '.join(not_ready)}")
+        for vm, reason in self.failed.items():
+            print(f"  {vm}: {reason}")
             
         
         return len(ready_vms) == len(all_hosts)
 
+    def wait_for_agents(self, all_hosts):
+        """Follow hosts through the guest agent, SSH-confirming each batch as it becomes ready.
+
+        Hosts without vmid/node in the inventory, or whose agent never
+        answered, are left to the plain SSH rounds.
+        """
+        agent_hosts = {vm: info for vm, info in all_hosts.items() if info.get('vmid') and info.get('node')}
+        if len(agent_hosts) < len(all_hosts):
+            print(f"  {len(all_hosts) - len(agent_hosts)} VMs have no vmid/node in the inventory, using SSH only")
+        if not agent_hosts:
+            return
+
+        print(f"  Following {len(agent_hosts)} VMs through the QEMU guest agent...")
+        agent_ready = 0
+        # SSH confirmation runs beside the agent polling, one batch at a time,
+        # so a slow batch neither stalls the other VMs nor eats the agent timeout
+        confirmations = []
+        with ThreadPoolExecutor(max_workers=1) as confirm:
+            for finished in self.agent.rounds(agent_hosts):
+                ready = [host for host in finished if host.ready]
+                for host in finished:
+                    if host.error == 'cloud-init finished with errors':
+                        self.failed[host.name] = host.error
+                    elif not host.ready:
+                        print(f"  [WARN] {host.name}: guest agent {host.error}, falling back to SSH")
+                if not ready:
+                    continue
+                agent_ready += len(ready)
+                print(f"  [OK] Guest agent: {agent_ready}/{len(agent_hosts)} VMs booted with cloud-init done")
+                extra_timings = {host.name: host.timings for host in ready}
+                confirmations.append(confirm.submit(
+                    self.check_hosts, {host.name: agent_hosts[host.name] for host in ready},
+                    len(all_hosts), extra_timings
+                ))
+        for confirmation in confirmations:
+            confirmation.result()
+
+    def check_hosts(self, hosts, total_hosts, extra_timings=None):
+        """Check one round of hosts: port scan feeding SSH checks as ports open"""
+        round_results = {}
+        ssh_futures = {}
+        # SSH sessions count against the controller-wide budget shared with other builds
+        budget = SSHBudget()
+        ssh_slots = budget.acquire(max(1, self.max_workers), min_slots=1)
+        ssh_stage = SSHStage(self, ssh_slots)
+        
+        try:
+            targets = {vm_name: info['ansible_host'] for vm_name, info in hosts.items()}
+            for vm_name, is_open, connect_seconds in scan_ports(
+                    targets, timeout=self.port_timeout,
+                    max_in_flight=fd_budget(self.max_in_flight)):
+                round_results[vm_name] = {'port_22': is_open, 'ssh': False,
+                                          'timings': {'tcp_connect': connect_seconds}}
+                if extra_timings and vm_name in extra_timings:
+                    round_results[vm_name]['timings'].update(extra_timings[vm_name])
+                if is_open:
+                    ssh_futures[ssh_stage.submit(hosts[vm_name])] = vm_name
+            
+            open_count = len(ssh_futures)
+            print(f"  [OK] Port scan complete. Port 22 open: {open_count}/{len(hosts)}")
+            
+            for future in as_completed(ssh_futures):
+                vm_name = ssh_futures[future]
+                try:
+                    ssh_ok, timings = future.result()
+                    round_results[vm_name]['ssh'] = ssh_ok is True
+                    round_results[vm_name]['timings'].update(timings)
+                except Exception:
+                    pass
+        finally:
+            ssh_stage.close()
+            budget.release()
+        
+        self.results.update(round_results)
+        if self.metrics is not None:
+            for vm_name, result in round_results.items():
+                self.metrics.record_attempt(
+                    vm_name, hosts[vm_name].get('ansible_host'),
+                    result['timings'], result['ssh']
+                )
+        
+        ready_count = sum(1 for r in self.results.values() if r['ssh'])
+        print(f"  [OK] SSH checks complete. Ready: {ready_count}/{total_hosts}")
+
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: ultra_fast_vm_ready.py <inventory_file> [max_workers]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Ultra-fast parallel VM readiness checker")
+    parser.add_argument('inventory_file', help="Inventory JSON file")
+    parser.add_argument('max_workers', nargs='?', type=int, default=20,
+                        help="Concurrent SSH checks (default: %(default)s)")
+    parser.add_argument('--attempts', type=int, default=1,
+                        help="Check rounds for hosts that are not ready yet (default: %(default)s)")
+    parser.add_argument('--retry-delay', type=int, default=30,
+                        help="Seconds between check rounds (default: %(default)s)")
+    parser.add_argument('--port-timeout', type=float, default=2,
+                        help="Per-host TCP connect deadline in seconds (default: %(default)s)")
+    parser.add_argument('--max-in-flight', type=int, default=256,
+                        help="Max concurrent TCP connects, capped by the open file limit "
+                             "(default: %(default)s)")
+    parser.add_argument('--backend', choices=['ssh', 'agent'], default='ssh',
+                        help="ssh polls port 22 and SSH; agent waits on the QEMU guest agent through "
+                             "the Proxmox API and only confirms with SSH (default: %(default)s)")
+    parser.add_argument('--agent-interval', type=float, default=2,
+                        help="Seconds between guest agent polls (default: %(default)s)")
+    parser.add_argument('--agent-timeout', type=float, default=600,
+                        help="Give up on the guest agent after this many seconds and fall back to SSH "
+                             "(default: %(default)s)")
+    parser.add_argument('--since', type=float,
+                        help="Epoch seconds the wait started at, for time-to-ready (default: now)")
+    parser.add_argument('--metrics-file', help="Write OpenMetrics latency metrics to this file")
+    parser.add_argument('--summary-file', help="Write a JSON latency summary to this file")
+    parser.add_argument('--perf-store', action='store_true',
+                        help="Record the latency summary in the performance store ($PERF_STORE_DB)")
+    args = parser.parse_args()
     
-    inventory_file = sys.argv[1]
-    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    metrics = None
+    if args.metrics_file or args.summary_file or args.perf_store:
+        metrics = ReadinessMetrics(since=args.since)
     
-    checker = UltraFastVMChecker(inventory_file, max_workers)
+    checker = UltraFastVMChecker(args.inventory_file, args.max_workers, metrics)
+    checker.attempts = max(1, args.attempts)
+    checker.retry_delay = args.retry_delay
+    checker.port_timeout = args.port_timeout
+    checker.max_in_flight = max(1, args.max_in_flight)
+    
+    if args.backend == 'agent':
+        try:
+            checker.agent = AgentReadiness(ProxmoxAPI.from_env(), interval=args.agent_interval,
+                                           timeout=args.agent_timeout)
+        except ProxmoxError as e:
+            print(f"Guest agent backend unavailable ({e}), using SSH polling")
     
     try:
-        if checker.run_parallel_checks():
-            print("\nAll VMs are ready!")
-            sys.exit(0)
-        else:
-            print("\nWARNING: Some VMs are not ready yet")
-            sys.exit(1)
+        all_ready = checker.run_parallel_checks()
     except Exception as e:
         print(f"Error: {e}")
+        all_ready = False
+    
+    if metrics is not None:
+        if args.metrics_file:
+            metrics.write_openmetrics(args.metrics_file)
+        if args.summary_file:
+            metrics.write_summary(args.summary_file)
+        summary = metrics.summary()
+        for stage, stats in summary['stages'].items():
+            print(f"  {stage:<14} p50 {stats['p50'] * 1000:>8.1f}ms  p95 {stats['p95'] * 1000:>8.1f}ms  "
+                  f"max {stats['max'] * 1000:>8.1f}ms")
+        if summary['slowest_hosts']:
+            print(f"  Slowest hosts: {', '.join(summary['slowest_hosts'])}")
+        if args.perf_store:
+            try:
+                with PerfStore() as store:
+                    store.record_readiness(build_id(), summary, 'agent' if checker.agent else 'ssh')
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: could not record readiness in the performance store: {e}")
+    
+    if all_ready:
+        print("\nAll VMs are ready!")
+        sys.exit(0)
+    else:
+        print("\nWARNING: Some VMs are not ready yet")
         sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
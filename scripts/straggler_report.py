@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Read the straggler report written by the straggler_free strategy plugin.
+
+The report lists hosts that ran a task much longer than the median of the
+other hosts, with the action taken: reported, blocking (protected master),
+quarantined (left out of the deployment) or reclone (quarantined and due to
+be re-created by reclone_stragglers.sh).
+"""
+import json
+import os
+import sys
+
+DEFAULT_REPORT_FILE = 'logs/stragglers.json'
+
+# Terraform resource holding the VMs, keyed by the original vms.csv name
+TERRAFORM_VM_RESOURCE = 'proxmox_vm_qemu.vms'
+
+
+def load_report(report_file):
+    """Load the report, returning an empty one if missing or unreadable"""
+    try:
+        with open(report_file, 'r') as f:
+            report = json.load(f)
+        if isinstance(report, dict):
+            report.setdefault('hosts', {})
+            return report
+    except (OSError, ValueError):
+        pass
+    return {'hosts': {}}
+
+
+def hosts_with_action(report, actions):
+    """Host names whose action is one of actions"""
+    return sorted(host for host, entry in report['hosts'].items() if entry.get('action') in actions)
+
+
+def replace_args(report):
+    """terraform apply -replace arguments for hosts marked for re-clone"""
+    return [
+        f'-replace={TERRAFORM_VM_RESOURCE}["{report["hosts"][host]["original_name"]}"]'
+        for host in hosts_with_action(report, ['reclone'])
+    ]
+
+
+def usage():
+    print("Usage: straggler_report.py <command> [args]")
+    print("  show                  list flagged hosts and the slowest task for each")
+    print("  hosts <action[,...]>  comma separated hosts with these actions")
+    print("                        (reported, blocking, quarantined, reclone)")
+    print("  replace-args          terraform -replace arguments, one per line")
+    print("  reset                 remove the report")
+    print("")
+    print("Report file: $STRAGGLER_REPORT (default: %s)" % DEFAULT_REPORT_FILE)
+    sys.exit(1)
+
+
+def main():
+    if len(sys.argv) < 2:
+        usage()
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+    report_file = os.environ.get('STRAGGLER_REPORT', DEFAULT_REPORT_FILE)
+
+    if command == 'show' and not args:
+        report = load_report(report_file)
+        if not report['hosts']:
+            print("No stragglers detected")
+        for host, entry in sorted(report['hosts'].items()):
+            worst = max(entry['events'], key=lambda event: event['elapsed'] / max(event['median'], 0.1))
+            print(f"{host}: {entry['action']} - '{worst['task']}' ({worst['play']}) "
+                  f"{worst['elapsed']}s vs median {worst['median']}s over {worst['samples']} hosts")
+
+    elif command == 'hosts' and len(args) == 1:
+        print(','.join(hosts_with_action(load_report(report_file), args[0].split(','))))
+
+    elif command == 'replace-args' and not args:
+        for arg in replace_args(load_report(report_file)):
+            print(arg)
+
+    elif command == 'reset' and not args:
+        if os.path.exists(report_file):
+            os.remove(report_file)
+
+    else:
+        usage()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,22 @@
 set -e
 
 echo "Applying Terraform with parallel execution..."
+APPLY_START=$(date +%s)
 terraform apply -auto-approve -parallelism=10
+APPLY_END=$(date +%s)
+
+# Clone timing history for scripts/predict_deployment.py
+VM_COUNT=$(($(grep -c . vms.csv) - 1))
+mkdir -p ../ansible/metrics
+echo "{\"finished_at\": ${APPLY_END}, \"duration\": $((APPLY_END - APPLY_START)), \"vms\": ${VM_COUNT}, \"parallelism\": 10}" \
+    >> ../ansible/metrics/provision-history.jsonl
+
+# The run journal belongs to the VMs it was recorded on; re-created VMs
+# (fresh state, fixed IPs) must not inherit phases from the previous ones
+CREATED_VMS=$(mktemp)
+terraform output -json created_vms > "$CREATED_VMS" || echo "Warning: no created_vms output - clearing run journal"
+(cd ../ansible && python3 ../scripts/deploy_journal.py bind-vms "$CREATED_VMS")
+rm -f "$CREATED_VMS"
 
 echo "Deployment summary:"
 terraform output assignment_summary || echo "No assignment summary available"
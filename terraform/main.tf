@@ -75,6 +75,8 @@ locals {
       
       template  = vm.template
       node      = vm.node
+      # Optional cluster column: one run provisions a fleet of clusters
+      cluster   = trimspace(try(vm.cluster, ""))
      
       # Use defined IP or sequential IP (if ip = "0")
       # Reserve first IP (base-1) for HAProxy LB when multi-master
@@ -187,9 +189,9 @@ resource "local_file" "updated_csv" {
   
   filename = var.vm_csv_file
   content  = join("\n", concat(
-    ["vmid,vm_name,template,node,ip,cores,memory,disk_size"],
+    ["vmid,vm_name,template,node,ip,cores,memory,disk_size,cluster"],
     [for name, vm in local.vm_data : 
-      "${vm.vmid},${vm.vm_name_original},${vm.template},${vm.node},${vm.ip_address},${vm.cores},${vm.memory},${vm.disk_size}"
+      "${vm.vmid},${vm.vm_name_original},${vm.template},${vm.node},${vm.ip_address},${vm.cores},${vm.memory},${vm.disk_size},${vm.cluster}"
     ]
   ))
 }
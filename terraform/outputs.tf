@@ -114,6 +114,7 @@ output "ansible_inventory_json" {
           node = v.node
           original_name = v.vm_name_original
           template = v.template
+          cluster = v.cluster
         } if can(regex("master", lower(v.vm_name_original)))
       }
     }
@@ -125,6 +126,7 @@ output "ansible_inventory_json" {
           node = v.node
           original_name = v.vm_name_original
           template = v.template
+          cluster = v.cluster
         } if can(regex("worker", lower(v.vm_name_original)))
       }
     }
@@ -140,9 +142,9 @@ output "ansible_inventory_json" {
 # Export VM data sebagai CSV untuk dynamic inventory generator
 resource "local_file" "vms_csv" {
   content = <<-EOT
-vmid,vm_name,template,node,ip,cores,memory,disk_size
+vmid,vm_name,template,node,ip,cores,memory,disk_size,cluster
 %{for k, v in local.vm_data~}
-${v.vmid},${v.vm_name_original},${v.template},${v.node},${v.ip_address},${v.cores},${v.memory},${v.disk_size}
+${v.vmid},${v.vm_name_original},${v.template},${v.node},${v.ip_address},${v.cores},${v.memory},${v.disk_size},${v.cluster}
 %{endfor~}
 EOT
   filename = "${path.module}/vms.csv"